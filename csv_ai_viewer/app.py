@@ -1,26 +1,191 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context, g
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
-import ollama
 import warnings
 import io
 import os
 from typing import Dict, List, Any, Optional
 import json
+import logging
+import atexit
 import xlsxwriter
 import xlrd
 import openpyxl
 from io import BytesIO
 import base64
+import time
+import uuid
+from charts import ChartError, chart_data
+from datasets import DatasetRegistry
+from exports import MIME_TYPES, content_disposition, export_path, iter_csv, iter_file, write_xlsx
+from filter_expr import FilterError, apply_filter, page_records, PAGE_SIZE as FILTER_PAGE_SIZE
+from ingest import UploadManager, hash_stream, import_chunks, json_chunks, xlsx_chunks
+from jobs import JobPool
+from llm_cache import ResponseCache
+from llm_scheduler import LLMScheduler, QueueFull
+from metrics import Metrics
+from mutations import DeltaError
+from ollama_service import OllamaService, message_content
+from query_executor import QueryExecutor, QueryFailed, QueryRejected
+from rows import MAX_PAGE_SIZE, PAGE_SIZE as ROWS_PAGE_SIZE, row_window
+from store import DatasetStore
+from value_index import MAX_VALUES_PAGE_SIZE, VALUES_PAGE_SIZE, value_index
+from wire import (ARROW_MIME, COMPRESSIBLE_TYPES, LAYOUTS, MIN_COMPRESS_SIZE, choose_encoding, compress,
+                  encode_arrow, encode_columnar)
 
 warnings.filterwarnings('ignore')
 
 app = Flask(__name__)
 CORS(app)
 
-# Global variable to store the current dataset
-current_dataset = None
+# Verbose request logging (prompts, model responses, results) is off unless CSV_VIEWER_DEBUG is set
+DEBUG = os.environ.get('CSV_VIEWER_DEBUG', '').lower() in ('1', 'true', 'yes')
+logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger('csv_ai_viewer')
+logger.setLevel(logging.DEBUG if DEBUG else logging.INFO)
+
+MEMORY_BUDGET_MB = int(os.environ.get('CSV_VIEWER_MEMORY_BUDGET_MB', '1024'))
+DATA_DIR = os.environ.get('CSV_VIEWER_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+# An empty store directory disables the store; evicted datasets are then dropped instead of spilled
+STORE_DIR = os.environ.get('CSV_VIEWER_STORE_DIR', os.path.join(DATA_DIR, 'store'))
+STORE_QUOTA_MB = int(os.environ.get('CSV_VIEWER_STORE_QUOTA_MB', '10240'))
+STORE_COMPRESSION = os.environ.get('CSV_VIEWER_STORE_COMPRESSION', 'uncompressed')
+STORE_FLUSH_SECONDS = float(os.environ.get('CSV_VIEWER_STORE_FLUSH_SECONDS', '5'))
+LLM_CACHE_SIZE = int(os.environ.get('CSV_VIEWER_LLM_CACHE_SIZE', '512'))
+LLM_CACHE_TTL = int(os.environ.get('CSV_VIEWER_LLM_CACHE_TTL', str(24 * 60 * 60)))
+LLM_CACHE_DIR = os.environ.get('CSV_VIEWER_LLM_CACHE_DIR') or None
+OLLAMA_REFRESH_INTERVAL = int(os.environ.get('CSV_VIEWER_OLLAMA_REFRESH', '30'))
+LLM_CONCURRENCY = int(os.environ.get('CSV_VIEWER_LLM_CONCURRENCY', '1'))
+LLM_QUEUE_SIZE = int(os.environ.get('CSV_VIEWER_LLM_QUEUE_SIZE', '16'))
+WORKERS = int(os.environ.get('CSV_VIEWER_WORKERS', '0')) or None
+QUERY_TIMEOUT = int(os.environ.get('CSV_VIEWER_QUERY_TIMEOUT', '10'))
+QUERY_MEMORY_MB = int(os.environ.get('CSV_VIEWER_QUERY_MEMORY_MB', '1024'))
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_UPLOAD_CHUNK_SIZE = 64 * 1024 * 1024
+SESSION_COOKIE = 'csv_viewer_session'
+EXPORT_DIR = os.path.join(DATA_DIR, 'exports')
+# Accepted export formats; 'excel' is the older name for xlsx
+EXPORT_FORMATS = {'csv': 'csv', 'xlsx': 'xlsx', 'excel': 'xlsx'}
+
+# Forked worker processes for CPU-heavy work, so request threads stay responsive
+job_pool = JobPool(workers=WORKERS)
+
+# Datasets persisted as Arrow files so a restart reopens them instead of re-parsing
+dataset_store = (DatasetStore(STORE_DIR, quota=STORE_QUOTA_MB * 1024 * 1024, compression=STORE_COMPRESSION)
+                 if STORE_DIR else None)
+
+# Parsed datasets keyed by a hash of their CSV content, shared by all endpoints
+# CSV text is parsed on the request thread: a DataFrame parsed in a worker would be pickled back
+datasets = DatasetRegistry(memory_budget=MEMORY_BUDGET_MB * 1024 * 1024, store=dataset_store,
+                           flush_delay=STORE_FLUSH_SECONDS)
+# Edits still waiting for the flush thread are written out when the server stops
+atexit.register(datasets.flush)
+
+# One Ollama client for the whole process; its model list refreshes in the background
+ollama_service = OllamaService(refresh_interval=OLLAMA_REFRESH_INTERVAL)
+
+# Model answers keyed by dataset, normalized question, mode and model
+llm_cache = ResponseCache(max_entries=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL, directory=LLM_CACHE_DIR)
+
+# Limits concurrent generations and shares one answer between identical in-flight prompts
+llm_scheduler = LLMScheduler(max_concurrency=LLM_CONCURRENCY, max_queue=LLM_QUEUE_SIZE)
+
+# Validates generated pandas code and runs it in a worker with time and memory limits
+query_executor = QueryExecutor(timeout=QUERY_TIMEOUT, memory_limit=QUERY_MEMORY_MB * 1024 * 1024, pool=job_pool)
+
+# Chunked uploads in progress; finished uploads land in DATA_DIR as Parquet
+uploads = UploadManager(os.path.join(DATA_DIR, 'uploads'))
+
+# Request and stage latency histograms plus the components' own counters, scraped from /api/metrics
+metrics = Metrics()
+metrics.register_stats('llm_cache', llm_cache.stats, counters=('hits', 'disk_hits', 'misses'))
+metrics.register_stats('llm_scheduler', llm_scheduler.stats, counters=('completed', 'rejected', 'coalesced'))
+metrics.register_stats('ollama', ollama_service.status, counters=('chats', 'prompt_tokens', 'completion_tokens'))
+metrics.register_stats('datasets', datasets.stats, counters=('hits', 'loads', 'evictions'))
+metrics.register_stats('jobs', job_pool.stats, counters=('completed', 'failed', 'cancelled'))
+metrics.register_stats('query_executor', query_executor.stats,
+                       counters=('executed', 'rejected', 'failed', 'timed_out'))
+if dataset_store is not None:
+    metrics.register_stats('store', dataset_store.stats)
+
+def span(stage):
+    """Time a stage of the current request into the metrics and the response's Server-Timing header"""
+    return metrics.span(stage, g.setdefault('timings', {}))
+
+@app.before_request
+def start_request_timer():
+    g.started_at = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    endpoint = request.endpoint or 'unmatched'
+    if 'started_at' in g:
+        metrics.observe('request_seconds', time.perf_counter() - g.started_at, endpoint=endpoint)
+    metrics.inc('requests_total', endpoint=endpoint, status=response.status_code)
+    timings = g.get('timings')
+    if timings:
+        response.headers['Server-Timing'] = ', '.join(f'{stage};dur={ms}' for stage, ms in timings.items())
+    return response
+
+def session_id():
+    """Id of the browser session making the request, taken from its cookie or newly assigned"""
+    if 'session_id' not in g:
+        g.session_id = request.cookies.get(SESSION_COOKIE) or uuid.uuid4().hex
+    return g.session_id
+
+@app.after_request
+def set_session_cookie(response):
+    if 'session_id' in g and request.cookies.get(SESSION_COOKIE) != g.session_id:
+        response.set_cookie(SESSION_COOKIE, g.session_id, httponly=True, samesite='Lax')
+    return response
+
+@app.after_request
+def compress_response(response):
+    """gzip (or brotli, when installed) JSON, CSV and Arrow responses for clients that accept it"""
+    if (response.direct_passthrough or response.is_streamed or not 200 <= response.status_code < 300
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    data = response.get_data()
+    if encoding is None or len(data) < MIN_COMPRESS_SIZE:
+        return response
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def requested_layout(data):
+    """Row layout asked for with ``layout`` or an Arrow ``Accept`` header; defaults to 'records'"""
+    layout = data.get('layout')
+    if layout in LAYOUTS:
+        return layout
+    if ARROW_MIME in request.headers.get('Accept', ''):
+        return 'arrow'
+    return 'records'
+
+def resolve_dataset(data):
+    """Return (dataset, error_response) for a request body.
+
+    Requests either reference an uploaded dataset with ``datasetId`` or send
+    the table inline as ``csvData``, which is registered on the fly.
+    """
+    dataset_id = data.get('datasetId')
+    if dataset_id:
+        dataset = datasets.get(dataset_id)
+        if dataset is None:
+            return None, (jsonify({'error': 'Dataset not found. Please upload it again.', 'dataset_id': dataset_id}), 404)
+        return dataset, None
+    csv_data = data.get('csvData', '')
+    if csv_data:
+        return datasets.add_csv(csv_data), None
+    return None, None
+
+def queue_full_response(error):
+    """429 response telling the client when to retry a rejected AI request"""
+    return (jsonify({'error': f'The AI service is busy. Please retry in {error.retry_after} seconds.',
+                     'retry_after': error.retry_after}),
+            429, {'Retry-After': str(error.retry_after)})
 
 @app.route('/')
 def index():
@@ -30,301 +195,767 @@ def index():
 def serve_static(filename):
     return send_from_directory('.', filename)
 
-@app.route('/api/ai-analysis', methods=['POST'])
-def ai_analysis():
-    try:
-        print("=== AI ANALYSIS DEBUG START ===")
-        
-        data = request.get_json()
-        csv_data = data.get('csvData', '')
-        question = data.get('question', '')
-        mode = data.get('mode', 'query')  # Default to query mode
-
-        print(f"DEBUG: Received question: {question}")
-        print(f"DEBUG: Received mode: {mode}")
-        print(f"DEBUG: CSV data length: {len(csv_data) if csv_data else 0}")
-
-        if not csv_data or not question:
-            return jsonify({'error': 'Missing CSV data or question'}), 400
-
-        df = pd.read_csv(io.StringIO(csv_data))
-        global current_dataset
-        current_dataset = df
-
-        print(f"DEBUG: DataFrame shape: {df.shape}")
-        print(f"DEBUG: DataFrame columns: {list(df.columns)}")
+def build_code_prompt(question, columns, mode):
+    """Build the prompt asking the model for a single line of filter expression or pandas code"""
+    if mode == 'filter':
+        prompt = f"""
+You are a data filtering assistant. Write a single filter expression that selects the rows of the table matching the user's description. Output only the expression, nothing else.
 
-        # Generate prompt based on mode
-        if mode == 'filter':
-            prompt = f"""
-You are a data filtering assistant. Given the following JavaScript array of objects 'df', where each row is an object with keys as column names, write a single line of JavaScript code that filters the rows based on the user's description. Use only dot notation (row.columnName) to access values. Output only the code, nothing else.
+Rules:
+- Refer to columns by name; wrap names containing spaces or symbols in backticks, e.g. `Unit Price`
+- Compare with ==, !=, >, >=, <, <= and combine conditions with and, or, not and parentheses
+- Use column in ['a', 'b'] for lists of values
+- Available functions: contains(column, 'text'), startswith(column, 'text'), endswith(column, 'text'), isnull(column), notnull(column), between(column, low, high)
 
 User Filter Request: {question}
-DataFrame columns: {list(df.columns)}
+DataFrame columns: {columns}
 
 Example outputs:
-df.filter(row => row.age > 30)
-df.filter(row => row.status === 'active')
-df.filter(row => row.salary >= 50000)
+age > 30
+status == 'active'
+salary >= 50000 and `Department` in ['Sales', 'Support']
 
-Now, output the JavaScript filter code:
+Now, output the filter expression:
 """
-        else:
-            # Default query mode - use pandas
-            prompt = f"""
+    else:
+        # Default query mode - use pandas
+        prompt = f"""
 You are a data analysis assistant. Given the following DataFrame 'df', write a single line of Pandas code (no explanations) that answers the user's question. Output only the code, nothing else.
 
 User Question: {question}
-DataFrame columns: {list(df.columns)}
+DataFrame columns: {columns}
 
 Example output:
 df['column'].mean()
 
 Now, output the code:
 """
+    return prompt
 
-        print(f"DEBUG: Generated prompt: {prompt}")
+def run_query_code(code, df, request_id=None):
+    """Validate and run generated pandas code against ``df`` on the job pool.
 
-        # Use Ollama
-        print("DEBUG: Creating Ollama client...")
-        client = ollama.Client()
-        
-        print("DEBUG: Calling client.list()...")
-        try:
-            models_list = client.list()
-            print('DEBUG: ollama client.list() result:', models_list)
-            print('DEBUG: Type of models_list:', type(models_list))
-            
-            # Handle different response types from Ollama
-            models = []
-            if hasattr(models_list, 'models'):
-                # It's a ListResponse object
-                models = models_list.models
-                print('DEBUG: Extracted models from ListResponse:', models)
-            elif isinstance(models_list, dict):
-                models = models_list.get('models', [])
-                print('DEBUG: Extracted models from dict:', models)
-            elif isinstance(models_list, list):
-                models = models_list
-                print('DEBUG: models_list is already a list:', models)
-            else:
-                print('DEBUG: Unexpected type for models_list:', type(models_list))
-                models = []
-            
-            print('DEBUG: Final models variable:', models)
-            print('DEBUG: Length of models:', len(models) if models else 0)
-            
-            if not models:
-                print('DEBUG: No models found in list')
-                return jsonify({'error': 'No Ollama models available. Please install a model first.'}), 500
-            
-            # Find first model that is not 'nomic-embed-text:latest'
-            model_name = None
-            for i, model in enumerate(models):
-                # Extract model name based on object type
-                current_model_name = None
-                if hasattr(model, 'name'):
-                    current_model_name = model.name
-                elif hasattr(model, 'model'):
-                    current_model_name = model.model
-                elif isinstance(model, dict):
-                    current_model_name = model.get('name')
-                elif isinstance(model, str):
-                    current_model_name = model
-                
-                print(f'DEBUG: Checking model {i}: {current_model_name}')
-                
-                # Skip 'nomic-embed-text:latest' and pick the next one
-                if current_model_name and current_model_name != 'nomic-embed-text:latest':
-                    model_name = current_model_name
-                    print(f'DEBUG: Selected model (skipping nomic-embed-text): {model_name}')
-                    break
-            
-            if not model_name:
-                print('DEBUG: No suitable model found (all were nomic-embed-text or invalid)')
-                return jsonify({'error': 'No suitable Ollama models available. Please install a chat model (not embedding model).'}), 500
-            
-            print(f'DEBUG: Final selected model name: {model_name}')
-            
-        except Exception as e:
-            print(f'DEBUG: Error in client.list(): {e}')
-            return jsonify({'error': f'Error listing Ollama models: {str(e)}'}), 500
+    Returns ``({'output', 'truncated', 'execution_ms'}, None)`` or ``(None, error_message)``.
+    """
+    try:
+        output, truncated, elapsed_ms = query_executor.run(code, df, request_id=request_id)
+    except QueryRejected as e:
+        logger.debug('Rejected generated code: %s', e)
+        return None, f'Generated code is not allowed: {e}'
+    except QueryFailed as e:
+        logger.debug('Error executing code: %s', e)
+        return None, str(e)
+    logger.debug('Code executed in %s ms; result: %.2000r', elapsed_ms, output)
+    return {'output': output, 'truncated': truncated, 'execution_ms': elapsed_ms}, None
+
+@app.route('/api/datasets', methods=['POST'])
+def upload_dataset():
+    try:
+        if 'file' in request.files:
+            csv_data = request.files['file'].read().decode('utf-8')
+        elif request.is_json:
+            csv_data = request.get_json().get('csvData', '')
+        else:
+            csv_data = request.get_data(as_text=True)
+
+        if not csv_data:
+            return jsonify({'error': 'No data provided'}), 400
+
+        dataset = datasets.add_csv(csv_data)
+        datasets.bind_session(session_id(), dataset.dataset_id)
+        return jsonify(dataset.info()), 201
+
+    except Exception as e:
+        return jsonify({'error': f'Error loading dataset: {str(e)}'}), 400
+
+@app.route('/api/datasets', methods=['GET'])
+def list_datasets():
+    """Memory use of the registry and the resident datasets with their hit rates"""
+    return jsonify({**datasets.stats(), 'resident': datasets.resident()})
+
+@app.route('/api/datasets/<dataset_id>', methods=['GET'])
+def get_dataset(dataset_id):
+    dataset = datasets.get(dataset_id)
+    if dataset is None:
+        return jsonify({'error': 'Dataset not found', 'dataset_id': dataset_id}), 404
+    return jsonify(dataset.info())
+
+@app.route('/api/datasets/<dataset_id>/profile', methods=['GET'])
+def get_dataset_profile(dataset_id):
+    dataset = datasets.get(dataset_id)
+    if dataset is None:
+        return jsonify({'error': 'Dataset not found', 'dataset_id': dataset_id}), 404
+
+    profile = dataset.profile
+    column = request.args.get('column')
+    if column is not None:
+        if column not in profile:
+            return jsonify({'error': f'Unknown column: {column}'}), 404
+        return jsonify({'dataset_id': dataset_id, 'column': column, 'profile': profile[column]})
+    return jsonify({'dataset_id': dataset_id, 'profile': profile})
+
+@app.route('/api/datasets/<dataset_id>', methods=['PATCH'])
+def patch_dataset(dataset_id):
+    """Apply a batch of cell, row and column changes to a dataset.
+
+    The body is ``{"changes": [...], "baseVersion": n}`` where each change is
+    ``{"op": "set", "row", "column", "value"}``, ``{"op": "add_row", "values"}``
+    or ``{"op": "add_column", "column", "value"}``. A stale ``baseVersion``
+    gets a 409. The first edit of an upload forks it, so the response's
+    ``dataset_id`` may differ from the one in the URL.
+    """
+    dataset = datasets.get(dataset_id)
+    if dataset is None:
+        return jsonify({'error': 'Dataset not found', 'dataset_id': dataset_id}), 404
+    data = request.get_json(silent=True) or {}
+    changes = data.get('changes')
+    if not isinstance(changes, list) or not all(isinstance(change, dict) for change in changes):
+        return jsonify({'error': 'changes must be a list of change objects'}), 400
+    base_version = data.get('baseVersion')
+    if base_version is not None and base_version != dataset.version:
+        return jsonify({'error': 'Dataset has changed since baseVersion', 'dataset_id': dataset_id,
+                        'version': dataset.version}), 409
+    if not changes:
+        return jsonify(dataset.info())
+
+    try:
+        with span('mutate'):
+            edited = datasets.edit(dataset, changes)
+    except DeltaError as e:
+        return jsonify({'error': str(e)}), 400
+    except (KeyError, TypeError, ValueError, OverflowError) as e:
+        # The batch is applied all or nothing, so the dataset is unchanged
+        return jsonify({'error': f'Could not apply the changes: {e}'}), 400
+    if edited is not dataset:
+        datasets.bind_session(session_id(), edited.dataset_id)
+    metrics.inc('dataset_changes_total', len(changes))
+    return jsonify(edited.info()), 200, {'ETag': f'"{edited.etag}"'}
+
+@app.route('/api/datasets/<dataset_id>/values', methods=['GET'])
+def get_column_values(dataset_id):
+    """Distinct values of a column with their row counts, for the column filter dropdown.
+
+    Takes ``column``, ``search`` (case-insensitive substring), ``offset``,
+    ``limit`` and ``sort`` (``count``, the default, or ``value``). Values
+    come from the column's dictionary encoding, so a page costs the
+    number of distinct values rather than a scan of the rows.
+    """
+    dataset = datasets.get(dataset_id)
+    if dataset is None:
+        return jsonify({'error': 'Dataset not found', 'dataset_id': dataset_id}), 404
+    column = request.args.get('column')
+    if column not in dataset.df.columns:
+        return jsonify({'error': f'Unknown column: {column}'}), 400
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(max(0, int(request.args.get('limit', VALUES_PAGE_SIZE))), MAX_VALUES_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid values request: {str(e)}'}), 400
+    sort = request.args.get('sort', 'count')
+    if sort not in ('count', 'value'):
+        return jsonify({'error': 'sort must be count or value'}), 400
+
+    with span('value_index'):
+        index = value_index(dataset, column)
+    if index is None:
+        return jsonify({'error': f'Column {column} has too many distinct values to list', 'column': column}), 422
+    values, matched = index.values(request.args.get('search'), offset, limit, sort)
+    return jsonify({
+        'dataset_id': dataset.dataset_id,
+        'version': dataset.version,
+        'column': column,
+        'distinct': int((index.dictionary != '').sum()),
+        'matched': matched,
+        'offset': offset,
+        'values': values
+    }), 200, {'ETag': f'"{dataset.etag}"'}
+
+@app.route('/api/datasets/<dataset_id>/in', methods=['POST'])
+def filter_column_in(dataset_id):
+    """Rows whose ``column`` is one of ``values``: ``{"column", "values", "offset", "limit"}``.
+
+    Answered from the column's value index (a union of per-value row lists),
+    falling back to a scan for columns with too many distinct values.
+    """
+    dataset = datasets.get(dataset_id)
+    if dataset is None:
+        return jsonify({'error': 'Dataset not found', 'dataset_id': dataset_id}), 404
+    data = request.get_json(silent=True) or {}
+    column, values = data.get('column'), data.get('values')
+    if not isinstance(values, list):
+        return jsonify({'error': 'values must be a list'}), 400
+    try:
+        offset = max(0, int(data.get('offset', 0)))
+        limit = min(max(0, int(data.get('limit', ROWS_PAGE_SIZE))), MAX_PAGE_SIZE)
+        with span('filter_in'):
+            result = row_window(dataset, offset=offset, limit=limit, filters={column: values})
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid filter request: {str(e)}'}), 400
+    except KeyError as e:
+        return jsonify({'error': f'Unknown column: {e.args[0]}'}), 400
+    result['dataset_id'] = dataset.dataset_id
+    return jsonify(result)
+
+@app.route('/api/datasets/<dataset_id>', methods=['DELETE'])
+def delete_dataset(dataset_id):
+    if not datasets.remove(dataset_id):
+        return jsonify({'error': 'Dataset not found', 'dataset_id': dataset_id}), 404
+    return jsonify({'success': True, 'dataset_id': dataset_id})
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    data = request.get_json(silent=True) or {}
+    upload = uploads.create(filename=data.get('filename'))
+    status = upload.status()
+    status['chunk_size'] = UPLOAD_CHUNK_SIZE
+    return jsonify(status), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    upload = uploads.get(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found', 'upload_id': upload_id}), 404
+    return jsonify(upload.status())
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    upload = uploads.get(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found', 'upload_id': upload_id}), 404
+    if (request.content_length or 0) > MAX_UPLOAD_CHUNK_SIZE:
+        return jsonify({'error': f'Chunks may be at most {MAX_UPLOAD_CHUNK_SIZE} bytes'}), 413
+
+    try:
+        offset = int(request.args.get('offset', 0))
+        chunk = request.get_data(cache=False)
+        with upload.lock:
+            if offset > upload.received:
+                # A chunk went missing; tell the client where to resume from
+                return jsonify({'error': 'Chunk out of order', **upload.status()}), 409
+            upload.write(offset, chunk)
+            return jsonify(upload.status())
+    except Exception as e:
+        uploads.remove(upload_id)
+        return jsonify({'error': f'Error parsing chunk: {str(e)}'}), 400
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    upload = uploads.get(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found', 'upload_id': upload_id}), 404
+
+    try:
+        with upload.lock:
+            dataset_id, path = upload.finish(DATA_DIR)
+        uploads.remove(upload_id)
+        dataset = datasets.add_parquet(dataset_id, path)
+        datasets.bind_session(session_id(), dataset.dataset_id)
+        return jsonify(dataset.info()), 201
+    except Exception as e:
+        uploads.remove(upload_id)
+        return jsonify({'error': f'Error finishing upload: {str(e)}'}), 400
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    if not uploads.remove(upload_id):
+        return jsonify({'error': 'Upload not found', 'upload_id': upload_id}), 404
+    return jsonify({'success': True, 'upload_id': upload_id})
+
+@app.route('/api/ai-analysis', methods=['POST'])
+def ai_analysis():
+    try:
+        data = request.get_json()
+        question = data.get('question', '')
+        mode = data.get('mode', 'query')  # Default to query mode
+        logger.debug('AI analysis: mode=%s dataset=%s question=%r', mode, data.get('datasetId'), question)
+
+        with span('dataset'):
+            dataset, error = resolve_dataset(data)
+        if error:
+            return error
+        if dataset is None or not question:
+            return jsonify({'error': 'Missing CSV data or question'}), 400
+
+        df = dataset.df
+        with span('prompt'):
+            prompt = build_code_prompt(question, list(df.columns), mode)
+        logger.debug('DataFrame shape %s; prompt: %s', df.shape, prompt)
+
+        # Use the shared Ollama client; the model list is cached and refreshed in the background
+        with span('select_model'):
+            model_name, error = ollama_service.select_chat_model()
+        if error:
+            logger.debug('No chat model: %s', error)
+            return jsonify({'error': error}), 500
         
-        print(f"DEBUG: About to call client.chat with model: {model_name}")
-        try:
-            response = client.chat(model=model_name, messages=[{'role': 'user', 'content': prompt}])
-            print('DEBUG: client.chat response:', response)
-            print('DEBUG: Type of response:', type(response))
-            
-            # Extract content from response
-            if hasattr(response, 'message') and hasattr(response.message, 'content'):
-                # It's a ChatResponse object
-                code = response.message.content.strip().split('\n')[0]
-                print('DEBUG: Extracted code from ChatResponse:', code)
-            elif isinstance(response, dict) and 'message' in response:
-                code = response['message']['content'].strip().split('\n')[0]
-                print('DEBUG: Extracted code from dict:', code)
-            else:
-                print('DEBUG: Unexpected response format:', response)
-                return jsonify({'error': 'Unexpected response format from Ollama'}), 500
+        cache_key = llm_cache.make_key(dataset.etag, question, mode, model_name)
+        content = llm_cache.get(cache_key)
+        cached = content is not None
+        if not cached:
+            logger.debug('Calling chat with model %s', model_name)
+            try:
+                messages = [{'role': 'user', 'content': prompt}]
+                with span('llm'):
+                    response = llm_scheduler.run(llm_scheduler.make_key(model_name, messages),
+                                                 lambda: ollama_service.chat(model_name, messages))
+                logger.debug('Chat response: %r', response)
                 
-        except Exception as e:
-            print(f'DEBUG: Error in client.chat(): {e}')
-            return jsonify({'error': f'Error calling Ollama chat: {str(e)}'}), 500
+                content = message_content(response)
+                if content is None:
+                    logger.debug('Unexpected response format: %r', response)
+                    return jsonify({'error': 'Unexpected response format from Ollama'}), 500
+                    
+            except QueueFull as e:
+                logger.debug('LLM queue full, retry after %ss', e.retry_after)
+                return queue_full_response(e)
+            except Exception as e:
+                logger.debug('Error in chat(): %s', e)
+                return jsonify({'error': f'Error calling Ollama chat: {str(e)}'}), 500
+            llm_cache.set(cache_key, content)
 
-        print(f'DEBUG: Generated code: {code}')
+        code = content.strip().split('\n')[0]
+        logger.debug('Generated code (cached=%s): %s', cached, code)
 
-        # Handle filter mode differently - don't execute JavaScript code on backend
+        # Filter mode: evaluate the expression here and send back the matching row set
         if mode == 'filter':
-            print('DEBUG: Filter mode - returning JavaScript code without execution')
-            return jsonify({'code': code, 'output': None, 'mode': 'filter'})
+            try:
+                with span('filter'):
+                    filtered = apply_filter(df, code)
+            except FilterError as e:
+                logger.debug('Invalid filter expression: %s', code)
+                return jsonify({'error': str(e), 'code': code}), 400
+            logger.debug('Filter matched %s rows', filtered['count'])
+            with span('serialize'):
+                return jsonify({'code': code, 'output': None, 'mode': 'filter', 'dataset_id': dataset.dataset_id,
+                                'cached': cached, 'filter': filtered})
         
         # For query mode, validate and execute pandas code
         # Only allow code that starts with 'df'
         if not code.startswith('df'):
-            print('DEBUG: Code does not start with df:', code)
+            logger.debug('Code does not start with df: %s', code)
             return jsonify({'error': 'Generated code is not safe or valid.'}), 400
 
         # Execute the code safely
+        with span('query'):
+            result, error = run_query_code(code, df)
+        if error:
+            return jsonify({'error': error}), 400
+
+        with span('serialize'):
+            return jsonify({'code': code, **result, 'dataset_id': dataset.dataset_id, 'cached': cached})
+
+    except Exception as e:
+        logger.exception('Unexpected error in ai_analysis')
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload"""
+    return f'event: {event}\ndata: {json.dumps(data, default=str)}\n\n'
+
+@app.route('/api/ai-analysis/stream', methods=['POST'])
+def ai_analysis_stream():
+    """Streaming variant of /api/ai-analysis that forwards model tokens over SSE.
+
+    Emits ``start``, then ``token`` events as the model generates, then a
+    ``done`` event carrying the same fields as /api/ai-analysis plus
+    ``first_token_ms`` and ``total_ms``. Generation stops upstream when the
+    client disconnects or calls /api/ai-analysis/cancel/<request_id> with the
+    ``request_id`` of the ``start`` event.
+    """
+    started_at = time.time()
+    data = request.get_json()
+    question = data.get('question', '')
+    mode = data.get('mode', 'query')
+    # Generated here rather than taken from the client, so ids can't collide or be guessed to cancel others
+    request_id = uuid.uuid4().hex
+
+    dataset, error = resolve_dataset(data)
+    if error:
+        return error
+    if dataset is None or not question:
+        return jsonify({'error': 'Missing CSV data or question'}), 400
+
+    df = dataset.df
+    prompt = build_code_prompt(question, list(df.columns), mode)
+    model_name, error = ollama_service.select_chat_model()
+    if error:
+        return jsonify({'error': error}), 500
+
+    cache_key = llm_cache.make_key(dataset.etag, question, mode, model_name)
+    cached_content = llm_cache.get(cache_key)
+    # Registered up front so a cancel can arrive before the first token
+    stream = None
+    slot = None
+    if cached_content is None:
+        # Streams hold their slot until the last token, so they are not coalesced
         try:
-            allowed_builtins = {'df': df}
-            result = eval(code, {"__builtins__": {}}, allowed_builtins)
-            print('DEBUG: Code execution result:', result)
-            print('DEBUG: Type of result:', type(result))
-            # Convert result to string for JSON
-            if hasattr(result, 'to_dict'):
-                result = result.to_dict()
-            elif hasattr(result, 'tolist'):
-                result = result.tolist()
+            slot = llm_scheduler.acquire()
+        except QueueFull as e:
+            return queue_full_response(e)
+        stream = ollama_service.open_stream(request_id, model_name, [{'role': 'user', 'content': prompt}])
+
+    def finish():
+        if slot is not None:
+            slot.release()
+        ollama_service.close_stream(request_id)
+
+    def generate():
+        cached = cached_content is not None
+        yield sse_event('start', {'request_id': request_id, 'model': model_name, 'cached': cached})
+        try:
+            if cached:
+                content = cached_content
+                first_token_ms = round((time.time() - started_at) * 1000, 1)
+                yield sse_event('token', {'content': content})
             else:
-                result = str(result)
-            print('DEBUG: Final result for JSON:', result)
+                pieces = []
+                tokens = iter(stream)
+                try:
+                    for piece in tokens:
+                        pieces.append(piece)
+                        yield sse_event('token', {'content': piece})
+                finally:
+                    # Also runs when the browser disconnects, which closes the upstream request
+                    tokens.close()
+                if stream.cancelled.is_set():
+                    yield sse_event('cancelled', {'request_id': request_id})
+                    return
+                content = ''.join(pieces)
+                llm_cache.set(cache_key, content)
+                first_token_ms = stream.first_token_ms
+                metrics.observe('stage_seconds', stream.total_ms / 1000, stage='llm_stream')
+                if first_token_ms is not None:
+                    metrics.observe('stage_seconds', first_token_ms / 1000, stage='llm_first_token')
+
+            code = content.strip().split('\n')[0]
+            result = {
+                'code': code,
+                'output': None,
+                'mode': mode,
+                'dataset_id': dataset.dataset_id,
+                'cached': cached,
+                'first_token_ms': first_token_ms,
+                'queue_ms': slot.wait_ms if slot is not None else 0
+            }
+            if mode == 'filter':
+                try:
+                    with metrics.span('filter'):
+                        result['filter'] = apply_filter(df, code)
+                except FilterError as e:
+                    yield sse_event('error', {'error': str(e), 'code': code})
+                    return
+            else:
+                if not code.startswith('df'):
+                    yield sse_event('error', {'error': 'Generated code is not safe or valid.', 'code': code})
+                    return
+                with metrics.span('query'):
+                    query_result, error = run_query_code(code, df, request_id=request_id)
+                if error:
+                    yield sse_event('error', {'error': error, 'code': code})
+                    return
+                result.update(query_result)
+            result['total_ms'] = round((time.time() - started_at) * 1000, 1)
+            yield sse_event('done', result)
         except Exception as e:
-            print(f'DEBUG: Error executing code: {e}')
-            return jsonify({'error': f'Error executing code: {e}'}), 400
+            yield sse_event('error', {'error': f'Error calling Ollama chat: {str(e)}'})
+        finally:
+            finish()
 
-        print("=== AI ANALYSIS DEBUG END ===")
-        return jsonify({'code': code, 'output': result})
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(finish)
+    return response
 
-    except Exception as e:
-        print(f'DEBUG: Unexpected error in ai_analysis: {e}')
-        return jsonify({'error': f'Server error: {str(e)}'}), 500
+@app.route('/api/ai-analysis/cancel/<request_id>', methods=['POST'])
+def cancel_ai_analysis(request_id):
+    # The request is either still generating or already running its query on the job pool
+    if not (ollama_service.cancel_stream(request_id) | job_pool.cancel_request(request_id)):
+        return jsonify({'error': 'No running request with this id', 'request_id': request_id}), 404
+    return jsonify({'success': True, 'request_id': request_id})
+
+@app.route('/api/filter', methods=['POST'])
+def filter_dataset():
+    """Evaluate a filter expression on the server and return the matching row set and one page of rows"""
+    data = request.get_json()
+    expression = data.get('expression', '')
+    dataset, error = resolve_dataset(data)
+    if error:
+        return error
+    if dataset is None or not expression:
+        return jsonify({'error': 'Missing dataset or filter expression'}), 400
+    try:
+        offset = max(0, int(data.get('offset', 0)))
+        limit = min(max(1, int(data.get('limit', FILTER_PAGE_SIZE))), 10000)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+    try:
+        result = apply_filter(dataset.df, expression, offset=offset, limit=limit)
+    except FilterError as e:
+        return jsonify({'error': str(e)}), 400
+    result['dataset_id'] = dataset.dataset_id
+    if requested_layout(data) == 'columnar':
+        del result['rows']
+        result['data'] = encode_columnar(dataset.df.iloc[result['row_positions']])
+    return jsonify(result)
+
+def parse_sort(sort):
+    """Accept sort keys as ``[{'column', 'ascending'}]`` or as ``"col:desc,other"``"""
+    if not sort:
+        return []
+    if isinstance(sort, str):
+        keys = []
+        for part in sort.split(','):
+            column, _, direction = part.partition(':')
+            keys.append({'column': column, 'ascending': direction.lower() != 'desc'})
+        return keys
+    return [{'column': key['column'], 'ascending': bool(key.get('ascending', True))} for key in sort]
+
+@app.route('/api/rows', methods=['GET', 'POST'])
+def get_rows():
+    """Serve one window of the filtered and sorted dataset.
+
+    POST takes ``datasetId``, ``offset``, ``limit``, ``sort``, ``search``,
+    ``filters`` (``{column: value}`` as in the table UI) and ``where`` (a
+    filter expression). GET takes the same as query parameters, with
+    ``dataset_id`` and ``sort=col:desc,other``. With ``include: "positions"``
+    only row positions are returned, and ``limit`` may cover the whole view.
+    ``layout`` selects the rows' encoding: lists (default), ``columnar`` JSON
+    or ``arrow`` IPC, which is also chosen by an Arrow ``Accept`` header.
+    """
+    if request.method == 'GET':
+        data = {'datasetId': request.args.get('dataset_id'), **request.args.to_dict()}
+        data.pop('dataset_id', None)
+    else:
+        data = request.get_json()
+    dataset, error = resolve_dataset(data)
+    if error:
+        return error
+    if dataset is None:
+        dataset = datasets.for_session(session_id())
+    if dataset is None:
+        return jsonify({'error': 'No dataset loaded'}), 400
+
+    positions_only = data.get('include') == 'positions'
+    try:
+        offset = max(0, int(data.get('offset', 0)))
+        limit = max(0, int(data.get('limit', ROWS_PAGE_SIZE)))
+        sort = parse_sort(data.get('sort'))
+        filters = data.get('filters') or {}
+        if isinstance(filters, str):
+            filters = json.loads(filters)
+    except (TypeError, ValueError, KeyError) as e:
+        return jsonify({'error': f'Invalid rows request: {str(e)}'}), 400
+    if not positions_only:
+        limit = min(limit, MAX_PAGE_SIZE)
+
+    layout = requested_layout(data)
+    try:
+        result = row_window(dataset, offset=offset, limit=limit, sort=sort, search=data.get('search'),
+                            filters=filters, where=data.get('where'),
+                            include_rows=not positions_only and layout == 'records')
+    except KeyError as e:
+        return jsonify({'error': f'Unknown column: {e.args[0]}'}), 400
+    except FilterError as e:
+        return jsonify({'error': str(e)}), 400
+    result['dataset_id'] = dataset.dataset_id
+    if positions_only or layout == 'records':
+        return jsonify(result)
+    page = dataset.df.iloc[result['row_positions']]
+    if layout == 'columnar':
+        return jsonify({**result, 'data': encode_columnar(page)})
+    # Arrow carries the rows only; the window metadata goes into headers
+    return Response(encode_arrow(page), mimetype=ARROW_MIME, headers={
+        'X-Dataset-Id': dataset.dataset_id,
+        'X-Total-Rows': str(result['total_rows']),
+        'X-Matched': str(result['matched']),
+        'X-Offset': str(offset)
+    })
+
+@app.route('/api/aggregate', methods=['POST'])
+def aggregate_chart():
+    """Chart-ready points computed on the cached DataFrame, capped at a point budget.
+
+    Takes ``datasetId`` (or ``csvData``) and a chart spec: ``kind`` is
+    ``groupby``, ``histogram``, ``timeseries``, ``series`` (LTTB-downsampled),
+    ``heatmap`` or ``boxplot``; ``x``, ``y``, ``agg``, ``bins``, ``interval``
+    and ``points`` refine it. Results are cached per dataset version and spec.
+    """
+    data = request.get_json(silent=True) or {}
+    dataset, error = resolve_dataset(data)
+    if error:
+        return error
+    if dataset is None:
+        dataset = datasets.for_session(session_id())
+    if dataset is None:
+        return jsonify({'error': 'No dataset loaded'}), 400
+
+    spec = {key: data.get(key) for key in ('kind', 'x', 'y', 'agg', 'bins', 'interval', 'points')}
+    key = ('aggregate', dataset.version, json.dumps(spec, sort_keys=True, default=str))
+    try:
+        with span('aggregate'):
+            result = dataset.cached(key, lambda: chart_data(dataset.df, spec, dataset.schema))
+    except (ChartError, TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({**result, 'dataset_id': dataset.dataset_id, 'version': dataset.version})
+
+def build_data_info(dataset):
+    df = dataset.df
+    schema = dataset.schema
+    return {
+        'dataset_id': dataset.dataset_id,
+        'version': dataset.version,
+        'rows': len(df),
+        'columns': len(df.columns),
+        'column_names': list(df.columns),
+        'data_types': df.dtypes.astype(str).to_dict(),
+        'missing_values': schema.missing_values(),
+        'numeric_columns': schema.columns_of_type('numeric'),
+        'categorical_columns': schema.columns_of_type('categorical'),
+        'datetime_columns': schema.columns_of_type('datetime'),
+        'text_columns': schema.columns_of_type('text'),
+        'schema': schema.to_dict(),
+        'profile': dataset.profile
+    }
 
 @app.route('/api/data-info', methods=['GET'])
 def get_data_info():
-    global current_dataset
+    """Metadata of a dataset, computed once per version; polls with a matching If-None-Match get a 304"""
+    dataset_id = request.args.get('dataset_id')
+    dataset = datasets.get(dataset_id) if dataset_id else datasets.for_session(session_id())
     
-    if current_dataset is None:
+    if dataset is None:
         return jsonify({'error': 'No dataset loaded'}), 404
+
+    etag = dataset.etag
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if etag in request.if_none_match:
+        return Response(status=304, headers=headers)
     
     try:
-        data_info = {
-            'rows': len(current_dataset),
-            'columns': len(current_dataset.columns),
-            'column_names': list(current_dataset.columns),
-            'data_types': current_dataset.dtypes.to_dict(),
-            'missing_values': current_dataset.isnull().sum().to_dict(),
-            'numeric_columns': current_dataset.select_dtypes(include=[np.number]).columns.tolist(),
-            'categorical_columns': current_dataset.select_dtypes(include=['object']).columns.tolist()
-        }
-        
-        return jsonify(data_info)
+        data_info = dataset.cached(('data_info', dataset.version), lambda: build_data_info(dataset))
+        return jsonify(data_info), 200, headers
         
     except Exception as e:
         return jsonify({'error': f'Error getting data info: {str(e)}'}), 500
 
+def build_xlsx_export(df, profile, filename):
+    """Write an XLSX export to EXPORT_DIR; runs on the job pool"""
+    return {'path': write_xlsx(df, profile, export_path(EXPORT_DIR, 'xlsx')), 'filename': f'{filename}.xlsx'}
+
+def download_response(body, filename, format_type, size=None):
+    headers = {'Content-Disposition': content_disposition(filename)}
+    if size is not None:
+        headers['Content-Length'] = str(size)
+    return Response(stream_with_context(body), mimetype=MIME_TYPES[format_type], headers=headers)
+
+def xlsx_download(export):
+    """Stream a finished XLSX export and delete it afterwards"""
+    return download_response(iter_file(export['path']), export['filename'], 'xlsx', os.path.getsize(export['path']))
+
+def export_dataset(dataset, format_type, filename, run_async=False):
+    """Binary download of ``dataset``: CSV streamed in chunks, XLSX built in constant memory on the job pool"""
+    format_type = EXPORT_FORMATS.get(format_type)
+    if format_type is None:
+        return jsonify({'error': 'Unsupported format'}), 400
+    if format_type == 'csv':
+        return download_response(iter_csv(dataset.df), f'{filename}.csv', 'csv')
+
+    # The profile is cached on the dataset, so compute it here rather than in the worker
+    job = job_pool.submit(build_xlsx_export, dataset.df, dataset.profile, filename, label='export-xlsx')
+    if run_async:
+        # Large exports: poll /api/jobs/<job_id>, then download from /api/export/<job_id>
+        return jsonify({**job.info(), 'download_url': f'/api/export/{job.job_id}'}), 202
+    return xlsx_download(job.wait())
+
 @app.route('/api/export', methods=['POST'])
 def export_data():
     try:
         data = request.get_json()
-        csv_data = data.get('csvData', '')
-        format_type = data.get('format', 'csv')
-        filename = data.get('filename', 'exported_data')
-        
-        if not csv_data:
+        dataset, error = resolve_dataset(data)
+        if error:
+            return error
+        if dataset is None:
             return jsonify({'error': 'No data provided'}), 400
-        
-        # Convert CSV string to DataFrame
-        df = pd.read_csv(io.StringIO(csv_data))
-        
-        if format_type == 'csv':
-            output = df.to_csv(index=False)
-            return jsonify({
-                'data': output,
-                'filename': f'{filename}.csv',
-                'mime_type': 'text/csv'
-            })
-        elif format_type == 'excel':
-            # Create Excel file with multiple sheets
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                df.to_excel(writer, sheet_name='Data', index=False)
-                
-                # Add statistics sheet
-                stats_df = pd.DataFrame({
-                    'Column': df.columns,
-                    'Data Type': df.dtypes.astype(str),
-                    'Missing Values': df.isnull().sum(),
-                    'Unique Values': df.nunique(),
-                    'Min': df.select_dtypes(include=[np.number]).min(),
-                    'Max': df.select_dtypes(include=[np.number]).max(),
-                    'Mean': df.select_dtypes(include=[np.number]).mean()
-                })
-                stats_df.to_excel(writer, sheet_name='Statistics', index=False)
-            
-            output.seek(0)
-            return jsonify({
-                'data': output.getvalue().decode('latin1'),  # Binary data as string
-                'filename': f'{filename}.xlsx',
-                'mime_type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            })
-        else:
-            return jsonify({'error': 'Unsupported format'}), 400
-            
+        return export_dataset(dataset, data.get('format', 'csv'), data.get('filename', 'exported_data'),
+                              run_async=data.get('async', False))
+    except Exception as e:
+        return jsonify({'error': f'Export error: {str(e)}'}), 500
+
+@app.route('/api/datasets/<dataset_id>/export', methods=['GET'])
+def download_dataset(dataset_id):
+    """Download link target, so the browser streams the file to disk instead of into memory"""
+    dataset = datasets.get(dataset_id)
+    if dataset is None:
+        return jsonify({'error': 'Dataset not found', 'dataset_id': dataset_id}), 404
+    try:
+        return export_dataset(dataset, request.args.get('format', 'csv'), request.args.get('filename', 'exported_data'))
     except Exception as e:
         return jsonify({'error': f'Export error: {str(e)}'}), 500
 
+@app.route('/api/export/<job_id>', methods=['GET'])
+def download_export(job_id):
+    job = job_pool.get(job_id)
+    if job is None or job.label != 'export-xlsx':
+        return jsonify({'error': 'Export not found', 'job_id': job_id}), 404
+    if not job.finished:
+        return jsonify(job.info()), 202
+    if job.status != 'done':
+        return jsonify({**job.info(), 'error': job.error}), 500
+    if not os.path.exists(job.result['path']):
+        return jsonify({'error': 'Export was already downloaded', 'job_id': job_id}), 410
+    return xlsx_download(job.result)
+
 @app.route('/api/export-xlsx', methods=['POST'])
 def export_xlsx():
     try:
         data = request.json
-        df = pd.DataFrame(data['data'])
-        
-        # Create Excel file in memory
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Sheet1', index=False)
-        
-        output.seek(0)
-        excel_data = base64.b64encode(output.read()).decode()
-        
-        return jsonify({
-            'success': True,
-            'data': excel_data,
-            'filename': 'export.xlsx'
-        })
+        dataset, error = resolve_dataset(data)
+        if error:
+            return error
+        if dataset is not None:
+            return export_dataset(dataset, 'xlsx', 'export')
+        # Rows posted inline: no cached profile, so no Statistics sheet
+        return xlsx_download(job_pool.run(build_xlsx_export, pd.DataFrame(data['data']), None, 'export',
+                                          label='export-xlsx'))
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+def import_file(kind, stream, dataset_id, sheet=None):
+    """Stream an uploaded XLSX or JSON/NDJSON file into ``<dataset_id>.parquet``; runs on the job pool"""
+    chunks = xlsx_chunks(stream, sheet) if kind == 'xlsx' else json_chunks(stream)
+    return import_chunks(chunks, DATA_DIR, dataset_id)
+
+def import_dataset(kind, sheet=None):
+    """Build a server-side dataset from the uploaded file and return its id, schema and first page"""
+    if 'file' not in request.files:
+        return jsonify({'success': False, 'error': 'No file uploaded'})
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'success': False, 'error': 'No file selected'})
+
+    dataset_id = hash_stream(file.stream)
+    dataset = datasets.get(dataset_id)
+    if dataset is None:
+        path = job_pool.run(import_file, kind, file.stream, dataset_id, sheet, label=f'import-{kind}')
+        dataset = datasets.add_parquet(dataset_id, path)
+    datasets.bind_session(session_id(), dataset_id)
+
+    df = dataset.df
+    page = df.iloc[:FILTER_PAGE_SIZE]
+    return jsonify({
+        'success': True,
+        **dataset.info(),
+        'columns': [str(name) for name in df.columns],
+        'schema': dataset.schema.to_dict(),
+        'offset': 0,
+        'limit': FILTER_PAGE_SIZE,
+        'data': encode_columnar(page) if requested_layout(request.form) == 'columnar' else page_records(page, slice(None))
+    })
+
 @app.route('/api/import-xlsx', methods=['POST'])
 def import_xlsx():
     try:
-        if 'file' not in request.files:
-            return jsonify({'success': False, 'error': 'No file uploaded'})
-        
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'success': False, 'error': 'No file selected'})
-        
-        # Read Excel file
-        df = pd.read_excel(file, engine='openpyxl')
-        data = df.to_dict('records')
-        
-        return jsonify({
-            'success': True,
-            'data': data,
-            'columns': list(df.columns)
-        })
+        return import_dataset('xlsx', sheet=request.form.get('sheet'))
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -344,28 +975,9 @@ def export_json():
 
 @app.route('/api/import-json', methods=['POST'])
 def import_json():
+    """Import a JSON array of objects or newline-delimited JSON"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'success': False, 'error': 'No file uploaded'})
-        
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'success': False, 'error': 'No file selected'})
-        
-        # Read JSON file
-        content = file.read().decode('utf-8')
-        data = json.loads(content)
-        
-        if isinstance(data, list) and len(data) > 0:
-            columns = list(data[0].keys())
-        else:
-            columns = []
-        
-        return jsonify({
-            'success': True,
-            'data': data,
-            'columns': columns
-        })
+        return import_dataset('json')
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -377,98 +989,98 @@ def health_check():
         'server_type': 'Flask Development Server' if request.environ.get('werkzeug.server.shutdown') else 'Other Server'
     })
 
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Scrape endpoint in the Prometheus text exposition format"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/llm-cache', methods=['GET'])
+def llm_cache_stats():
+    return jsonify(llm_cache.stats())
+
+@app.route('/api/llm-cache', methods=['DELETE'])
+def clear_llm_cache():
+    llm_cache.clear()
+    return jsonify({'success': True})
+
+@app.route('/api/llm-scheduler', methods=['GET'])
+def llm_scheduler_stats():
+    return jsonify(llm_scheduler.stats())
+
+@app.route('/api/query-executor', methods=['GET'])
+def query_executor_stats():
+    return jsonify(query_executor.stats())
+
+@app.route('/api/store', methods=['GET'])
+def dataset_store_stats():
+    if dataset_store is None:
+        return jsonify({'error': 'The dataset store is disabled'}), 404
+    return jsonify(dataset_store.stats())
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify(job_pool.stats())
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_pool.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found', 'job_id': job_id}), 404
+    return jsonify(job.info())
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    job = job_pool.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found', 'job_id': job_id}), 404
+    if not job.finished:
+        return jsonify(job.info()), 202
+    if job.status != 'done':
+        return jsonify({**job.info(), 'error': job.error}), 500
+    if job.label == 'export-xlsx':
+        return download_export(job_id)
+    return jsonify(job.result)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if not job_pool.cancel(job_id):
+        return jsonify({'error': 'No running job with this id', 'job_id': job_id}), 404
+    return jsonify({'success': True, 'job_id': job_id})
+
 @app.route('/api/test-ollama', methods=['GET'])
 def test_ollama():
     try:
-        print("=== OLLAMA TEST START ===")
-        
-        # Test Ollama connection
-        client = ollama.Client()
-        print("DEBUG: Created Ollama client")
-        
-        # Test listing models
-        models_list = client.list()
-        print("DEBUG: Models list result type:", type(models_list))
-        print("DEBUG: Models list result:", models_list)
-        
-        # Handle different response types from Ollama
-        models = []
-        if hasattr(models_list, 'models'):
-            # It's a ListResponse object
-            models = models_list.models
-            print("DEBUG: Extracted models from ListResponse:", models)
-        elif isinstance(models_list, dict):
-            models = models_list.get('models', [])
-            print("DEBUG: Extracted models from dict:", models)
-        elif isinstance(models_list, list):
-            models = models_list
-            print("DEBUG: Models list is already a list:", models)
-        else:
-            print("DEBUG: Unexpected type for models_list:", type(models_list))
-            models = []
-        
-        print("DEBUG: Final models list:", models)
-        print("DEBUG: Number of models:", len(models) if models else 0)
+        # Refresh the shared model list so the test reflects Ollama's current state
+        ollama_service.refresh()
+        models = ollama_service.models()
+        logger.debug('Models: %s', models)
         
         if not models:
             return jsonify({
                 'status': 'error',
                 'message': 'No Ollama models found',
-                'models_list_type': str(type(models_list)),
                 'suggestion': 'Run "ollama list" to see available models'
             })
         
-        # Find first model that is not 'nomic-embed-text:latest' (same logic as AI analysis)
-        model_name = None
-        for i, model in enumerate(models):
-            # Extract model name based on object type
-            current_model_name = None
-            if hasattr(model, 'name'):
-                current_model_name = model.name
-            elif hasattr(model, 'model'):
-                current_model_name = model.model
-            elif isinstance(model, dict):
-                current_model_name = model.get('name')
-            elif isinstance(model, str):
-                current_model_name = model
-            
-            print(f"DEBUG: Checking model {i}: {current_model_name}")
-            
-            # Skip 'nomic-embed-text:latest' and pick the next one
-            if current_model_name and current_model_name != 'nomic-embed-text:latest':
-                model_name = current_model_name
-                print(f"DEBUG: Selected model (skipping nomic-embed-text): {model_name}")
-                break
-        
+        # Same model selection as AI analysis
+        model_name, error = ollama_service.select_chat_model()
         if not model_name:
             return jsonify({
                 'status': 'error',
-                'message': 'No suitable Ollama models available. Please install a chat model (not embedding model).',
+                'message': error,
                 'models_found': len(models),
                 'suggestion': 'Run "ollama pull llama3" to install a chat model'
             })
         
-        print("DEBUG: Final selected model name:", model_name)
+        logger.debug('Selected model: %s', model_name)
         
         # Test simple chat
-        test_response = client.chat(
-            model=model_name, 
-            messages=[{'role': 'user', 'content': 'Say "Hello World"'}]
-        )
-        print("DEBUG: Test chat response type:", type(test_response))
-        print("DEBUG: Test chat response:", test_response)
+        test_response = ollama_service.chat(model_name, [{'role': 'user', 'content': 'Say "Hello World"'}])
+        logger.debug('Test chat response: %r', test_response)
         
-        # Extract content from response
-        if hasattr(test_response, 'message') and hasattr(test_response.message, 'content'):
-            # It's a ChatResponse object
-            response_content = test_response.message.content
-            print("DEBUG: Extracted content from ChatResponse:", response_content)
-        elif isinstance(test_response, dict):
-            response_content = test_response.get('message', {}).get('content', 'No content')
-            print("DEBUG: Extracted content from dict:", response_content)
-        else:
+        response_content = message_content(test_response)
+        if response_content is None:
             response_content = str(test_response)
-            print("DEBUG: Converted response to string:", response_content)
         
         return jsonify({
             'status': 'success',
@@ -479,36 +1091,37 @@ def test_ollama():
         })
         
     except Exception as e:
-        print(f"DEBUG: Ollama test error: {e}")
-        print(f"DEBUG: Error type: {type(e)}")
-        import traceback
-        print(f"DEBUG: Full traceback: {traceback.format_exc()}")
+        logger.debug('Ollama test failed', exc_info=True)
         return jsonify({
             'status': 'error',
             'message': f'Ollama test failed: {str(e)}',
             'error_type': type(e).__name__
         })
 
+@app.route('/api/ollama-status', methods=['GET'])
+def ollama_status():
+    return jsonify(ollama_service.status())
+
 @app.route('/api/stop', methods=['POST'])
 def stop_server():
     try:
-        print("Stop server request received")
+        logger.info('Stop server request received')
         func = request.environ.get('werkzeug.server.shutdown')
         if func is None:
-            print("Werkzeug shutdown function not available")
+            logger.warning('Werkzeug shutdown function not available')
             return jsonify({
                 'error': 'Not running with the Werkzeug Server',
                 'message': 'This endpoint only works with Flask development server (python app.py)'
             }), 500
         
-        print("Shutting down server...")
+        logger.info('Shutting down server...')
         func()
         return jsonify({
             'success': True,
             'message': 'Server shutting down...'
         })
     except Exception as e:
-        print(f"Error in stop_server: {e}")
+        logger.error('Error in stop_server: %s', e)
         return jsonify({
             'error': 'Failed to stop server',
             'message': str(e)
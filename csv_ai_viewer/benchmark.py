@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for CSV AI Viewer
+Times and memory-profiles CSV ingest, type detection, AI prompt building,
+pandas query evaluation and exports on synthetic CSVs. Ollama is replaced by
+a stub, so no model is needed. Results are written as JSON and can be
+compared against a stored baseline:
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --baseline baseline.json
+
+The default sizes are 10k, 100k and 1M rows. ``--large`` adds 10M rows,
+which needs several GB of memory and minutes per case. Results go to
+benchmark_results.json in the temp directory unless ``--output`` is given.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# The benchmark gets its own data directory and enough memory budget to keep every dataset resident
+os.environ.setdefault('CSV_VIEWER_DATA_DIR', tempfile.mkdtemp(prefix='csv_viewer_bench_'))
+os.environ.setdefault('CSV_VIEWER_MEMORY_BUDGET_MB', str(64 * 1024))
+
+import numpy as np
+import pandas as pd
+
+import app as web_app
+import server
+from datasets import Dataset
+from query_executor import _evaluate, compile_query
+
+SIZES = [10000, 100000, 1000000]
+# Opt-in with --large
+LARGE_SIZES = [10000000]
+SHAPES = ['narrow', 'wide', 'text']
+REPEAT = 3
+# Relative slowdown (or memory growth) over the baseline reported as a regression
+TOLERANCE = 0.25
+# Differences below these are noise, whatever the ratio
+MIN_SECONDS_DELTA = 0.005
+MIN_MB_DELTA = 1.0
+# XLSX exports of larger tables take minutes; raise with --xlsx-max-rows
+XLSX_MAX_ROWS = 10000
+SEED = 42
+QUESTION = 'Which category has the highest average amount?'
+QUERIES = [
+    "df.describe()",
+    "df.groupby('category')['amount'].mean()",
+    "df[df['amount'] > 500].shape[0]",
+    "df.sort_values('amount', ascending=False).head(10)",
+    "df['region'].value_counts()",
+    "df[df['note'].str.contains('late', na=False)]['quantity'].sum()"
+]
+CATEGORIES = ['Electronics', 'Clothing', 'Books', 'Home', 'Garden', 'Toys', 'Sports', 'Food']
+REGIONS = ['North', 'South', 'East', 'West']
+WORDS = ['order', 'shipped', 'late', 'returned', 'customer', 'gift', 'priority', 'damaged', 'express', 'standard']
+
+
+class StubOllama:
+    """Stands in for OllamaService: one model and an instant canned answer"""
+
+    def __init__(self, answer='Electronics has the highest average amount.'):
+        self.answer = answer
+        self.chats = 0
+
+    def select_chat_model(self, preferred=None):
+        return preferred or 'llama3', None
+
+    def chat(self, model, messages, **kwargs):
+        self.chats += 1
+        return {'model': model, 'message': {'role': 'assistant', 'content': self.answer}, 'done': True,
+                'prompt_eval_count': len(messages[-1]['content']) // 4, 'eval_count': len(self.answer) // 4}
+
+
+def make_frame(rows, shape, seed=SEED):
+    """Synthetic table mixing numeric, categorical, datetime and free-text columns.
+
+    ``narrow`` has 7 columns, ``wide`` adds 40 numeric and text columns and
+    ``text`` adds three long free-text columns. About 2% of amounts and
+    regions are missing.
+    """
+    rng = np.random.default_rng(seed)
+    sentences = np.array([' '.join(rng.choice(WORDS, 6)) for _ in range(1000)], dtype=object)
+    df = pd.DataFrame({
+        'id': np.arange(rows),
+        'amount': np.round(rng.gamma(2.0, 250.0, rows), 2),
+        'quantity': rng.integers(1, 50, rows),
+        'category': rng.choice(CATEGORIES, rows),
+        'region': rng.choice(REGIONS, rows).astype(object),
+        'created': pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 4 * 365 * 86400, rows), unit='s'),
+        'note': rng.choice(sentences, rows)
+    })
+    missing = rng.random(rows) < 0.02
+    df.loc[missing, 'amount'] = np.nan
+    df.loc[rng.random(rows) < 0.02, 'region'] = None
+    if shape == 'wide':
+        for i in range(20):
+            df[f'metric_{i}'] = np.round(rng.normal(100, 15, rows), 3)
+            df[f'label_{i}'] = rng.choice(np.array([f'L{i}_{k}' for k in range(50)]), rows)
+    elif shape == 'text':
+        for i in range(3):
+            df[f'comment_{i}'] = rng.choice(sentences, rows) + ' ' + rng.choice(sentences, rows)
+    elif shape != 'narrow':
+        raise ValueError(f'Unknown shape {shape}; expected one of {", ".join(SHAPES)}')
+    return df
+
+
+def dataset_csv(data_dir, rows, shape):
+    """Path of the synthetic CSV, generated on first use and reused afterwards"""
+    path = os.path.join(data_dir, f'{shape}-{rows}.csv')
+    if not os.path.exists(path):
+        make_frame(rows, shape).to_csv(path, index=False)
+    return path
+
+
+def measure(fn, repeat):
+    """Best wall time of ``repeat`` runs, then one run under tracemalloc for the peak traced allocation.
+
+    tracemalloc sees Python objects and numpy buffers but not memory that C
+    libraries allocate on their own, and it slows the run down, so the
+    timing runs are separate.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': min(times), 'mean_seconds': sum(times) / len(times), 'peak_mb': peak / (1024 * 1024)}
+
+
+def fresh_dataset(df, tag):
+    """A Dataset without cached schema or profile, so derived data is recomputed on every run"""
+    return Dataset(f'bench-{tag}-{time.perf_counter_ns()}', df)
+
+
+def run_case(name, rows, shape, fn, repeat, results):
+    result = {'name': name, 'rows': rows, 'shape': shape, **measure(fn, repeat)}
+    result['rows_per_second'] = rows / result['seconds'] if result['seconds'] else None
+    results.append(result)
+    print(f"   {name:<24} {result['seconds'] * 1000:>10.1f} ms {result['peak_mb']:>10.1f} MB")
+    return result
+
+
+def benchmark_table(path, rows, shape, repeat, xlsx_max_rows, results):
+    run_case('ingest.read_csv', rows, shape, lambda: pd.read_csv(path), repeat, results)
+    df = pd.read_csv(path)
+
+    # infer_schema; the wide shape's labels carry digits, the case that used to try every date format
+    run_case('detect_data_types', rows, shape, lambda: server.detect_data_types(df), repeat, results)
+    run_case('prompt.build', rows, shape,
+             lambda: server.build_analysis_prompt(server.build_data_info(fresh_dataset(df, 'prompt')), QUESTION),
+             repeat, results)
+    # A new dataset id per run keeps the answer cache out of the measurement
+    run_case('ai_analysis.stubbed', rows, shape,
+             lambda: server.ai_analysis(server.build_data_info(fresh_dataset(df, 'ai')), QUESTION),
+             repeat, results)
+
+    plans = [compile_query(code) for code in QUERIES]
+    run_case('query.eval', rows, shape, lambda: [_evaluate(plan, df) for plan in plans], repeat, results)
+
+    dataset = web_app.datasets.add_dataframe(f'bench-{shape}-{rows}', df, persist=False)
+    client = web_app.app.test_client()
+
+    def export_csv():
+        response = client.post('/api/export', json={'datasetId': dataset.dataset_id, 'format': 'csv'})
+        if response.status_code != 200:
+            raise RuntimeError(f'CSV export failed: {response.status_code}')
+        return len(response.get_data())
+
+    run_case('export.csv', rows, shape, export_csv, repeat, results)
+    if rows <= xlsx_max_rows:
+        # The same function the export job runs, called in-process so its memory is traced
+        def export_xlsx():
+            export = web_app.build_xlsx_export(df, dataset.profile, 'benchmark')
+            os.remove(export['path'])
+
+        run_case('export.xlsx', rows, shape, export_xlsx, repeat, results)
+    web_app.datasets.remove(dataset.dataset_id)
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of ``results`` against ``baseline``: slower or larger by more than ``tolerance``"""
+    previous = {(entry['name'], entry['rows'], entry['shape']): entry for entry in baseline['results']}
+    regressions = []
+    for entry in results:
+        base = previous.get((entry['name'], entry['rows'], entry['shape']))
+        if base is None:
+            continue
+        for metric, floor in (('seconds', MIN_SECONDS_DELTA), ('peak_mb', MIN_MB_DELTA)):
+            old, new = base[metric], entry[metric]
+            if new > old * (1 + tolerance) and new - old > floor:
+                regressions.append({'name': entry['name'], 'rows': entry['rows'], 'shape': entry['shape'],
+                                    'metric': metric, 'baseline': old, 'current': new,
+                                    'change': (new - old) / old if old else None})
+    return regressions
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+
+
+def parse_list(value, convert=str):
+    return [convert(item) for item in value.split(',') if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CSV AI Viewer data paths on synthetic CSVs')
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)),
+                        help='comma-separated row counts, e.g. 10000,100000')
+    parser.add_argument('--shapes', default=','.join(SHAPES), help=f'comma-separated subset of {",".join(SHAPES)}')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='timed runs per case; the best is kept')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'csv_viewer_benchmark'),
+                        help='where synthetic CSVs are generated and reused')
+    parser.add_argument('--xlsx-max-rows', type=int, default=XLSX_MAX_ROWS,
+                        help='skip XLSX exports of larger tables')
+    parser.add_argument('--large', action='store_true',
+                        help=f'also run {",".join(map(str, LARGE_SIZES))} rows (several GB of memory)')
+    parser.add_argument('--output', default=os.path.join(tempfile.gettempdir(), 'benchmark_results.json'),
+                        help='JSON file to write results to')
+    parser.add_argument('--baseline', help='JSON results to compare against; regressions exit with status 1')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='relative slowdown or memory growth allowed before flagging a regression')
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    server.ollama_service = StubOllama()
+    sizes = parse_list(args.sizes, int)
+    if args.large:
+        sizes += [rows for rows in LARGE_SIZES if rows not in sizes]
+    results = []
+    for shape in parse_list(args.shapes):
+        for rows in sizes:
+            print(f"\n📋 {shape} table, {rows:,} rows")
+            path = dataset_csv(args.data_dir, rows, shape)
+            benchmark_table(path, rows, shape, max(1, args.repeat), args.xlsx_max_rows, results)
+
+    report = {'environment': environment(), 'results': results}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report['baseline'] = args.baseline
+        report['regressions'] = compare(results, baseline, args.tolerance)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📊 Results written to {args.output}")
+
+    regressions = report.get('regressions', [])
+    for regression in regressions:
+        print(f"❌ {regression['name']} ({regression['shape']}, {regression['rows']:,} rows): "
+              f"{regression['metric']} {regression['baseline']:.3f} -> {regression['current']:.3f}")
+    if args.baseline and not regressions:
+        print(f"✅ No regressions against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from profiling import to_python
+
+# Points returned per chart unless the request asks for fewer (or up to MAX_POINTS)
+DEFAULT_POINTS = 1000
+MAX_POINTS = 10000
+HISTOGRAM_MAX_BINS = 50
+AGGREGATES = ('count', 'sum', 'mean', 'median', 'min', 'max')
+KINDS = ('groupby', 'histogram', 'timeseries', 'series', 'heatmap', 'boxplot')
+# Columns each kind can't do without
+REQUIRED_COLUMNS = {'groupby': ('x',), 'histogram': ('x',), 'timeseries': ('x',), 'series': ('y',),
+                    'heatmap': ('x', 'y'), 'boxplot': ('x', 'y')}
+# Bucket widths tried for time series, finest first, with their (longest) length;
+# the first one that fits the point budget wins
+TIME_INTERVALS = [('1s', '1s'), ('1min', '1min'), ('5min', '5min'), ('15min', '15min'), ('1H', '1H'),
+                  ('6H', '6H'), ('1D', '1D'), ('7D', '7D'), ('1MS', '31D'), ('3MS', '92D'), ('1YS', '366D')]
+
+
+class ChartError(ValueError):
+    """A chart spec that can't be aggregated (unknown kind or column, non-numeric values, ...)"""
+
+
+def numbers(column):
+    values = column if pd.api.types.is_numeric_dtype(column) else pd.to_numeric(column, errors='coerce')
+    return values.astype('int64') if pd.api.types.is_bool_dtype(values) else values
+
+
+def timestamps(column, column_schema=None):
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return column
+    fmt = column_schema.datetime_format if column_schema is not None else None
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return pd.to_datetime(column, format=fmt, errors='coerce')
+
+
+def labels(column):
+    """Group labels as the table UI shows them, empty values grouped as 'Unknown'"""
+    return column.astype(str).where(column.notna() & (column.astype(str) != ''), 'Unknown')
+
+
+def point(x, y, **extra):
+    x, y = to_python(x), to_python(y)
+    return {'x': x, 'y': y, 'value': y, **extra}
+
+
+def lttb(x, y, threshold):
+    """Indices of the ``threshold`` points Largest-Triangle-Three-Buckets keeps from a series sorted by x.
+
+    The first and last points are always kept; every bucket in between
+    contributes the point forming the largest triangle with the previous pick
+    and the average of the next bucket, which preserves peaks and dips.
+    """
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        return np.array([0, n - 1][:threshold], dtype=np.int64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    picked = np.empty(threshold, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        picked[bucket + 1] = previous
+    return picked
+
+
+def aggregate_values(grouped, agg):
+    if agg not in AGGREGATES:
+        raise ChartError(f'Unknown aggregate {agg}; expected one of {", ".join(AGGREGATES)}')
+    return grouped.size() if agg == 'count' else getattr(grouped, agg)()
+
+
+def group_by(df, x, y, agg, points):
+    """One point per distinct ``x``: the row count or ``agg`` of ``y``, largest groups first"""
+    keys = labels(df[x])
+    if agg == 'count' or y is None:
+        values = keys.value_counts(sort=True)
+    else:
+        values = aggregate_values(numbers(df[y]).groupby(keys), agg).dropna().sort_values(ascending=False)
+    return [point(key, value, label=key) for key, value in values.head(points).items()], len(values)
+
+
+def histogram(df, x, bins, points):
+    values = numbers(df[x]).dropna()
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return [], 0
+    bins = int(bins or min(10, np.ceil(np.sqrt(len(values)))))
+    counts, edges = np.histogram(values, bins=max(1, min(bins, HISTOGRAM_MAX_BINS, points)))
+    return [point(f'{start:.1f}-{end:.1f}', int(count), start=float(start), end=float(end))
+            for start, end, count in zip(edges[:-1], edges[1:], counts)], len(counts)
+
+
+def time_series(df, x, y, agg, interval, points, column_schema=None):
+    """``agg`` of ``y`` (row counts without one) per time bucket; the interval is chosen to fit ``points``"""
+    times = timestamps(df[x], column_schema)
+    values = numbers(df[y]) if y is not None and agg != 'count' else pd.Series(1, index=df.index)
+    series = pd.Series(values.to_numpy(), index=times.to_numpy())
+    series = series[series.index.notna()]
+    if len(series) == 0:
+        return [], 0, interval
+    if interval is None:
+        span = series.index.max() - series.index.min()
+        interval = next((step for step, width in TIME_INTERVALS if span / pd.Timedelta(width) < points),
+                        TIME_INTERVALS[-1][0])
+    resampled = aggregate_values(series.resample(interval), 'count' if agg == 'count' else agg).dropna()
+    data = [point(time.isoformat(), value) for time, value in resampled.head(points).items()]
+    return data, len(resampled), interval
+
+
+def series(df, x, y, points, column_schema=None):
+    """(x, y) pairs sorted by ``x`` and downsampled with LTTB; row positions stand in for text x values"""
+    values = numbers(df[y])
+    positions = pd.Series(np.arange(len(df), dtype=np.float64), index=df.index)
+    x_type = column_schema.type if column_schema is not None else None
+    is_time = False
+    if x is None or x == 'Index':
+        xs, x_labels = positions, None
+    elif x_type == 'datetime' or pd.api.types.is_datetime64_any_dtype(df[x]):
+        times = timestamps(df[x], column_schema)
+        nanoseconds = times.to_numpy().astype('datetime64[ns]').astype(np.int64)
+        xs, x_labels, is_time = pd.Series(nanoseconds, index=df.index).where(times.notna()), None, True
+    elif x_type in (None, 'numeric'):
+        xs, x_labels = numbers(df[x]), None
+    else:
+        xs, x_labels = positions, df[x]
+    valid = xs.notna() & values.notna()
+    order = np.argsort(xs[valid].to_numpy(), kind='stable')
+    x_sorted = xs[valid].to_numpy(dtype=np.float64)[order]
+    y_sorted = values[valid].to_numpy(dtype=np.float64)[order]
+    picked = lttb(x_sorted, y_sorted, points)
+    if is_time:
+        # Only the kept points are formatted
+        shown = pd.to_datetime(x_sorted[picked].astype(np.int64)).strftime('%Y-%m-%dT%H:%M:%S')
+    elif x_labels is None:
+        shown = x_sorted[picked]
+    else:
+        shown = x_labels[valid].to_numpy()[order][picked]
+    return [point(x_value, y_value) for x_value, y_value in zip(shown, y_sorted[picked])], len(x_sorted)
+
+
+def heatmap(df, x, y, points):
+    counts = df.groupby([labels(df[x]), labels(df[y])]).size().sort_values(ascending=False)
+    x_index = {key: i for i, key in enumerate(pd.unique(counts.index.get_level_values(0)))}
+    y_index = {key: i for i, key in enumerate(pd.unique(counts.index.get_level_values(1)))}
+    return [{'x': x_key, 'y': y_key, 'value': int(count), 'xIndex': x_index[x_key], 'yIndex': y_index[y_key]}
+            for (x_key, y_key), count in counts.head(points).items()], len(counts)
+
+
+def box_plot(df, x, y, points):
+    values = numbers(df[y])
+    grouped = values.groupby(labels(df[x]))
+    stats = grouped.quantile([0, 0.25, 0.5, 0.75, 1]).unstack().dropna(how='all')
+    sizes = grouped.count()
+    stats = stats.loc[sizes.reindex(stats.index).sort_values(ascending=False).index]
+    return [point(key, row[0.5], min=to_python(row[0]), q1=to_python(row[0.25]), q3=to_python(row[0.75]),
+                  max=to_python(row[1]), count=int(sizes[key]))
+            for key, row in stats.head(points).iterrows()], len(stats)
+
+
+def chart_data(df, spec, schema=None):
+    """Chart-ready points for ``spec``, in the point format the chart renderer of the UI takes.
+
+    ``spec`` has ``kind`` (one of KINDS), ``x``, ``y``, ``agg``, ``bins``,
+    ``interval`` and ``points`` (the point budget). Returns a dict with the
+    points, the number of groups/points before the budget was applied and
+    whether the result was reduced to fit. ``schema`` (the dataset's) tells
+    how to parse date columns stored as text.
+    """
+    kind = spec.get('kind')
+    x, y = spec.get('x'), spec.get('y')
+    agg = spec.get('agg') or 'count'
+    points = min(max(int(spec.get('points') or DEFAULT_POINTS), 1), MAX_POINTS)
+    if kind not in KINDS:
+        raise ChartError(f'Unknown chart kind {kind}; expected one of {", ".join(KINDS)}')
+    for axis in REQUIRED_COLUMNS[kind]:
+        if spec.get(axis) is None:
+            raise ChartError(f'{kind.capitalize()} charts need {"an" if axis == "x" else "a"} {axis} column')
+    for column in (x, y):
+        if column is not None and column not in df.columns and not (column == 'Index' and kind == 'series'):
+            raise ChartError(f'Unknown column: {column}')
+
+    x_schema = schema.columns.get(x) if schema is not None else None
+    result = {'kind': kind}
+    if kind == 'groupby':
+        data, total = group_by(df, x, y, agg, points)
+    elif kind == 'histogram':
+        data, total = histogram(df, x, spec.get('bins'), points)
+    elif kind == 'timeseries':
+        data, total, result['interval'] = time_series(df, x, y, agg, spec.get('interval'), points, x_schema)
+    elif kind == 'series':
+        data, total = series(df, x, y, points, x_schema)
+    elif kind == 'heatmap':
+        data, total = heatmap(df, x, y, points)
+    else:
+        data, total = box_plot(df, x, y, points)
+    result.update({'points': data, 'total': total, 'reduced': len(data) < total})
+    return result
@@ -0,0 +1,383 @@
+import copy
+import hashlib
+import io
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import pandas as pd
+
+from mutations import apply_changes, refresh_profile, validate_changes
+from profiling import profile_dataframe
+from schema import infer_schema
+
+# Browser sessions whose current dataset is remembered; the least recently active are forgotten
+MAX_SESSIONS = 10000
+# Seconds between an edit and writing the edited dataset to the store
+FLUSH_DELAY = 5
+
+
+def content_hash(data):
+    """Return the content address used as a dataset id"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+def read_csv_text(csv_data):
+    return pd.read_csv(io.StringIO(csv_data))
+
+
+def dataframe_nbytes(df):
+    """Return the in-memory size of a DataFrame, including object payloads"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class Dataset:
+    """A parsed dataset held by the registry, optionally backed by a Parquet file or the store"""
+
+    def __init__(self, dataset_id, df, path=None, schema=None, profile=None, store=None):
+        self.dataset_id = dataset_id
+        self.df = df
+        self.path = path
+        self.store = store
+        self.nbytes = dataframe_nbytes(df)
+        self.created_at = time.time()
+        self.last_access = self.created_at
+        self._schema = schema
+        self._profile = profile
+        # Bumped on every mutation; derived structures and ETags are tied to it
+        self.version = 1
+        self._derived = {}
+        self._derived_lock = threading.Lock()
+        # Edited since it was last written to the store; such datasets are spilled rather than dropped
+        self.dirty = False
+        # Running column aggregates kept up to date by edits (see mutations.py)
+        self.column_stats = {}
+        # Columns whose profile entry is out of date after edits; refreshed when the profile is read
+        self.stale_profile = set()
+        self.write_lock = threading.Lock()
+
+    @property
+    def etag(self):
+        """Strong ETag of the current version (unquoted)"""
+        return f'{self.dataset_id}-{self.version}'
+
+    def bump_version(self):
+        """Mark the data as changed: drop derived structures and move to a new version"""
+        with self._derived_lock:
+            self.version += 1
+            self._derived = {}
+        return self.version
+
+    @property
+    def editable(self):
+        """Whether edits apply in place; uploads are shared by content hash and are copied first"""
+        return self.version > 1
+
+    @property
+    def schema(self):
+        """Column schema, inferred on first use and then shared by all endpoints"""
+        if self._schema is None:
+            self._schema = infer_schema(self.df)
+            if self.store is not None:
+                self.store.save_metadata(self.dataset_id, schema=self._schema)
+        return self._schema
+
+    @property
+    def profile(self):
+        """Per-column statistics, computed once and reused by every question"""
+        if self._profile is None:
+            self.stale_profile.clear()
+            self._profile = profile_dataframe(self.df, self.schema)
+            if self.store is not None:
+                self.store.save_metadata(self.dataset_id, profile=self._profile)
+        elif self.stale_profile:
+            refresh_profile(self, self._profile)
+        return self._profile
+
+    def cached(self, key, compute):
+        """Return a structure derived from the data (sort index, aggregate, ...), computing it once"""
+        with self._derived_lock:
+            if key in self._derived:
+                return self._derived[key]
+        value = compute()
+        with self._derived_lock:
+            return self._derived.setdefault(key, value)
+
+    def info(self):
+        return {
+            'dataset_id': self.dataset_id,
+            'rows': len(self.df),
+            'columns': len(self.df.columns),
+            'column_names': list(self.df.columns),
+            'memory_bytes': self.nbytes,
+            'version': self.version
+        }
+
+
+class DatasetRegistry:
+    """Content-addressed cache of parsed DataFrames with a memory budget.
+
+    Datasets are keyed by the hash of their CSV content, so uploading the same
+    file twice is a no-op. When the total size of the resident DataFrames goes
+    over ``memory_budget`` bytes the least recently used datasets are evicted:
+    spilled when they can be reopened from the store or their Parquet file,
+    dropped otherwise. CSV text is parsed with ``parse_csv``. With a ``store``
+    every dataset is also written to disk and evicted or not-yet-loaded
+    datasets (e.g. after a restart) are reopened from there; edits are
+    written out ``flush_delay`` seconds after they are made and by
+    ``flush()``, which the app calls on shutdown.
+
+    Each browser session has its own handle to the dataset it uploaded last,
+    so concurrent users never see each other's current file.
+    """
+
+    def __init__(self, memory_budget, parse_csv=read_csv_text, store=None, flush_delay=FLUSH_DELAY):
+        self.memory_budget = memory_budget
+        self.parse_csv = parse_csv
+        self.store = store
+        self.flush_delay = flush_delay
+        self._flush_requested = threading.Event()
+        self._flush_thread = None
+        self._datasets = OrderedDict()
+        self._files = {}
+        self._sessions = OrderedDict()
+        # dataset id -> [hits, loads]; loads count parses and reloads after eviction
+        self._access = {}
+        self.evictions = 0
+        self._lock = threading.RLock()
+
+    def __contains__(self, dataset_id):
+        with self._lock:
+            if dataset_id in self._datasets or dataset_id in self._files:
+                return True
+        return self.store is not None and dataset_id in self.store
+
+    def __len__(self):
+        with self._lock:
+            return len(self._datasets)
+
+    @property
+    def total_bytes(self):
+        with self._lock:
+            return sum(dataset.nbytes for dataset in self._datasets.values())
+
+    def add_csv(self, csv_data):
+        """Parse CSV text once and register it, reusing an existing entry"""
+        dataset_id = content_hash(csv_data)
+        dataset = self.get(dataset_id)
+        if dataset is not None:
+            return dataset
+        df = self.parse_csv(csv_data)
+        return self.add_dataframe(dataset_id, df)
+
+    def add_parquet(self, dataset_id, path):
+        """Register a dataset stored as Parquet; it is reloaded from disk after eviction"""
+        with self._lock:
+            self._files[dataset_id] = path
+        dataset = self.get(dataset_id)
+        if dataset is None:
+            raise FileNotFoundError(path)
+        if self.store is not None and dataset_id in self.store:
+            # The store now holds the data, so the upload's Parquet copy is redundant
+            with self._lock:
+                self._files.pop(dataset_id, None)
+            dataset.path = None
+            os.remove(path)
+        return dataset
+
+    def add_dataframe(self, dataset_id, df, path=None, persist=True, schema=None, profile=None):
+        """Register an already parsed DataFrame under ``dataset_id``"""
+        if persist and self.store is not None:
+            self.store.save(dataset_id, df)
+        dataset = Dataset(dataset_id, df, path=path, schema=schema, profile=profile, store=self.store)
+        with self._lock:
+            self._datasets[dataset_id] = dataset
+            self._datasets.move_to_end(dataset_id)
+            self._access.setdefault(dataset_id, [0, 0])[1] += 1
+            self._evict(keep=dataset_id)
+        return dataset
+
+    def get(self, dataset_id):
+        """Return the dataset for ``dataset_id``, reloading file-backed ones, or None"""
+        with self._lock:
+            dataset = self._datasets.get(dataset_id)
+            if dataset is not None:
+                self._datasets.move_to_end(dataset_id)
+                self._access[dataset_id][0] += 1
+                dataset.last_access = time.time()
+                return dataset
+            path = self._files.get(dataset_id)
+        stored = self.store.load(dataset_id) if self.store is not None and dataset_id in self.store else None
+        if stored is not None:
+            df, schema, profile, version = stored
+            dataset = self.add_dataframe(dataset_id, df, persist=False, schema=schema, profile=profile)
+            dataset.version = version
+        elif path is not None and os.path.exists(path):
+            dataset = self.add_dataframe(dataset_id, pd.read_parquet(path), path=path)
+        else:
+            return None
+        return dataset
+
+    def fork(self, dataset):
+        """Register a private copy of ``dataset`` under a new id, for editing.
+
+        Uploads are keyed by their content hash and may be shared by several
+        sessions, so the first edit copies the data instead of changing it
+        under everyone else (and under its hash).
+        """
+        with dataset.write_lock:
+            df = dataset.df.copy()
+            schema = copy.deepcopy(dataset.schema)
+            profile = copy.deepcopy(dataset.profile)
+        forked = self.add_dataframe(uuid.uuid4().hex, df, persist=False, schema=schema, profile=profile)
+        forked.version = dataset.version
+        forked.dirty = True
+        return forked
+
+    def edit(self, dataset, changes):
+        """Apply a batch of deltas (see ``mutations.apply_changes``) and return the edited dataset.
+
+        The batch is validated before anything changes. The returned dataset is
+        a fork with a new id when ``dataset`` was not editable yet.
+        """
+        validate_changes(dataset.df, changes)
+        if not dataset.editable:
+            dataset = self.fork(dataset)
+        with dataset.write_lock:
+            shape = dataset.df.shape
+            apply_changes(dataset, changes)
+            if dataset.df.shape != shape:
+                dataset.nbytes = dataframe_nbytes(dataset.df)
+            dataset.dirty = True
+            dataset.bump_version()
+        with self._lock:
+            self._evict(keep=dataset.dataset_id)
+        self._request_flush()
+        return dataset
+
+    def bind_session(self, session_id, dataset_id):
+        """Make ``dataset_id`` the current dataset of ``session_id``"""
+        with self._lock:
+            self._sessions[session_id] = dataset_id
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+
+    def for_session(self, session_id):
+        """Return the current dataset of ``session_id``, or None if it has not uploaded one"""
+        with self._lock:
+            dataset_id = self._sessions.get(session_id)
+            if dataset_id is None:
+                return None
+            self._sessions.move_to_end(session_id)
+        return self.get(dataset_id)
+
+    def remove(self, dataset_id):
+        with self._lock:
+            dataset = self._datasets.pop(dataset_id, None)
+            path = self._files.pop(dataset_id, None)
+            self._access.pop(dataset_id, None)
+            for session_id in [s for s, d in self._sessions.items() if d == dataset_id]:
+                del self._sessions[session_id]
+        stored = self.store.remove(dataset_id) if self.store is not None else False
+        return dataset is not None or path is not None or stored
+
+    def _evict(self, keep=None):
+        total = sum(dataset.nbytes for dataset in self._datasets.values())
+        for dataset_id in list(self._datasets):
+            if total <= self.memory_budget:
+                break
+            if dataset_id == keep:
+                continue
+            dataset = self._datasets[dataset_id]
+            if dataset.dirty and not self._spill(dataset):
+                # Edited data that can't be written out would be lost
+                continue
+            total -= self._datasets.pop(dataset_id).nbytes
+            self.evictions += 1
+
+    def flush(self):
+        """Write every edited resident dataset to the store; returns the ids written"""
+        if self.store is None:
+            return []
+        with self._lock:
+            dirty = [dataset for dataset in self._datasets.values() if dataset.dirty]
+        written = []
+        for dataset in dirty:
+            # Holding the write lock keeps edits out while the file is written
+            with dataset.write_lock:
+                if dataset.dirty and self._spill(dataset):
+                    written.append(dataset.dataset_id)
+        return written
+
+    def _request_flush(self):
+        """Have the flush thread write edits out within ``flush_delay`` seconds"""
+        if self.store is None or self.flush_delay is None:
+            return
+        if self._flush_thread is None:
+            with self._lock:
+                if self._flush_thread is None:
+                    self._flush_thread = threading.Thread(target=self._flush_loop, name='dataset-flush', daemon=True)
+                    self._flush_thread.start()
+        self._flush_requested.set()
+
+    def _flush_loop(self):
+        while True:
+            self._flush_requested.wait()
+            # Edits arriving during the delay are written together
+            time.sleep(self.flush_delay)
+            self._flush_requested.clear()
+            try:
+                self.flush()
+            except OSError:
+                # The datasets stay dirty, so the next edit, eviction or shutdown retries
+                pass
+
+    def _spill(self, dataset):
+        """Write an edited dataset to the store so it can be evicted; False if that is not possible"""
+        if self.store is None or not self.store.save(dataset.dataset_id, dataset.df, overwrite=True):
+            return False
+        self.store.save_metadata(dataset.dataset_id, schema=dataset.schema, profile=dataset.profile,
+                                 version=dataset.version)
+        dataset.dirty = False
+        return True
+
+    def resident(self):
+        """Resident datasets, most recently used first, with their size and cache hit rate"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            entries = []
+            for dataset in reversed(self._datasets.values()):
+                hits, loads = self._access[dataset.dataset_id]
+                entries.append({
+                    'dataset_id': dataset.dataset_id,
+                    'rows': len(dataset.df),
+                    'columns': len(dataset.df.columns),
+                    'memory_bytes': dataset.nbytes,
+                    'hits': hits,
+                    'loads': loads,
+                    'hit_rate': round(hits / (hits + loads), 3),
+                    'sessions': sessions.count(dataset.dataset_id),
+                    'last_access': dataset.last_access
+                })
+            return entries
+
+    def stats(self):
+        with self._lock:
+            hits = sum(access[0] for access in self._access.values())
+            loads = sum(access[1] for access in self._access.values())
+            return {
+                'datasets': len(self._datasets),
+                'memory_bytes': sum(d.nbytes for d in self._datasets.values()),
+                'memory_budget': self.memory_budget,
+                'sessions': len(self._sessions),
+                'hits': hits,
+                'loads': loads,
+                'hit_rate': round(hits / (hits + loads), 3) if hits + loads else None,
+                'evictions': self.evictions,
+                'spill_to_disk': self.store is not None
+            }
@@ -0,0 +1,104 @@
+import os
+import uuid
+from urllib.parse import quote
+
+import numpy as np
+import xlsxwriter
+
+# Rows converted and written per step; bounds the memory an export needs besides the dataset itself
+EXPORT_CHUNK_ROWS = 20000
+
+MIME_TYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+STATISTICS_HEADER = ['Column', 'Data Type', 'Missing Values', 'Unique Values', 'Min', 'Max', 'Mean']
+
+
+def iter_csv(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield ``df`` as CSV text, the header first and then ``chunk_rows`` rows at a time"""
+    yield df.head(0).to_csv(index=False)
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].to_csv(index=False, header=False)
+
+
+def statistics_rows(profile):
+    """Rows of the Statistics sheet, taken from the cached column profile"""
+    return [[
+        str(column),
+        stats['type'],
+        stats['missing'],
+        stats['distinct'],
+        stats.get('min') if stats['type'] == 'numeric' else None,
+        stats.get('max') if stats['type'] == 'numeric' else None,
+        stats.get('mean')
+    ] for column, stats in profile.items()]
+
+
+def cell_value(value):
+    if isinstance(value, float) and not np.isfinite(value):
+        # Excel has no NaN or infinity
+        return None
+    if isinstance(value, (list, dict, tuple)):
+        return str(value)
+    return value
+
+
+def write_xlsx(df, profile, path, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Write ``df`` (and a Statistics sheet when ``profile`` is given) to ``path``.
+
+    xlsxwriter's constant_memory mode flushes each row to a temporary file as
+    soon as the next one starts, so the workbook never exists in memory; only
+    ``chunk_rows`` rows are converted to Python values at a time.
+    """
+    workbook = xlsxwriter.Workbook(path, {
+        'constant_memory': True,
+        'strings_to_formulas': False,
+        'strings_to_urls': False,
+        'remove_timezone': True,
+        'default_date_format': 'yyyy-mm-dd hh:mm:ss'
+    })
+    try:
+        sheet = workbook.add_worksheet('Data')
+        bold = workbook.add_format({'bold': True})
+        sheet.write_row(0, 0, [str(name) for name in df.columns], bold)
+        for start in range(0, len(df), chunk_rows):
+            chunk = df.iloc[start:start + chunk_rows].astype(object)
+            rows = chunk.where(chunk.notna(), None).values.tolist()
+            for offset, row in enumerate(rows, start=start + 1):
+                sheet.write_row(offset, 0, [cell_value(value) for value in row])
+
+        if profile is not None:
+            stats_sheet = workbook.add_worksheet('Statistics')
+            stats_sheet.write_row(0, 0, STATISTICS_HEADER, bold)
+            for row_number, row in enumerate(statistics_rows(profile), start=1):
+                stats_sheet.write_row(row_number, 0, [cell_value(value) for value in row])
+    finally:
+        workbook.close()
+    return path
+
+
+def export_path(directory, extension):
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f'{uuid.uuid4().hex}.{extension}')
+
+
+def content_disposition(filename):
+    """Content-Disposition header for a download, safe for non-ASCII file names"""
+    fallback = filename.encode('ascii', 'replace').decode('ascii').replace('"', '')
+    return f'attachment; filename="{fallback}"; filename*=UTF-8\'\'{quote(filename)}'
+
+
+def iter_file(path, block_size=1024 * 1024, remove=True):
+    """Yield a file in blocks, deleting it once it has been sent"""
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    break
+                yield block
+    finally:
+        if remove:
+            os.remove(path)
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Deterministic stand-in for an Ollama server
+Serves the model list (/api/tags) and chat (/api/chat, streamed or not) with
+canned answers, so the AI endpoints can be load-tested without a model:
+
+    python fake_ollama.py --port 11435 --tokens-per-second 20 --latency-ms 300
+    OLLAMA_HOST=http://127.0.0.1:11435 python app.py
+
+The answer depends only on the prompt. Latencies are drawn from a seeded
+generator, so a run with the same request order is reproducible.
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import Flask, Response, jsonify, request
+
+DEFAULT_MODELS = ['llama3:latest']
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal')
+# Canned answers per prompt kind; {column} is replaced by the first column named in the prompt
+DEFAULT_ANSWERS = {
+    'query': [
+        'df.shape[0]',
+        'df.describe()',
+        'df.head(10)',
+        'df.isnull().sum()',
+        "df['{column}'].value_counts().head(10)"
+    ],
+    'filter': [
+        'notnull(`{column}`)',
+        'isnull(`{column}`)',
+        "not isnull(`{column}`) and `{column}` != ''"
+    ],
+    'analysis': [
+        'The dataset has no missing values in its numeric columns.',
+        'I don\'t know based on the provided data.',
+        'The first column has the most distinct values; the numeric columns look evenly distributed.'
+    ]
+}
+TOKEN_PATTERN = re.compile(r'\s*\S+')
+
+
+def prompt_kind(prompt):
+    """Which app prompt this is: pandas code (query), a filter expression or a free-text analysis"""
+    if 'data filtering assistant' in prompt:
+        return 'filter'
+    if 'single line of Pandas code' in prompt:
+        return 'query'
+    return 'analysis'
+
+
+def prompt_columns(prompt):
+    """Column names listed in a code prompt's ``DataFrame columns: [...]`` line"""
+    match = re.search(r'DataFrame columns: (\[.*\])', prompt)
+    if not match:
+        return []
+    try:
+        return [str(name) for name in ast.literal_eval(match.group(1))]
+    except (ValueError, SyntaxError):
+        return []
+
+
+def tokens(text):
+    """Split an answer into word-sized pieces, the unit of the simulated token rate"""
+    return TOKEN_PATTERN.findall(text) or ['']
+
+
+def timestamp():
+    return datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+class FakeModel:
+    """Answers and timing of the fake server.
+
+    ``latency_ms`` (with ``jitter_ms`` and ``distribution``) is the delay
+    before the first token, to which ``prompt_tokens_per_second`` adds
+    prompt processing time. Answer tokens then arrive at
+    ``tokens_per_second`` (0 sends them at once). At most ``parallel``
+    generations run at a time; further requests wait for a slot, as with
+    a real Ollama server.
+    """
+
+    def __init__(self, models=None, answers=None, tokens_per_second=20.0, prompt_tokens_per_second=0.0,
+                 latency_ms=200.0, jitter_ms=0.0, distribution='fixed', parallel=1, seed=0):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f'Unknown distribution {distribution}; expected one of {", ".join(LATENCY_DISTRIBUTIONS)}')
+        self.models = models or list(DEFAULT_MODELS)
+        self.answers = {**DEFAULT_ANSWERS, **(answers or {})}
+        self.tokens_per_second = tokens_per_second
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.distribution = distribution
+        self.slots = threading.BoundedSemaphore(max(1, parallel))
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.chats = 0
+
+    def answer(self, prompt):
+        """The canned answer for ``prompt``; the same prompt always gets the same answer"""
+        choices = self.answers[prompt_kind(prompt)]
+        digest = int(hashlib.sha256(prompt.encode('utf-8')).hexdigest(), 16)
+        columns = prompt_columns(prompt)
+        return choices[digest % len(choices)].replace('{column}', columns[0] if columns else 'value')
+
+    def first_token_delay(self, prompt_tokens):
+        """Seconds before the first token: sampled latency plus prompt processing"""
+        with self._lock:
+            self.chats += 1
+            if self.distribution == 'uniform':
+                latency = self._random.uniform(self.latency_ms - self.jitter_ms, self.latency_ms + self.jitter_ms)
+            elif self.distribution == 'normal':
+                latency = self._random.gauss(self.latency_ms, self.jitter_ms)
+            elif self.distribution == 'lognormal' and self.latency_ms > 0:
+                # jitter_ms is the standard deviation of the latency itself
+                sigma2 = math.log(1 + (self.jitter_ms / self.latency_ms) ** 2)
+                mu = math.log(self.latency_ms) - sigma2 / 2
+                latency = self._random.lognormvariate(mu, sigma2 ** 0.5)
+            else:
+                latency = self.latency_ms
+        prompt_seconds = prompt_tokens / self.prompt_tokens_per_second if self.prompt_tokens_per_second else 0
+        return max(latency, 0) / 1000 + prompt_seconds
+
+    def token_delay(self):
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+
+
+def chat_chunk(model, content, done=False, **extra):
+    return {'model': model, 'created_at': timestamp(), 'message': {'role': 'assistant', 'content': content},
+            'done': done, **extra}
+
+
+def usage(prompt_tokens, pieces, started_at, first_token_at):
+    """The duration and token fields Ollama sends with the last response (nanoseconds)"""
+    now = time.perf_counter()
+    return {
+        'total_duration': int((now - started_at) * 1e9),
+        'load_duration': 0,
+        'prompt_eval_count': prompt_tokens,
+        'prompt_eval_duration': int((first_token_at - started_at) * 1e9),
+        'eval_count': len(pieces),
+        'eval_duration': int((now - first_token_at) * 1e9)
+    }
+
+
+def create_app(model):
+    app = Flask(__name__)
+
+    @app.route('/')
+    def index():
+        return 'Ollama is running'
+
+    @app.route('/api/version')
+    def version():
+        return jsonify({'version': '0.0.0-fake'})
+
+    @app.route('/api/tags')
+    def tags():
+        return jsonify({'models': [{
+            'name': name,
+            'model': name,
+            'modified_at': '2024-01-01T00:00:00Z',
+            'size': 0,
+            'digest': hashlib.sha256(name.encode('utf-8')).hexdigest(),
+            'details': {'format': 'gguf', 'family': 'fake', 'parameter_size': '0B', 'quantization_level': 'none'}
+        } for name in model.models]})
+
+    @app.route('/api/chat', methods=['POST'])
+    def chat():
+        # Like Ollama, read the body as JSON whatever the Content-Type
+        data = request.get_json(force=True, silent=True) or {}
+        name = data.get('model')
+        if name not in model.models:
+            return jsonify({'error': f"model '{name}' not found, try pulling it first"}), 404
+        messages = data.get('messages') or []
+        prompt = messages[-1].get('content', '') if messages else ''
+        prompt_tokens = len(tokens(prompt))
+        pieces = tokens(model.answer(prompt))
+        started_at = time.perf_counter()
+
+        def generate_pieces():
+            # Waiting for a slot counts as prompt time, as it does with Ollama
+            model.slots.acquire()
+            try:
+                time.sleep(model.first_token_delay(prompt_tokens))
+                first_token_at = time.perf_counter()
+                for i, piece in enumerate(pieces):
+                    if i:
+                        time.sleep(model.token_delay())
+                    yield piece
+                yield usage(prompt_tokens, pieces, started_at, first_token_at)
+            finally:
+                model.slots.release()
+
+        if not data.get('stream', True):
+            *content, stats = list(generate_pieces())
+            return jsonify(chat_chunk(name, ''.join(content), done=True, done_reason='stop', **stats))
+
+        def stream():
+            for item in generate_pieces():
+                if isinstance(item, dict):
+                    yield json.dumps(chat_chunk(name, '', done=True, done_reason='stop', **item)) + '\n'
+                else:
+                    yield json.dumps(chat_chunk(name, item)) + '\n'
+
+        return Response(stream(), mimetype='application/x-ndjson')
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Ollama server with canned answers and simulated timing')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--models', default=','.join(DEFAULT_MODELS), help='comma-separated model names to list')
+    parser.add_argument('--answers', help='JSON file of {"query": [...], "filter": [...], "analysis": [...]} answers')
+    parser.add_argument('--tokens-per-second', type=float, default=20.0, help='answer token rate; 0 for instant')
+    parser.add_argument('--prompt-tokens-per-second', type=float, default=0.0,
+                        help='prompt processing rate added to the first-token latency; 0 to ignore the prompt size')
+    parser.add_argument('--latency-ms', type=float, default=200.0, help='mean delay before the first token')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='spread of the delay (half-width or std dev)')
+    parser.add_argument('--distribution', choices=LATENCY_DISTRIBUTIONS, default='fixed')
+    parser.add_argument('--parallel', type=int, default=1, help='generations served at once (OLLAMA_NUM_PARALLEL)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    answers = None
+    if args.answers:
+        with open(args.answers) as f:
+            answers = json.load(f)
+    model = FakeModel(models=[name for name in args.models.split(',') if name], answers=answers,
+                      tokens_per_second=args.tokens_per_second,
+                      prompt_tokens_per_second=args.prompt_tokens_per_second, latency_ms=args.latency_ms,
+                      jitter_ms=args.jitter_ms, distribution=args.distribution, parallel=args.parallel,
+                      seed=args.seed)
+    print(f"🤖 Fake Ollama serving {', '.join(model.models)} at http://{args.host}:{args.port}")
+    print(f"   Point the app at it with OLLAMA_HOST=http://{args.host}:{args.port}")
+    create_app(model).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
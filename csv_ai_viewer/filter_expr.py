@@ -0,0 +1,297 @@
+import ast
+import base64
+import operator
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+PAGE_SIZE = 100
+
+COMPARE_OPS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+}
+
+ARITHMETIC_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Mod: operator.mod,
+}
+
+# Functions the filter language offers, with the number of arguments they take
+FUNCTIONS = {
+    'contains': 2,
+    'startswith': 2,
+    'endswith': 2,
+    'isnull': 1,
+    'notnull': 1,
+    'between': 3,
+}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub,
+    ast.Compare, ast.In, ast.NotIn, ast.BinOp, ast.Call, ast.Name, ast.Load,
+    ast.Constant, ast.List, ast.Tuple,
+) + tuple(COMPARE_OPS) + tuple(ARITHMETIC_OPS)
+
+BACKTICK_PATTERN = re.compile(r'`([^`]+)`')
+# Older prompts produced JavaScript such as: df.filter(row => row.age > 30 && row.city === 'Oslo')
+JS_FILTER_PATTERN = re.compile(r'^\s*df\.filter\(\s*\(?\s*(\w+)\s*\)?\s*=>\s*(.*)\)\s*;?\s*$', re.S)
+
+
+class FilterError(ValueError):
+    """The expression is not valid in the filter language or does not fit the data"""
+
+
+def from_javascript(expression):
+    """Translate a simple JavaScript ``df.filter(row => ...)`` callback into the filter language"""
+    match = JS_FILTER_PATTERN.match(expression)
+    if not match:
+        return expression
+    row, body = match.groups()
+    body = re.sub(rf'\b{row}\.(\w+)', r'\1', body)
+    body = re.sub(rf"\b{row}\[\s*(['\"])(.+?)\1\s*\]", r'`\2`', body)
+    for js, python in (('===', '=='), ('!==', '!='), ('&&', ' and '), ('||', ' or ')):
+        body = body.replace(js, python)
+    return re.sub(r'!(?!=)', ' not ', body)
+
+
+class FilterPlan:
+    """A validated filter expression that can be evaluated against any DataFrame"""
+
+    def __init__(self, expression, tree, columns):
+        self.expression = expression
+        self.tree = tree
+        # Placeholder name -> column name for backticked columns
+        self.columns = columns
+
+    def mask(self, df):
+        """Evaluate the expression to a boolean numpy array with one entry per row"""
+        try:
+            result = self._eval(self.tree.body, df)
+        except FilterError:
+            raise
+        except (TypeError, ValueError, OverflowError) as e:
+            # e.g. ordering a text column against a number or subtracting from text
+            raise FilterError(f'The filter expression does not fit the data: {e}')
+        if not isinstance(result, pd.Series):
+            raise FilterError('The filter expression does not refer to any column')
+        if not pd.api.types.is_bool_dtype(result):
+            if result.isna().all() or not set(result.dropna().unique()) <= {True, False}:
+                raise FilterError('The filter expression does not evaluate to true/false for each row')
+        return result.fillna(False).to_numpy(dtype=bool)
+
+    def _column(self, name, df):
+        name = self.columns.get(name, name)
+        if name in df.columns:
+            return df[name]
+        matches = [col for col in df.columns if str(col).lower() == name.lower()]
+        if matches:
+            return df[matches[0]]
+        raise FilterError(f'Unknown column: {name}')
+
+    def _eval(self, node, df):
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Name):
+            return self._column(node.id, df)
+        if isinstance(node, (ast.List, ast.Tuple)):
+            return [self._eval(item, df) for item in node.elts]
+        if isinstance(node, ast.BoolOp):
+            values = [as_mask(self._eval(value, df)) for value in node.values]
+            combine = operator.and_ if isinstance(node.op, ast.And) else operator.or_
+            result = values[0]
+            for value in values[1:]:
+                result = combine(result, value)
+            return result
+        if isinstance(node, ast.UnaryOp):
+            operand = self._eval(node.operand, df)
+            if isinstance(node.op, ast.Not):
+                return ~as_mask(operand)
+            return -as_numeric(operand)
+        if isinstance(node, ast.BinOp):
+            left, right = self._eval(node.left, df), self._eval(node.right, df)
+            return ARITHMETIC_OPS[type(node.op)](as_numeric(left), as_numeric(right))
+        if isinstance(node, ast.Compare):
+            return self._compare(node, df)
+        if isinstance(node, ast.Call):
+            return self._call(node, df)
+        raise FilterError(f'Unsupported syntax: {type(node).__name__}')
+
+    def _compare(self, node, df):
+        result = None
+        left = self._eval(node.left, df)
+        for op, right_node in zip(node.ops, node.comparators):
+            right = self._eval(right_node, df)
+            if isinstance(op, (ast.In, ast.NotIn)):
+                if not isinstance(right, list):
+                    raise FilterError('"in" needs a list of values, e.g. status in [\'a\', \'b\']')
+                series = left if isinstance(left, pd.Series) else pd.Series([left] * len(df), index=df.index)
+                values = right
+                if any(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+                    series = as_numeric(series)
+                part = series.isin(values)
+                if isinstance(op, ast.NotIn):
+                    part = ~part
+            else:
+                a, b = align_types(left, right)
+                part = COMPARE_OPS[type(op)](a, b)
+            result = part if result is None else result & part
+            left = right
+        return result
+
+    def _call(self, node, df):
+        name = node.func.id
+        args = [self._eval(arg, df) for arg in node.args]
+        column = args[0]
+        if not isinstance(column, pd.Series):
+            raise FilterError(f'The first argument of {name}() must be a column')
+        if name == 'isnull':
+            return column.isna()
+        if name == 'notnull':
+            return column.notna()
+        if name == 'between':
+            (values, low), (upper_values, high) = align_types(column, args[1]), align_types(column, args[2])
+            return (values >= low) & (upper_values <= high)
+        text = column.astype(str).str.lower().where(column.notna())
+        needle = str(args[1]).lower()
+        if name == 'contains':
+            return text.str.contains(needle, regex=False)
+        if name == 'startswith':
+            return text.str.startswith(needle)
+        return text.str.endswith(needle)
+
+
+def as_mask(value):
+    if isinstance(value, pd.Series):
+        return value.fillna(False).astype(bool)
+    return bool(value)
+
+
+def as_numeric(value):
+    if isinstance(value, pd.Series) and not pd.api.types.is_numeric_dtype(value):
+        return pd.to_numeric(value, errors='coerce')
+    return value
+
+
+def quoted_number(value):
+    """The number in a quoted constant such as '30', or None"""
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def align_types(left, right):
+    """Compare text columns that hold numbers numerically when the other side is a number.
+
+    Quoted numbers compared with a numeric column (``age > '30'``) are
+    compared as numbers too.
+    """
+    def is_number(value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    def is_numeric_column(value):
+        return (isinstance(value, pd.Series) and pd.api.types.is_numeric_dtype(value)
+                and not pd.api.types.is_bool_dtype(value))
+
+    if is_numeric_column(left) and isinstance(right, str) and quoted_number(right) is not None:
+        return left, quoted_number(right)
+    if is_numeric_column(right) and isinstance(left, str) and quoted_number(left) is not None:
+        return quoted_number(left), right
+    if isinstance(left, pd.Series) and is_number(right):
+        return as_numeric(left), right
+    if isinstance(right, pd.Series) and is_number(left):
+        return left, as_numeric(right)
+    return left, right
+
+
+def validate(tree):
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise FilterError(f'Unsupported syntax in filter: {type(node).__name__}')
+        if isinstance(node, ast.BinOp):
+            # Arithmetic is on columns and numbers only, so text like 'x' * 1000000000 can't be built
+            for operand in (node.left, node.right):
+                if isinstance(operand, (ast.List, ast.Tuple)) or (
+                        isinstance(operand, ast.Constant) and not isinstance(operand.value, (int, float))):
+                    raise FilterError('Arithmetic needs numbers or numeric columns')
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+                raise FilterError(f'Unknown function; allowed: {", ".join(FUNCTIONS)}')
+            if node.keywords or len(node.args) != FUNCTIONS[node.func.id]:
+                raise FilterError(f'{node.func.id}() takes {FUNCTIONS[node.func.id]} arguments')
+
+
+@lru_cache(maxsize=256)
+def compile_filter(expression):
+    """Parse and validate ``expression``; raises FilterError if it is not allowed.
+
+    The language is a small subset of Python expressions: column names
+    (backticked when they contain spaces), constants and lists, comparisons,
+    ``in``/``not in``, ``and``/``or``/``not``, arithmetic and the functions
+    in FUNCTIONS.
+    """
+    expression = from_javascript(expression.strip())
+    columns = {}
+
+    def placeholder(match):
+        name = f'__column_{len(columns)}'
+        columns[name] = match.group(1)
+        return name
+
+    source = BACKTICK_PATTERN.sub(placeholder, expression)
+    try:
+        tree = ast.parse(source, mode='eval')
+    except SyntaxError as e:
+        raise FilterError(f'Invalid filter expression: {e.msg}')
+    validate(tree)
+    return FilterPlan(expression, tree, columns)
+
+
+def encode_row_set(mask):
+    """Encode matching row positions as ``[start, end)`` ranges or, when scattered, a bitmap.
+
+    The bitmap is base64 of ``np.packbits`` with little bit order, so row
+    ``i`` is bit ``i % 8`` of byte ``i // 8``.
+    """
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    ranges = edges.reshape(-1, 2).tolist()
+    # A range costs roughly 16 characters of JSON, a row costs 1/6 of a character in the bitmap
+    if len(ranges) * 16 > len(mask) / 6:
+        bitmap = np.packbits(mask, bitorder='little').tobytes()
+        return {'encoding': 'bitmap', 'bitmap': base64.b64encode(bitmap).decode('ascii')}
+    return {'encoding': 'ranges', 'ranges': ranges}
+
+
+def page_records(df, positions):
+    """Rows at ``positions`` as JSON-friendly records"""
+    page = df.iloc[positions].astype(object)
+    return page.where(page.notna(), None).to_dict(orient='records')
+
+
+def apply_filter(df, expression, offset=0, limit=PAGE_SIZE):
+    """Filter ``df`` with ``expression`` and return the matching row set plus one page of rows"""
+    plan = compile_filter(expression)
+    mask = plan.mask(df)
+    positions = np.flatnonzero(mask)
+    window = positions[offset:offset + limit]
+    return {
+        'expression': plan.expression,
+        'count': int(len(positions)),
+        'total_rows': len(df),
+        'row_set': encode_row_set(mask),
+        'offset': offset,
+        'limit': limit,
+        'row_positions': window.tolist(),
+        'rows': page_records(df, window)
+    }
@@ -0,0 +1,393 @@
+import codecs
+import datetime
+import hashlib
+import io
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from itertools import islice
+
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+BOOLEAN_VALUES = {'true': True, 'false': False}
+
+# Kind pairs that widen to float instead of falling back to text
+NUMERIC_WIDENING = {('int', 'float'), ('float', 'int')}
+
+# Rows of an XLSX or JSON import converted and staged at a time
+IMPORT_CHUNK_ROWS = 50000
+
+
+def split_complete_records(buffer):
+    """Split raw CSV bytes after the last newline that is not inside quotes.
+
+    Returns ``(complete, rest)`` where ``complete`` holds whole records and
+    ``rest`` is the partial record that has to wait for the next chunk.
+    """
+    pos = buffer.rfind(b'\n')
+    while pos != -1:
+        if buffer.count(b'"', 0, pos) % 2 == 0:
+            return buffer[:pos + 1], buffer[pos + 1:]
+        pos = buffer.rfind(b'\n', 0, pos)
+    return b'', buffer
+
+
+def detect_chunk_kind(series):
+    """Classify the non-null string values of one column in one chunk"""
+    values = series.dropna()
+    if values.empty:
+        return None
+    if values.str.lower().isin(BOOLEAN_VALUES.keys()).all():
+        return 'bool'
+    if values.str.fullmatch(r'\s*[+-]?\d+\s*').all():
+        return 'int'
+    if pd.to_numeric(values, errors='coerce').notna().all():
+        return 'float'
+    return 'string'
+
+
+def merge_kinds(current, new):
+    if current is None:
+        return new
+    if new is None or new == current:
+        return current
+    if (current, new) in NUMERIC_WIDENING:
+        return 'float'
+    return 'string'
+
+
+def convert_column(series, kind, has_nulls):
+    """Convert a staged string column to the final dtype pandas would pick"""
+    if kind == 'string':
+        return series
+    if kind == 'bool' and not has_nulls:
+        return series.str.lower().map(BOOLEAN_VALUES).astype(bool)
+    if kind == 'bool':
+        return series
+    numeric = pd.to_numeric(series)
+    if kind == 'int' and not has_nulls:
+        return numeric.astype('int64')
+    return numeric.astype('float64')
+
+
+class StagedTable:
+    """Builds a typed Parquet file from chunks of text columns without holding the whole table.
+
+    Chunks are appended to staging Parquet files with every column as text
+    while the narrowest type seen so far is tracked per column; ``finish``
+    rewrites the staged rows row group by row group with the final column
+    types. A chunk with columns not seen before (JSON keys that first appear
+    late) starts a new staging file with the wider schema; earlier rows get
+    nulls in the new columns.
+    """
+
+    def __init__(self, staging_path):
+        self.staging_path = staging_path
+        self.rows = 0
+        self.columns = None
+        self._kinds = {}
+        self._nulls = {}
+        self._writer = None
+        self._parts = []
+
+    def _add_columns(self, columns):
+        for col in columns:
+            self._kinds[col] = None
+            self._nulls[col] = self.rows > 0
+        self.columns = (self.columns or []) + columns
+        if self._writer is not None:
+            self._writer.close()
+        path = f'{self.staging_path}.{len(self._parts)}' if self._parts else self.staging_path
+        self._parts.append(path)
+        self._writer = pq.ParquetWriter(path, pa.schema([(col, pa.string()) for col in self.columns]))
+
+    def append(self, chunk):
+        new = [col for col in chunk.columns if col not in self._kinds]
+        if self.columns is None or new:
+            self._add_columns(new)
+        chunk = chunk.reindex(columns=self.columns)
+        if chunk.empty:
+            return
+
+        for col in self.columns:
+            self._kinds[col] = merge_kinds(self._kinds[col], detect_chunk_kind(chunk[col]))
+            self._nulls[col] = self._nulls[col] or bool(chunk[col].isna().any())
+
+        self._writer.write_table(pa.Table.from_pandas(chunk, schema=self._writer.schema, preserve_index=False))
+        self.rows += len(chunk)
+
+    def finish(self, path):
+        """Write the typed table to ``path`` unless it already exists there"""
+        if self._writer is None:
+            raise ValueError('No rows to import')
+        self._writer.close()
+        if not os.path.exists(path):
+            self._rewrite_typed(path)
+        self.discard()
+        return path
+
+    def _final_type(self, col):
+        kind, has_nulls = self._kinds[col] or 'float', self._nulls[col]
+        if kind == 'int' and not has_nulls:
+            return pa.int64()
+        if kind == 'bool' and not has_nulls:
+            return pa.bool_()
+        return pa.float64() if kind in ('int', 'float') else pa.string()
+
+    def _rewrite_typed(self, path):
+        schema = pa.schema([(col, self._final_type(col)) for col in self.columns])
+        tmp_path = f'{self.staging_path}.typed.tmp'
+        with pq.ParquetWriter(tmp_path, schema) as writer:
+            for part in self._parts:
+                staged = pq.ParquetFile(part)
+                for index in range(staged.num_row_groups):
+                    chunk = staged.read_row_group(index).to_pandas().reindex(columns=self.columns)
+                    for col in self.columns:
+                        chunk[col] = convert_column(chunk[col], self._kinds[col] or 'float', self._nulls[col])
+                    writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        os.replace(tmp_path, path)
+
+    def discard(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for part in self._parts:
+            if os.path.exists(part):
+                os.remove(part)
+
+
+class CSVUpload:
+    """One resumable upload that parses chunks as they arrive.
+
+    Complete records are parsed with every column as text and staged in a
+    StagedTable, so only the current chunk is ever held in memory; ``finish``
+    writes the typed Parquet file and returns the content hash as the
+    dataset id.
+    """
+
+    def __init__(self, upload_id, directory, filename=None):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.directory = directory
+        self.received = 0
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.lock = threading.Lock()
+        self._hash = hashlib.sha256()
+        self._tail = b''
+        self._table = StagedTable(os.path.join(directory, f'{upload_id}.staging.parquet'))
+
+    @property
+    def rows(self):
+        return self._table.rows
+
+    def status(self):
+        return {
+            'upload_id': self.upload_id,
+            'filename': self.filename,
+            'received': self.received,
+            'rows': self.rows,
+            'columns': list(self._table.columns or [])
+        }
+
+    def write(self, offset, data):
+        """Append ``data`` starting at byte ``offset``; resent bytes are skipped"""
+        if offset > self.received:
+            raise ValueError(f'Chunk starts at byte {offset} but only {self.received} bytes were received')
+        data = data[self.received - offset:]
+        if not data:
+            return self.received
+        self._hash.update(data)
+        self.received += len(data)
+        self.updated_at = time.time()
+        complete, self._tail = split_complete_records(self._tail + data)
+        if complete:
+            self._consume(complete)
+        return self.received
+
+    def _consume(self, raw):
+        if self._table.columns is None:
+            chunk = pd.read_csv(io.BytesIO(raw), dtype=str)
+        else:
+            chunk = pd.read_csv(io.BytesIO(raw), header=None, names=self._table.columns,
+                                index_col=False, dtype=str)
+        self._table.append(chunk)
+
+    def finish(self, output_dir):
+        """Flush the last record and write ``<dataset_id>.parquet``; returns (dataset_id, path)"""
+        if self._tail.strip():
+            self._consume(self._tail if self._tail.endswith(b'\n') else self._tail + b'\n')
+        self._tail = b''
+        if self._table.columns is None:
+            raise ValueError('Upload contains no CSV data')
+        dataset_id = self._hash.hexdigest()
+        return dataset_id, self._table.finish(os.path.join(output_dir, f'{dataset_id}.parquet'))
+
+    def discard(self):
+        self._table.discard()
+
+
+def hash_stream(stream, block_size=1024 * 1024):
+    """Content hash of a seekable file object; the position is reset to the start afterwards"""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for block in iter(lambda: stream.read(block_size), b''):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def stage_text(value):
+    """A typed XLSX/JSON value as the text a staging file stores"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+def unique_columns(header):
+    """Column names for a header row, naming blanks and de-duplicating like pandas"""
+    columns = []
+    for index, name in enumerate(header):
+        name = f'Unnamed: {index}' if name is None else str(name)
+        candidate, count = name, 0
+        while candidate in columns:
+            count += 1
+            candidate = f'{name}.{count}'
+        columns.append(candidate)
+    return columns
+
+
+def iter_xlsx_rows(stream, sheet=None):
+    """Yield the rows of a workbook sheet as tuples using openpyxl's read-only mode"""
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.active
+        yield from worksheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def xlsx_chunks(stream, sheet=None, chunk_rows=IMPORT_CHUNK_ROWS):
+    """DataFrames of text columns for the rows of a workbook sheet, the first row being the header"""
+    rows = iter_xlsx_rows(stream, sheet)
+    header = next(rows, None)
+    if header is None:
+        raise ValueError('The worksheet is empty')
+    columns = unique_columns(header)
+    width = len(columns)
+    batch = []
+    for row in rows:
+        if any(value is not None for value in row):
+            batch.append([stage_text(value) for value in row[:width]] + [None] * (width - len(row)))
+        if len(batch) == chunk_rows:
+            yield pd.DataFrame(batch, columns=columns, dtype=object)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch, columns=columns, dtype=object)
+
+
+def iter_json_records(stream, block_size=1024 * 1024):
+    """Yield the objects of a JSON array or of newline-delimited JSON, reading ``stream`` incrementally"""
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer, pos, eof, in_array = '', 0, False, None
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                return
+            block = stream.read(block_size)
+            eof = not block
+            buffer, pos = text.decode(block, final=eof), 0
+            continue
+        if in_array is None:
+            in_array = buffer[pos] == '['
+            if in_array:
+                pos += 1
+                continue
+        if in_array and buffer[pos] == ']':
+            return
+        try:
+            record, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as e:
+            if eof:
+                raise ValueError(f'Invalid JSON: {e.msg} (character {e.pos})')
+            # The record continues in the next block
+            block = stream.read(block_size)
+            eof = not block
+            buffer, pos = buffer[pos:] + text.decode(block, final=eof), 0
+            continue
+        if not isinstance(record, dict):
+            raise ValueError('JSON must be an array of objects or one object per line')
+        yield record
+
+
+def json_chunks(stream, chunk_rows=IMPORT_CHUNK_ROWS):
+    """DataFrames of text columns for the records of a JSON or NDJSON file"""
+    records = iter_json_records(stream)
+    while True:
+        batch = list(islice(records, chunk_rows))
+        if not batch:
+            break
+        yield pd.DataFrame.from_records([{str(k): stage_text(v) for k, v in record.items()} for record in batch])
+
+
+def import_chunks(chunks, output_dir, dataset_id):
+    """Stage DataFrame chunks and write ``<dataset_id>.parquet`` with inferred types; returns its path"""
+    table = StagedTable(os.path.join(output_dir, f'{uuid.uuid4().hex}.staging.parquet'))
+    try:
+        for chunk in chunks:
+            table.append(chunk)
+        return table.finish(os.path.join(output_dir, f'{dataset_id}.parquet'))
+    finally:
+        table.discard()
+
+
+class UploadManager:
+    """Tracks in-progress chunked uploads and forgets abandoned ones"""
+
+    def __init__(self, directory, max_age=24 * 60 * 60):
+        self.directory = directory
+        self.max_age = max_age
+        self._uploads = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def create(self, filename=None):
+        self.expire()
+        upload = CSVUpload(uuid.uuid4().hex, self.directory, filename=filename)
+        with self._lock:
+            self._uploads[upload.upload_id] = upload
+        return upload
+
+    def get(self, upload_id):
+        with self._lock:
+            return self._uploads.get(upload_id)
+
+    def remove(self, upload_id):
+        with self._lock:
+            upload = self._uploads.pop(upload_id, None)
+        if upload is not None:
+            with upload.lock:
+                upload.discard()
+        return upload is not None
+
+    def expire(self):
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            stale = [upload_id for upload_id, upload in self._uploads.items() if upload.updated_at < cutoff]
+        for upload_id in stale:
+            self.remove(upload_id)
@@ -0,0 +1,231 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Finished jobs kept around so their status and results can still be fetched
+MAX_FINISHED_JOBS = 100
+
+FINISHED_STATES = {'done', 'failed', 'cancelled', 'timeout'}
+
+
+class JobFailed(RuntimeError):
+    """A job did not produce a result; ``job.status`` says why"""
+
+    def __init__(self, job):
+        super().__init__(job.error or job.status)
+        self.job = job
+
+
+def _current_address_space():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def _run_in_child(fn, args, memory_limit, conn):
+    """Entry point of a forked worker: lower priority, cap memory, run ``fn`` and send the result"""
+    try:
+        os.nice(10)
+        if resource is not None and memory_limit:
+            # The child starts with the parent's address space, so the cap is relative to it
+            limit = _current_address_space() + memory_limit
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        conn.send(('ok', fn(*args)))
+    except MemoryError:
+        conn.send(('error', 'Ran out of memory'))
+    except Exception as e:
+        conn.send(('error', str(e)))
+    finally:
+        conn.close()
+
+
+class Job:
+    """One unit of CPU-bound work and its state"""
+
+    def __init__(self, job_id, label, timeout, memory_limit, request_id=None):
+        self.job_id = job_id
+        self.label = label
+        # Client-chosen id of the request the job belongs to; never used as a key of the job table
+        self.request_id = request_id
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = False
+        self.process = None
+        self.future = None
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def wait(self, timeout=None):
+        """Block until the job finishes; returns its result or raises JobFailed"""
+        try:
+            self.future.result(timeout)
+        except CancelledError:
+            pass
+        if self.status != 'done':
+            raise JobFailed(self)
+        return self.result
+
+    def info(self):
+        end = self.finished_at or time.time()
+        return {
+            'job_id': self.job_id,
+            'label': self.label,
+            'request_id': self.request_id,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at,
+            'queued_ms': round(((self.started_at or end) - self.created_at) * 1000, 1),
+            'run_ms': round((end - self.started_at) * 1000, 1) if self.started_at else None
+        }
+
+
+class JobPool:
+    """Runs CPU-heavy work (query evaluation, Excel builds) off the request threads.
+
+    Up to ``workers`` jobs run at once, each in a process forked from the
+    server, so cached DataFrames are shared copy-on-write instead of being
+    copied into the worker and the GIL of the server is never held by the
+    work itself. A running job is cancelled by killing its process. Where
+    fork is not available jobs run on the pool threads instead.
+    """
+
+    def __init__(self, workers=None, memory_limit=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.memory_limit = memory_limit
+        self.use_fork = 'fork' in multiprocessing.get_all_start_methods()
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job-worker')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, label=None, request_id=None, timeout=None, memory_limit=None):
+        """Queue ``fn(*args)`` and return its Job immediately.
+
+        Job ids are generated here; ``request_id`` tags the job so
+        cancel_request can stop it. The return value is sent back from the
+        worker process, so it has to be picklable.
+        """
+        job = Job(uuid.uuid4().hex, label or getattr(fn, '__name__', 'job'), timeout,
+                  memory_limit if memory_limit is not None else self.memory_limit, request_id=request_id)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._forget_finished()
+        job.future = self._executor.submit(self._execute, job, fn, args)
+        return job
+
+    def run(self, fn, *args, **kwargs):
+        """Submit ``fn(*args)`` and wait for it; returns the result or raises JobFailed"""
+        return self.submit(fn, *args, **kwargs).wait()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; returns False if it is unknown or already finished"""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel_requested = True
+        process = job.process
+        if job.future.cancel():
+            self._finish(job, 'cancelled', error='Cancelled before it started')
+        elif process is not None:
+            process.kill()
+        return True
+
+    def cancel_request(self, request_id):
+        """Cancel the unfinished jobs tagged with ``request_id``; returns False if there were none"""
+        with self._lock:
+            job_ids = [job.job_id for job in self._jobs.values() if job.request_id == request_id and not job.finished]
+        return any([self.cancel(job_id) for job_id in job_ids])
+
+    def _execute(self, job, fn, args):
+        if job.cancel_requested:
+            return self._finish(job, 'cancelled', error='Cancelled before it started')
+        job.status = 'running'
+        job.started_at = time.time()
+        if not self.use_fork:
+            try:
+                return self._finish(job, 'done', result=fn(*args))
+            except Exception as e:
+                return self._finish(job, 'failed', error=str(e))
+
+        context = multiprocessing.get_context('fork')
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_run_in_child, args=(fn, args, job.memory_limit, sender), daemon=True)
+        process.start()
+        # Published only once started, so cancel never kills a process that has no pid yet
+        job.process = process
+        sender.close()
+        if job.cancel_requested:
+            job.process.kill()
+        try:
+            # Read before joining so a large result can't block the child on a full pipe
+            if not receiver.poll(job.timeout):
+                job.process.kill()
+                return self._finish(job, 'timeout', error=f'Took longer than {job.timeout} seconds and was stopped')
+            try:
+                status, payload = receiver.recv()
+            except EOFError:
+                if job.cancel_requested:
+                    return self._finish(job, 'cancelled', error='Cancelled')
+                return self._finish(job, 'failed', error='Worker stopped unexpectedly (out of memory?)')
+        finally:
+            receiver.close()
+            job.process.join()
+            job.process = None
+        if status == 'ok':
+            return self._finish(job, 'done', result=payload)
+        return self._finish(job, 'failed', error=payload)
+
+    def _finish(self, job, status, result=None, error=None):
+        with self._lock:
+            if job.finished:
+                return
+            job.status = status
+            job.result = result
+            job.error = error
+            job.finished_at = time.time()
+            if status == 'done':
+                self.completed += 1
+            elif status == 'cancelled':
+                self.cancelled += 1
+            else:
+                self.failed += 1
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            states = [job.status for job in self._jobs.values()]
+            return {
+                'workers': self.workers,
+                'isolated': self.use_fork,
+                'queued': states.count('queued'),
+                'running': states.count('running'),
+                'completed': self.completed,
+                'failed': self.failed,
+                'cancelled': self.cancelled
+            }
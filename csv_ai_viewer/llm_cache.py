@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_question(question):
+    """Lowercase and collapse whitespace so trivially different phrasings share a key"""
+    return ' '.join(question.lower().split()).rstrip('?.! ')
+
+
+class ResponseCache:
+    """LRU cache with a TTL for LLM answers, with an optional on-disk tier.
+
+    Entries live in memory up to ``max_entries``; when ``directory`` is set
+    they are also written there as JSON so they survive restarts and memory
+    evictions. Expired entries are treated as misses and dropped on access.
+    """
+
+    def __init__(self, max_entries=512, ttl=24 * 60 * 60, directory=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(fingerprint, question, mode, model):
+        """Key an answer by dataset fingerprint, normalized question, mode and model"""
+        raw = json.dumps([fingerprint, normalize_question(question), mode, model])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+
+    def _expired(self, created_at):
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def get(self, key):
+        """Return the cached value for ``key`` or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if not self._expired(created_at):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, entry)
+            return entry[1]
+
+    def set(self, key, value):
+        entry = (time.time(), value)
+        with self._lock:
+            self._store(key, entry)
+        if self.directory:
+            with open(self._path(key), 'w', encoding='utf-8') as f:
+                json.dump({'created_at': entry[0], 'value': value}, f)
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self._expired(data['created_at']):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return data['created_at'], data['value']
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith('.json'):
+                    os.remove(os.path.join(self.directory, name))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'disk': bool(self.directory),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0
+            }
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+# Number of recent requests the wait and run time averages are computed over
+TIMING_WINDOW = 100
+
+
+class QueueFull(Exception):
+    """Raised when the scheduler queue is full; ``retry_after`` is in seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'LLM queue is full, retry after {retry_after} seconds')
+        self.retry_after = retry_after
+
+
+class Slot:
+    """A held concurrency slot; ``release`` may safely be called more than once"""
+
+    def __init__(self, scheduler, wait_ms):
+        self.scheduler = scheduler
+        self.wait_ms = wait_ms
+        self.started_at = time.time()
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self.scheduler._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class LLMScheduler:
+    """Bounded, first-come first-served admission in front of the Ollama chat call.
+
+    At most ``max_concurrency`` generations run at once; further requests
+    wait in a FIFO queue of at most ``max_queue`` entries and anything beyond
+    that is rejected with ``QueueFull``. Identical prompts submitted through
+    ``run`` while one is already queued or running wait for that generation
+    instead of starting their own.
+    """
+
+    def __init__(self, max_concurrency=1, max_queue=16):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.completed = 0
+        self.rejected = 0
+        self.coalesced = 0
+        self._active = 0
+        self._queue = deque()
+        self._inflight = {}
+        self._wait_ms = deque(maxlen=TIMING_WINDOW)
+        self._run_ms = deque(maxlen=TIMING_WINDOW)
+        self._cond = threading.Condition()
+
+    @staticmethod
+    def make_key(model, messages):
+        """Key identical prompts to the same model so they can share one generation"""
+        raw = json.dumps([model, messages], sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def retry_after(self):
+        """Seconds a rejected client should wait, estimated from recent run times"""
+        run_seconds = (sum(self._run_ms) / len(self._run_ms) / 1000) if self._run_ms else 1.0
+        waiting = len(self._queue) + 1
+        return max(1, math.ceil(run_seconds * waiting / self.max_concurrency))
+
+    def acquire(self):
+        """Wait for a free slot in queue order; raises QueueFull when the queue is full"""
+        ticket = object()
+        queued_at = time.time()
+        with self._cond:
+            if self._active >= self.max_concurrency and len(self._queue) >= self.max_queue:
+                self.rejected += 1
+                raise QueueFull(self.retry_after())
+            self._queue.append(ticket)
+            while self._queue[0] is not ticket or self._active >= self.max_concurrency:
+                self._cond.wait()
+            self._queue.popleft()
+            self._active += 1
+            wait_ms = round((time.time() - queued_at) * 1000, 1)
+            self._wait_ms.append(wait_ms)
+            # The next ticket may also fit if more than one slot is free
+            self._cond.notify_all()
+        return Slot(self, wait_ms)
+
+    def _release(self, slot):
+        with self._cond:
+            self._active -= 1
+            self.completed += 1
+            self._run_ms.append((time.time() - slot.started_at) * 1000)
+            self._cond.notify_all()
+
+    def run(self, key, fn):
+        """Run ``fn()`` in a slot, sharing the result with concurrent calls for the same key"""
+        with self._cond:
+            future = self._inflight.get(key) if key is not None else None
+            leader = future is None
+            if leader:
+                future = Future()
+                if key is not None:
+                    self._inflight[key] = future
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            with self.acquire():
+                result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if key is not None:
+                with self._cond:
+                    self._inflight.pop(key, None)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue,
+                'active': self._active,
+                'queued': len(self._queue),
+                'in_flight_prompts': len(self._inflight),
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'coalesced': self.coalesced,
+                'avg_wait_ms': round(sum(self._wait_ms) / len(self._wait_ms), 1) if self._wait_ms else None,
+                'max_wait_ms': max(self._wait_ms) if self._wait_ms else None,
+                'avg_run_ms': round(sum(self._run_ms) / len(self._run_ms), 1) if self._run_ms else None
+            }
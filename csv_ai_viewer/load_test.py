@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+HTTP load generator for CSV AI Viewer
+Drives the AI, export and import endpoints of a running server at a target
+concurrency and reports throughput and p50/p95/p99 latency per endpoint.
+Pair it with fake_ollama.py to load-test without a model:
+
+    python fake_ollama.py --port 11435 &
+    OLLAMA_HOST=http://127.0.0.1:11435 python app.py &
+    python load_test.py --concurrency 8 --requests 100
+"""
+
+import argparse
+import io
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+ENDPOINTS = ['ai-analysis', 'ai-analysis-filter', 'ai-analysis-stream', 'export-csv', 'export-xlsx',
+             'import-json', 'import-xlsx']
+QUESTIONS = [
+    'How many rows are there?',
+    'What is the average amount per category?',
+    'Which region has the most orders?',
+    'Show the 10 largest amounts'
+]
+FILTERS = ['orders with an amount above 500', 'rows without a region', 'books sold in the north']
+REQUEST_TIMEOUT = 300
+SEED = 0
+
+
+def make_table(rows, seed=SEED):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'id': np.arange(rows),
+        'amount': np.round(rng.gamma(2.0, 250.0, rows), 2),
+        'category': rng.choice(['Electronics', 'Clothing', 'Books', 'Home'], rows),
+        'region': rng.choice(['North', 'South', 'East', 'West', ''], rows),
+        'created': (pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 365 * 86400, rows), unit='s'))
+                   .strftime('%Y-%m-%d %H:%M:%S')
+    })
+
+
+def percentile(sorted_values, q):
+    """Linearly interpolated ``q`` quantile (0-100) of already sorted values"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+def multipart(field, filename, content, content_type):
+    """Encode one file upload as multipart/form-data; returns (body, content type header)"""
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n').encode('utf-8') + content + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+class LoadClient:
+    """Builds and sends the request of each endpoint against one server"""
+
+    def __init__(self, base_url, dataset_id, import_table, unique_questions=True):
+        self.base_url = base_url.rstrip('/')
+        self.dataset_id = dataset_id
+        self.import_table = import_table
+        self.unique_questions = unique_questions
+        self.run_id = uuid.uuid4().hex[:8]
+
+    def question(self, endpoint, questions, i):
+        question = questions[i % len(questions)]
+        # Distinct questions keep the server's answer cache from serving repeats, across endpoints and runs
+        return f'{question} ({self.run_id} {endpoint} request {i})' if self.unique_questions else question
+
+    def import_payload(self, kind, i):
+        """A file that differs per request, so the server can't reuse an earlier import of the same bytes"""
+        table = self.import_table.assign(batch=i)
+        if kind == 'json':
+            return multipart('file', f'load-{i}.json', table.to_json(orient='records').encode('utf-8'),
+                             'application/json')
+        buffer = io.BytesIO()
+        table.to_excel(buffer, index=False)
+        return multipart('file', f'load-{i}.xlsx', buffer.getvalue(),
+                         'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+    def prepare(self, endpoint, i):
+        """(path, body, content type, streamed) for request ``i`` of ``endpoint``"""
+        if endpoint.startswith('import-'):
+            body, content_type = self.import_payload(endpoint.split('-', 1)[1], i)
+            return f'/api/{endpoint}', body, content_type, False
+        if endpoint == 'export-csv' or endpoint == 'export-xlsx':
+            payload = {'datasetId': self.dataset_id, 'format': endpoint.split('-')[1], 'filename': f'load-{i}'}
+            return '/api/export', json.dumps(payload).encode('utf-8'), 'application/json', False
+        mode = 'filter' if endpoint == 'ai-analysis-filter' else 'query'
+        payload = {'datasetId': self.dataset_id, 'mode': mode,
+                   'question': self.question(endpoint, FILTERS if mode == 'filter' else QUESTIONS, i)}
+        path = '/api/ai-analysis/stream' if endpoint == 'ai-analysis-stream' else '/api/ai-analysis'
+        return path, json.dumps(payload).encode('utf-8'), 'application/json', endpoint == 'ai-analysis-stream'
+
+    def send(self, endpoint, i):
+        """Run one request; returns {'endpoint', 'seconds', 'ok', 'status', 'error', 'first_byte'}"""
+        path, body, content_type, streamed = self.prepare(endpoint, i)
+        request = urllib.request.Request(self.base_url + path, data=body, method='POST',
+                                         headers={'Content-Type': content_type})
+        result = {'endpoint': endpoint, 'ok': False, 'status': None, 'error': None, 'first_byte': None}
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                result['status'] = response.status
+                if streamed:
+                    result['error'] = self.read_events(response, started, result)
+                else:
+                    content = response.read()
+                    result['error'] = self.response_error(response, content)
+        except urllib.error.HTTPError as e:
+            result['status'] = e.code
+            result['error'] = e.read().decode('utf-8', 'replace')[:200]
+        except (urllib.error.URLError, OSError) as e:
+            result['error'] = str(e)
+        result['seconds'] = time.perf_counter() - started
+        result['ok'] = result['error'] is None
+        return result
+
+    @staticmethod
+    def response_error(response, content):
+        """Error message of a 200 response that reports a failure in its JSON body, else None"""
+        if not response.headers.get('Content-Type', '').startswith('application/json'):
+            return None
+        data = json.loads(content)
+        if isinstance(data, dict) and (data.get('error') or data.get('success') is False):
+            return str(data.get('error'))[:200]
+        return None
+
+    @staticmethod
+    def read_events(response, started, result):
+        """Consume an SSE response; records the time of the first token and returns an error or None"""
+        event = None
+        for raw in response:
+            line = raw.decode('utf-8').rstrip('\n')
+            if line.startswith('event:'):
+                event = line[6:].strip()
+                if event == 'token' and result['first_byte'] is None:
+                    result['first_byte'] = time.perf_counter() - started
+            elif line.startswith('data:') and event in ('error', 'cancelled'):
+                return line[5:].strip()[:200]
+            elif line.startswith('data:') and event == 'done':
+                return None
+        return 'stream ended without a done event'
+
+
+def summarize(endpoint, results, wall_seconds):
+    latencies = sorted(result['seconds'] for result in results)
+    first_bytes = sorted(result['first_byte'] for result in results if result['first_byte'] is not None)
+    errors = [result for result in results if not result['ok']]
+    summary = {
+        'endpoint': endpoint,
+        'requests': len(results),
+        'errors': len(errors),
+        'throughput': len(results) / wall_seconds if wall_seconds else None,
+        'mean': sum(latencies) / len(latencies) if latencies else None,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'max': latencies[-1] if latencies else None,
+        'sample_errors': sorted({f"{error['status']}: {error['error']}" for error in errors})[:3]
+    }
+    if first_bytes:
+        summary['first_token_p50'] = percentile(first_bytes, 50)
+        summary['first_token_p95'] = percentile(first_bytes, 95)
+    return summary
+
+
+def run_load(client, jobs, concurrency):
+    """Send ``jobs`` ((endpoint, i) pairs) with ``concurrency`` workers; returns (results, wall seconds)"""
+    results = []
+    lock = threading.Lock()
+
+    def work(job):
+        result = client.send(*job)
+        with lock:
+            results.append(result)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(work, jobs))
+    return results, time.perf_counter() - started
+
+
+def upload_dataset(base_url, table):
+    body = json.dumps({'csvData': table.to_csv(index=False)}).encode('utf-8')
+    request = urllib.request.Request(base_url.rstrip('/') + '/api/datasets', data=body, method='POST',
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+        return json.loads(response.read())['dataset_id']
+
+
+def print_summary(summary):
+    def ms(value):
+        return f'{value * 1000:>9.1f}' if value is not None else f'{"-":>9}'
+
+    print(f"   {summary['endpoint']:<20} {summary['requests']:>6} {summary['errors']:>6} "
+          f"{summary['throughput']:>8.2f} {ms(summary['p50'])} {ms(summary['p95'])} {ms(summary['p99'])} "
+          f"{ms(summary.get('first_token_p50'))}")
+    for error in summary['sample_errors']:
+        print(f"      ❌ {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test CSV AI Viewer endpoints')
+    parser.add_argument('--url', default='http://localhost:5000', help='base URL of the running app')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help=f'comma-separated subset of {",".join(ENDPOINTS)}')
+    parser.add_argument('--concurrency', type=int, default=4, help='requests in flight at once')
+    parser.add_argument('--requests', type=int, default=50, help='requests per endpoint')
+    parser.add_argument('--rows', type=int, default=10000, help='rows of the dataset used by AI and export requests')
+    parser.add_argument('--import-rows', type=int, default=2000, help='rows of each imported file')
+    parser.add_argument('--mixed', action='store_true',
+                        help='interleave all endpoints in one run instead of loading them one after another')
+    parser.add_argument('--allow-cache', action='store_true',
+                        help='repeat the same questions so the answer cache can serve them')
+    parser.add_argument('--output', help='write the summaries as JSON')
+    args = parser.parse_args()
+
+    endpoints = [name for name in args.endpoints.split(',') if name]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f'unknown endpoints: {", ".join(sorted(unknown))}')
+
+    print(f"🔍 Load testing {args.url} with {args.concurrency} concurrent requests")
+    try:
+        dataset_id = upload_dataset(args.url, make_table(args.rows))
+    except (urllib.error.URLError, OSError) as e:
+        print(f"❌ Could not upload the test dataset: {e}. Is the server running?")
+        return 1
+    client = LoadClient(args.url, dataset_id, make_table(args.import_rows, seed=SEED + 1),
+                        unique_questions=not args.allow_cache)
+
+    print(f"\n   {'endpoint':<20} {'reqs':>6} {'errors':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'1st tok':>9}")
+    summaries = []
+    if args.mixed:
+        jobs = [(endpoint, i) for i in range(args.requests) for endpoint in endpoints]
+        results, wall = run_load(client, jobs, args.concurrency)
+        for endpoint in endpoints:
+            summaries.append(summarize(endpoint, [r for r in results if r['endpoint'] == endpoint], wall))
+            print_summary(summaries[-1])
+    else:
+        for endpoint in endpoints:
+            results, wall = run_load(client, [(endpoint, i) for i in range(args.requests)], args.concurrency)
+            summaries.append(summarize(endpoint, results, wall))
+            print_summary(summaries[-1])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'url': args.url, 'concurrency': args.concurrency, 'requests': args.requests,
+                       'rows': args.rows, 'mixed': args.mixed, 'summaries': summaries}, f, indent=2)
+        print(f"\n📊 Results written to {args.output}")
+    return 1 if any(summary['errors'] for summary in summaries) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('csv_ai_viewer')
+
+# Histogram bucket upper bounds in seconds, from cache lookups to slow generations
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+def counter_name(name):
+    """Prometheus names counters ``<name>_total``; the suffix is added where it is missing"""
+    return name if name.endswith('_total') else f'{name}_total'
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def samples(self, name, labels):
+        """Cumulative bucket, sum and count samples in exposition order"""
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket', labels + (('le', repr(bound)),), cumulative
+        yield f'{name}_bucket', labels + (('le', '+Inf'),), self.count
+        yield f'{name}_sum', labels, self.sum
+        yield f'{name}_count', labels, self.count
+
+
+class Metrics:
+    """Counters, latency histograms and component stats rendered in the Prometheus text format.
+
+    ``span`` times one stage of a request into the ``stage_seconds``
+    histogram. Components that already keep their own counters (caches,
+    scheduler, job pool) are registered with ``register_stats`` and read at
+    scrape time, so they are not counted twice.
+    """
+
+    def __init__(self, prefix='csv_viewer', buckets=LATENCY_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._stats = []
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = (counter_name(name), tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, stage, timings=None):
+        """Time a block as ``stage``; the duration in ms is also stored in ``timings`` when given"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe('stage_seconds', elapsed, stage=stage)
+            if timings is not None:
+                timings[stage] = round(elapsed * 1000, 1)
+            logger.debug('%s took %.1f ms', stage, elapsed * 1000)
+
+    def register_stats(self, subsystem, stats, counters=()):
+        """Export the numeric fields of ``stats()`` as ``<subsystem>_<field>``.
+
+        Fields in ``counters`` are exported as counters, ``<subsystem>_<field>_total``.
+        """
+        self._stats.append((subsystem, stats, set(counters)))
+
+    def render(self):
+        lines = []
+
+        def family(name, kind, samples):
+            lines.append(f'# TYPE {self.prefix}_{name} {kind}')
+            for sample_name, labels, value in samples:
+                lines.append(f'{self.prefix}_{sample_name}{format_labels(labels)} {value}')
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            by_name = {}
+            for (name, labels), value in counters:
+                by_name.setdefault(name, []).append((name, labels, value))
+            for name, samples in by_name.items():
+                family(name, 'counter', samples)
+            by_name = {}
+            for (name, labels), histogram in histograms:
+                by_name.setdefault(name, []).extend(histogram.samples(name, labels))
+            for name, samples in by_name.items():
+                family(name, 'histogram', samples)
+
+        for subsystem, stats, counter_fields in self._stats:
+            try:
+                values = stats()
+            except Exception as e:
+                logger.warning('Collecting %s metrics failed: %s', subsystem, e)
+                continue
+            for field, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f'{subsystem}_{field}'
+                if field in counter_fields:
+                    family(counter_name(name), 'counter', [(counter_name(name), (), value)])
+                else:
+                    family(name, 'gauge', [(name, (), value)])
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,306 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from profiling import QUANTILES, TOP_K, numeric_values, to_python
+from schema import infer_schema
+
+BOOLEAN_VALUES = {'true': True, 'false': False}
+
+
+class DeltaError(ValueError):
+    """A change does not fit the dataset (unknown column, row out of range, ...)"""
+
+
+def is_missing(value):
+    return value is None or value is pd.NaT or (isinstance(value, float) and np.isnan(value))
+
+
+def typed_value(column, value):
+    """Convert an edited value, usually text from the table UI, to the column's type.
+
+    Raises DeltaError for values a boolean, numeric or datetime column can't
+    hold, instead of letting pandas turn the column into ``object``.
+    """
+    if value is None or value == '':
+        return None
+    if pd.api.types.is_bool_dtype(column):
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.lower() in BOOLEAN_VALUES:
+            return BOOLEAN_VALUES[value.lower()]
+        raise DeltaError(f'{value!r} is not true or false')
+    if pd.api.types.is_numeric_dtype(column):
+        parsed = pd.to_numeric(value, errors='coerce') if isinstance(value, str) else value
+        if isinstance(value, bool) or not isinstance(parsed, (int, float, np.number)) or np.isnan(parsed):
+            raise DeltaError(f'{value!r} is not a number')
+        whole = float(parsed).is_integer() and abs(parsed) < 2 ** 63
+        return int(parsed) if whole and pd.api.types.is_integer_dtype(column) else float(parsed)
+    if pd.api.types.is_datetime64_any_dtype(column):
+        try:
+            return pd.Timestamp(value)
+        except (TypeError, ValueError):
+            raise DeltaError(f'{value!r} is not a date')
+    return value
+
+
+def number(value):
+    """The value as profiling sees it in a numeric column: a number, or None if it does not parse"""
+    if is_missing(value):
+        return None
+    if isinstance(value, (bool, np.bool_)):
+        return int(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    parsed = pd.to_numeric(value, errors='coerce') if isinstance(value, str) else value
+    try:
+        parsed = float(parsed)
+    except (TypeError, ValueError):
+        return None
+    return None if np.isnan(parsed) else parsed
+
+
+class ColumnStats:
+    """Running aggregates of one column that follow single-value edits instead of re-profiling.
+
+    Tracks the missing count, value counts (for distinct and top values) and,
+    for numeric columns, count, sum, sum of squares and min/max, all built
+    with vectorized pandas operations. Edits then update them in O(1); min and
+    max are only recomputed from the column, on the next profile, after an
+    extreme value was removed.
+    """
+
+    def __init__(self, column, numeric):
+        self.numeric = numeric
+        self.missing = int(column.isna().sum())
+        self.values = Counter(column.value_counts().to_dict())
+        self.count = len(column) - self.missing
+        if numeric:
+            values = numeric_values(column)
+            self.count = int(values.count())
+            self.sum = to_python(values.sum()) if self.count else 0
+            self.sum_sq = float(np.square(values.astype('float64')).sum())
+            self._extremes_from(values)
+
+    def _extremes_from(self, values):
+        self.min = to_python(values.min()) if self.count else None
+        self.max = to_python(values.max()) if self.count else None
+        self.extremes_stale = False
+
+    def add(self, value):
+        if is_missing(value):
+            self.missing += 1
+            return
+        self.values[value] += 1
+        if not self.numeric:
+            self.count += 1
+            return
+        x = number(value)
+        if x is None:
+            return
+        self.count += 1
+        self.sum += x
+        self.sum_sq += x * x
+        if not self.extremes_stale:
+            self.min = x if self.min is None else min(self.min, x)
+            self.max = x if self.max is None else max(self.max, x)
+
+    def remove(self, value):
+        if is_missing(value):
+            self.missing -= 1
+            return
+        self.values[value] -= 1
+        if self.values[value] <= 0:
+            del self.values[value]
+        if not self.numeric:
+            self.count -= 1
+            return
+        x = number(value)
+        if x is None:
+            return
+        self.count -= 1
+        self.sum -= x
+        self.sum_sq -= x * x
+        if x == self.min or x == self.max:
+            self.extremes_stale = True
+
+    def profile(self, column, column_schema):
+        """The column's profile from the running aggregates; quartiles and date ranges are recomputed"""
+        profile = {'type': column_schema.type, 'missing': self.missing, 'distinct': len(self.values)}
+        if not self.numeric:
+            profile['count'] = self.count
+            profile['top_values'] = [[to_python(value), count] for value, count in self.values.most_common(TOP_K)]
+            if column_schema.type == 'datetime':
+                parsed = pd.to_datetime(column, format=column_schema.datetime_format, errors='coerce')
+                profile['min'], profile['max'] = to_python(parsed.min()), to_python(parsed.max())
+            return profile
+        if self.count == 0:
+            profile['count'] = 0
+            return profile
+        values = numeric_values(column)
+        if self.extremes_stale:
+            self._extremes_from(values)
+        mean = self.sum / self.count
+        variance = (self.sum_sq - self.sum * mean) / (self.count - 1) if self.count > 1 else None
+        quantiles = values.quantile(QUANTILES)
+        profile.update({
+            'count': self.count,
+            'sum': to_python(self.sum),
+            'mean': to_python(mean),
+            'std': to_python(np.sqrt(max(variance, 0.0))) if variance is not None else None,
+            'min': to_python(self.min),
+            'max': to_python(self.max),
+            'q1': to_python(quantiles[0.25]),
+            'median': to_python(quantiles[0.5]),
+            'q3': to_python(quantiles[0.75])
+        })
+        return profile
+
+
+def column_stats(dataset, name, df=None):
+    """Running aggregates of column ``name``, built on first edit and kept on the dataset"""
+    stats = dataset.column_stats.get(name)
+    if stats is None:
+        column = (dataset.df if df is None else df)[name]
+        stats = dataset.column_stats[name] = ColumnStats(column, dataset.schema[name].type == 'numeric')
+    return stats
+
+
+def refresh_profile(dataset, profile):
+    """Bring the profile entries of edited columns up to date, from their running aggregates"""
+    while dataset.stale_profile:
+        name = dataset.stale_profile.pop()
+        if name in dataset.df.columns:
+            profile[name] = column_stats(dataset, name).profile(dataset.df[name], dataset.schema[name])
+
+
+def check_value(index, name, column, value):
+    """Reject values that are not scalars, or that ``column`` (None for a new column) can't hold"""
+    if value is not None and not isinstance(value, (str, int, float)):
+        raise DeltaError(f'Change {index}: the value of {name} must be text, a number, true, false or null')
+    if column is not None:
+        try:
+            typed_value(column, value)
+        except DeltaError as e:
+            raise DeltaError(f'Change {index}: {e}; column {name} is {column.dtype}')
+
+
+def validate_changes(df, changes):
+    """Check a batch before anything is applied, so a bad change leaves the dataset untouched"""
+    rows = len(df)
+    # Columns added by the batch are object columns and hold any scalar
+    columns = {name: df[name] for name in df.columns}
+    for index, change in enumerate(changes):
+        op = change.get('op')
+        if op == 'set':
+            row = change.get('row')
+            if isinstance(row, bool) or not isinstance(row, int) or not 0 <= row < rows:
+                raise DeltaError(f'Change {index}: row {row} is out of range')
+            name = change.get('column')
+            if not isinstance(name, str) or name not in columns:
+                raise DeltaError(f'Change {index}: unknown column {name}')
+            check_value(index, name, columns[name], change.get('value'))
+        elif op == 'add_row':
+            values = change.get('values') or {}
+            if not isinstance(values, dict):
+                raise DeltaError(f'Change {index}: values must be an object of column name to value')
+            unknown = set(values) - set(columns)
+            if unknown:
+                raise DeltaError(f'Change {index}: unknown columns {sorted(unknown)}')
+            for name, value in values.items():
+                check_value(index, name, columns[name], value)
+            rows += 1
+        elif op == 'add_column':
+            name = change.get('column')
+            if not isinstance(name, str) or not name or name in columns:
+                raise DeltaError(f'Change {index}: column name is missing or already exists')
+            check_value(index, name, None, change.get('value'))
+            columns[name] = None
+        else:
+            raise DeltaError(f'Change {index}: unknown op {op!r}; expected set, add_row or add_column')
+
+
+def apply_changes(dataset, changes):
+    """Apply ``set``, ``add_row`` and ``add_column`` changes to ``dataset``, all or nothing.
+
+    ``changes`` must already have passed ``validate_changes``. The batch is
+    applied to a shallow copy of the frame in which each edited column is
+    copied once, and the copy replaces ``dataset.df`` only when every change
+    went through; on error the running aggregates and schema entries the
+    batch touched are dropped. The schema of touched columns is updated from
+    running aggregates rather than recomputed over the whole table; their
+    profile entries are marked stale and rebuilt from the same aggregates
+    when the profile is next read, so a run of edits computes quartiles
+    once. Added rows are buffered and appended with one concat.
+    """
+    schema = dataset.schema
+    df = dataset.df.copy(deep=False)
+    # Columns that are private to this batch and may be written in place
+    copied = set()
+    added = []
+    touched = set()
+    pending_rows = []
+
+    def flush_rows():
+        nonlocal df
+        if not pending_rows:
+            return
+        rows = pd.DataFrame(pending_rows, columns=df.columns)
+        touched.update(df.columns)
+        for name in df.columns:
+            stats = column_stats(dataset, name, df)
+            for value in rows[name].tolist():
+                stats.add(value)
+        df = pd.concat([df, rows], ignore_index=True)
+        copied.update(df.columns)
+        pending_rows.clear()
+
+    try:
+        for change in changes:
+            op = change['op']
+            if op == 'add_row':
+                values = change.get('values') or {}
+                pending_rows.append([typed_value(df[name], values.get(name)) for name in df.columns])
+                continue
+            flush_rows()
+            name = change['column']
+            touched.add(name)
+            if op == 'set':
+                if change['row'] >= len(df):
+                    raise DeltaError(f'Row {change["row"]} is out of range')
+                if name not in copied:
+                    df[name] = df[name].copy()
+                    copied.add(name)
+                position = df.columns.get_loc(name)
+                stats = column_stats(dataset, name, df)
+                old = df.iat[change['row'], position]
+                new = typed_value(df[name], change.get('value'))
+                stats.remove(old)
+                stats.add(new)
+                df.iat[change['row'], position] = np.nan if new is None and df[name].dtype != object else new
+            else:
+                df[name] = typed_value(pd.Series(dtype=object), change.get('value'))
+                copied.add(name)
+                added.append(name)
+                schema.columns[name] = infer_schema(df[[name]]).columns[name]
+                dataset.column_stats.pop(name, None)
+        flush_rows()
+    except Exception:
+        for name in touched:
+            dataset.column_stats.pop(name, None)
+        for name in added:
+            schema.columns.pop(name, None)
+        raise
+
+    dataset.df = df
+    schema.rows = len(df)
+    for name in touched:
+        stats = column_stats(dataset, name)
+        column_schema = schema[name]
+        column_schema.dtype = str(df[name].dtype)
+        column_schema.null_count = stats.missing
+        column_schema.nullable = stats.missing > 0
+        column_schema.cardinality = len(stats.values)
+    dataset.stale_profile.update(touched)
+    return sorted(touched)
@@ -0,0 +1,262 @@
+import threading
+import time
+
+import ollama
+
+# Models that can't answer chat prompts and are skipped when picking a model
+EMBEDDING_MODELS = {'nomic-embed-text:latest'}
+
+
+def extract_models(models_list):
+    """Return the model entries from any of the shapes ollama.list() has returned"""
+    if hasattr(models_list, 'models'):
+        return list(models_list.models)
+    if isinstance(models_list, dict):
+        return list(models_list.get('models', []))
+    if isinstance(models_list, (list, tuple)):
+        return list(models_list)
+    return []
+
+
+def model_name(model):
+    """Return the name of a model entry, whatever its type"""
+    if hasattr(model, 'name'):
+        return model.name
+    if hasattr(model, 'model'):
+        return model.model
+    if isinstance(model, dict):
+        return model.get('name') or model.get('model')
+    if isinstance(model, str):
+        return model
+    return None
+
+
+def message_content(response):
+    """Return the message text of a chat response (or streamed chunk), or None"""
+    if hasattr(response, 'message') and hasattr(response.message, 'content'):
+        return response.message.content
+    if isinstance(response, dict) and 'message' in response:
+        return response['message'].get('content', '')
+    return None
+
+
+def token_counts(response):
+    """Return (prompt_tokens, completion_tokens) reported by a final chat response or chunk"""
+    if isinstance(response, dict):
+        return response.get('prompt_eval_count') or 0, response.get('eval_count') or 0
+    return getattr(response, 'prompt_eval_count', None) or 0, getattr(response, 'eval_count', None) or 0
+
+
+class ChatStream:
+    """A streamed chat generation that can be cancelled from another request.
+
+    Iterating yields content pieces as Ollama produces them. Cancelling, or
+    closing the iterator when the browser disconnects, closes the streaming
+    HTTP response, which makes Ollama stop generating.
+    """
+
+    def __init__(self, service, model, messages):
+        self.service = service
+        self.model = model
+        self.messages = messages
+        self.cancelled = threading.Event()
+        self.started_at = time.time()
+        self.first_token_at = None
+        self.finished_at = None
+
+    @property
+    def first_token_ms(self):
+        if self.first_token_at is None:
+            return None
+        return round((self.first_token_at - self.started_at) * 1000, 1)
+
+    @property
+    def total_ms(self):
+        end = self.finished_at or time.time()
+        return round((end - self.started_at) * 1000, 1)
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def __iter__(self):
+        if self.cancelled.is_set():
+            return
+        chunks = self.service.chat(self.model, self.messages, stream=True)
+        try:
+            for chunk in chunks:
+                if self.cancelled.is_set():
+                    break
+                content = message_content(chunk)
+                if content:
+                    if self.first_token_at is None:
+                        self.first_token_at = time.time()
+                    yield content
+                if isinstance(chunk, dict) and chunk.get('done'):
+                    self.service.record_usage(chunk)
+                    break
+        finally:
+            self.finished_at = time.time()
+            # Closing the generator closes the HTTP response to Ollama
+            close = getattr(chunks, 'close', None)
+            if close:
+                close()
+
+
+class OllamaService:
+    """Process-wide Ollama client with a cached, periodically refreshed model list.
+
+    The underlying ``ollama.Client`` keeps its HTTP connections open, so chat
+    requests no longer pay for a new client and a ``list()`` round trip each
+    time. The model list is refreshed by a background thread and the chosen
+    chat model is only re-resolved when that list changes.
+    """
+
+    def __init__(self, host=None, refresh_interval=30):
+        self.host = host
+        self.refresh_interval = refresh_interval
+        self._client = None
+        self._models = None
+        self._chat_models = {}
+        self._error = None
+        self._last_refresh = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._streams = {}
+        self._first_token_ms = []
+        self.chats = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = ollama.Client(host=self.host)
+        return self._client
+
+    def refresh(self):
+        """Fetch the model list now; returns True when it changed"""
+        try:
+            names = [model_name(model) for model in extract_models(self.client.list())]
+        except Exception as e:
+            with self._lock:
+                self._error = str(e)
+                self._last_refresh = time.time()
+            raise
+        names = [name for name in names if name]
+        with self._lock:
+            changed = names != self._models
+            if changed:
+                self._models = names
+                self._chat_models = {}
+            self._error = None
+            self._last_refresh = time.time()
+        return changed
+
+    def models(self):
+        """Return the cached model names, fetching them on first use"""
+        self.start()
+        if self._models is None:
+            self.refresh()
+        return list(self._models)
+
+    def select_chat_model(self, preferred=None):
+        """Return (model_name, error_message) for the model to chat with.
+
+        With ``preferred`` the first model whose name starts with it is used,
+        otherwise the first model that is not an embedding model.
+        """
+        try:
+            models = self.models()
+        except Exception as e:
+            return None, f'Error listing Ollama models: {str(e)}'
+        if not models:
+            return None, 'No Ollama models available. Please install a model first.'
+
+        key = preferred or ''
+        with self._lock:
+            if key in self._chat_models:
+                return self._chat_models[key], None
+        if preferred:
+            matches = [name for name in models if name.startswith(preferred)]
+            if not matches:
+                return None, f'{preferred} model not found. Please install it with: ollama pull {preferred}'
+        else:
+            matches = [name for name in models if name not in EMBEDDING_MODELS]
+            if not matches:
+                return None, 'No suitable Ollama models available. Please install a chat model (not embedding model).'
+        with self._lock:
+            self._chat_models[key] = matches[0]
+        return matches[0], None
+
+    def chat(self, model, messages, **kwargs):
+        response = self.client.chat(model=model, messages=messages, **kwargs)
+        if not kwargs.get('stream'):
+            self.record_usage(response)
+        return response
+
+    def record_usage(self, response):
+        """Count one finished generation and the tokens Ollama reports for it"""
+        prompt_tokens, completion_tokens = token_counts(response)
+        with self._lock:
+            self.chats += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def open_stream(self, request_id, model, messages):
+        """Start a cancellable streamed chat registered under ``request_id``"""
+        stream = ChatStream(self, model, messages)
+        with self._lock:
+            self._streams[request_id] = stream
+        return stream
+
+    def close_stream(self, request_id):
+        with self._lock:
+            stream = self._streams.pop(request_id, None)
+            if stream is not None and stream.first_token_ms is not None:
+                # Keep a bounded window of recent first-token latencies for status()
+                self._first_token_ms = (self._first_token_ms + [stream.first_token_ms])[-100:]
+
+    def cancel_stream(self, request_id):
+        """Cancel a running stream; returns False if it is unknown or finished"""
+        with self._lock:
+            stream = self._streams.get(request_id)
+        if stream is None:
+            return False
+        stream.cancel()
+        return True
+
+    def start(self):
+        """Start the background refresh thread if it isn't running yet"""
+        if self._thread is not None or not self.refresh_interval:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._refresh_loop, name='ollama-model-refresh', daemon=True)
+            self._thread.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except Exception:
+                # Kept in self._error and reported by status(); retried next round
+                pass
+
+    def status(self):
+        with self._lock:
+            return {
+                'models': list(self._models or []),
+                'chat_models': dict(self._chat_models),
+                'last_refresh': self._last_refresh,
+                'active_streams': len(self._streams),
+                'chats': self.chats,
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens,
+                'avg_first_token_ms': (round(sum(self._first_token_ms) / len(self._first_token_ms), 1)
+                                       if self._first_token_ms else None),
+                'error': self._error
+            }
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+TOP_K = 10
+QUANTILES = [0.25, 0.5, 0.75]
+
+
+def to_python(value):
+    """Convert numpy/pandas scalars to JSON-friendly Python values"""
+    if value is None or value is pd.NaT or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+        if isinstance(value, float) and np.isnan(value):
+            return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value
+
+
+def numeric_values(column):
+    """The numbers a numeric column is profiled over: unparsable text becomes NaN, booleans 0/1"""
+    values = column if pd.api.types.is_numeric_dtype(column) else pd.to_numeric(column, errors='coerce')
+    return values.astype('int64') if pd.api.types.is_bool_dtype(values) else values
+
+
+def numeric_profile(values):
+    """Moments and quantiles of an already numeric Series"""
+    count = int(values.count())
+    if count == 0:
+        return {'count': 0}
+    quantiles = values.quantile(QUANTILES)
+    return {
+        'count': count,
+        'sum': to_python(values.sum()),
+        'mean': to_python(values.mean()),
+        'std': to_python(values.std()),
+        'min': to_python(values.min()),
+        'max': to_python(values.max()),
+        'q1': to_python(quantiles[0.25]),
+        'median': to_python(quantiles[0.5]),
+        'q3': to_python(quantiles[0.75])
+    }
+
+
+def top_values(column, k=TOP_K):
+    counts = column.value_counts().head(k)
+    return [[to_python(value), int(count)] for value, count in counts.items()]
+
+
+def profile_column(column, column_schema, top_k=TOP_K):
+    """Profile one column according to its inferred type"""
+    profile = {
+        'type': column_schema.type,
+        'missing': column_schema.null_count,
+        'distinct': int(column.nunique())
+    }
+    if column_schema.type == 'numeric':
+        profile.update(numeric_profile(numeric_values(column)))
+    else:
+        profile['count'] = int(column.count())
+        profile['top_values'] = top_values(column, top_k)
+    if column_schema.type == 'datetime':
+        parsed = pd.to_datetime(column, format=column_schema.datetime_format, errors='coerce')
+        profile['min'] = to_python(parsed.min())
+        profile['max'] = to_python(parsed.max())
+    return profile
+
+
+def profile_dataframe(df, schema, top_k=TOP_K):
+    """Compute the column profile shared by prompts, data-info, exports and the UI.
+
+    Returns ``{column: profile}`` where every profile has the column type,
+    missing and distinct counts; numeric columns add count, sum, mean, std,
+    min, max and quartiles, other columns add their ``top_k`` most frequent
+    values. All values are plain Python types so the result can be sent as
+    JSON as is.
+    """
+    return {name: profile_column(df[name], schema[name], top_k) for name in df.columns}
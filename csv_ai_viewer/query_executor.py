@@ -0,0 +1,203 @@
+import ast
+import threading
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from jobs import JobFailed, JobPool
+
+QUERY_TIMEOUT = 10
+QUERY_MEMORY_LIMIT = 1024 * 1024 * 1024
+MAX_RESULT_ROWS = 1000
+# Largest integer literal accepted, so e.g. df.head(10**12) or 'x' * 10**12 can't be written
+MAX_INT_LITERAL = 10 ** 9
+
+# pandas methods and attributes generated code may use. Anything that runs
+# arbitrary callables or strings (apply, map, eval, query, pipe) or can blow
+# up the row count (merge, join, cross, explode) is deliberately left out.
+ALLOWED_ATTRIBUTES = {
+    # inspection
+    'shape', 'columns', 'dtypes', 'index', 'size', 'empty', 'values', 'T',
+    'head', 'tail', 'sample', 'info', 'describe', 'memory_usage',
+    # selection
+    'loc', 'iloc', 'at', 'iat', 'filter', 'get', 'isin', 'between', 'where', 'mask', 'select_dtypes',
+    # aggregation
+    'count', 'sum', 'mean', 'median', 'mode', 'min', 'max', 'std', 'var', 'sem', 'prod',
+    'quantile', 'nunique', 'unique', 'value_counts', 'idxmax', 'idxmin', 'nlargest', 'nsmallest',
+    'agg', 'aggregate', 'groupby', 'corr', 'cov', 'skew', 'kurt', 'cumsum', 'cummax', 'cummin',
+    'pivot_table', 'resample', 'rolling', 'expanding', 'diff', 'pct_change', 'rank',
+    # cleaning and reshaping
+    'isna', 'isnull', 'notna', 'notnull', 'dropna', 'fillna', 'drop_duplicates', 'duplicated',
+    'sort_values', 'sort_index', 'reset_index', 'set_index', 'rename', 'drop', 'astype', 'round',
+    'abs', 'clip', 'any', 'all', 'to_frame', 'copy', 'tolist', 'to_list', 'item',
+    # accessors and their common members
+    'str', 'dt', 'contains', 'startswith', 'endswith', 'lower', 'upper', 'strip', 'len', 'split',
+    'replace', 'year', 'month', 'day', 'hour', 'weekday', 'dayofweek', 'date', 'quarter',
+    # pandas module helpers
+    'to_datetime', 'to_numeric', 'Timestamp',
+}
+
+# Function names agg/aggregate and pivot_table(aggfunc=...) may be given as strings. pandas looks
+# any other string up as a method of the data (or a numpy function) and calls it with the remaining
+# arguments, so e.g. df.agg('to_csv', 0, path) would write a file.
+AGG_FUNCTIONS = {
+    'count', 'sum', 'mean', 'median', 'mode', 'min', 'max', 'std', 'var', 'sem', 'prod', 'size',
+    'first', 'last', 'quantile', 'nunique', 'idxmax', 'idxmin', 'any', 'all', 'skew', 'kurt',
+    'cumsum', 'cummax', 'cummin', 'cumprod', 'diff', 'pct_change', 'rank', 'abs', 'round', 'value_counts',
+}
+STRING_FUNCTION_ARGUMENTS = {'agg': None, 'aggregate': None, 'pivot_table': 'aggfunc'}
+
+# Names generated code may refer to besides the allowed attributes
+QUERY_NAMES = {'df': None, 'pd': pd, 'str': str, 'int': int, 'float': float, 'bool': bool}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.Attribute, ast.Subscript, ast.Call, ast.keyword, ast.Name, ast.Load,
+    ast.Constant, ast.List, ast.Tuple, ast.Dict, ast.Slice,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Gt, ast.GtE, ast.Lt, ast.LtE, ast.In, ast.NotIn, ast.Is, ast.IsNot,
+    ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.Invert, ast.USub, ast.UAdd,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.BitAnd, ast.BitOr,
+)
+
+
+class QueryRejected(ValueError):
+    """Generated code uses something outside the allow-list"""
+
+
+class QueryFailed(RuntimeError):
+    """The query raised, timed out or ran out of memory"""
+
+
+def dispatched_names(call):
+    """Strings that pandas may resolve to functions: every string argument of agg, or pivot_table's aggfunc"""
+    keyword = STRING_FUNCTION_ARGUMENTS[call.func.attr]
+    if keyword is None:
+        arguments = call.args + [item.value for item in call.keywords]
+    else:
+        arguments = [item.value for item in call.keywords if item.arg == keyword]
+    for argument in arguments:
+        for node in ast.walk(argument):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                yield node.value
+
+
+def is_callable_name(name):
+    """Whether pandas could resolve ``name`` to a method of the data or a numpy function"""
+    return any(hasattr(owner, name) for owner in (pd.DataFrame, pd.Series, pd.core.groupby.DataFrameGroupBy,
+                                                  pd.core.groupby.SeriesGroupBy, np))
+
+
+def validate_query(tree):
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise QueryRejected(f'{type(node).__name__} is not allowed in queries')
+        if isinstance(node, ast.Name) and node.id not in QUERY_NAMES:
+            raise QueryRejected(f'Unknown name: {node.id}')
+        if isinstance(node, ast.Attribute) and node.attr not in ALLOWED_ATTRIBUTES:
+            raise QueryRejected(f'df.{node.attr} is not allowed in queries')
+        if isinstance(node, ast.Constant) and isinstance(node.value, int) and abs(node.value) > MAX_INT_LITERAL:
+            raise QueryRejected('Number is too large')
+        if isinstance(node, ast.Call) and not isinstance(node.func, ast.Attribute):
+            raise QueryRejected('Only pandas methods can be called')
+        if isinstance(node, ast.Call) and node.func.attr in STRING_FUNCTION_ARGUMENTS:
+            for name in dispatched_names(node):
+                if name not in AGG_FUNCTIONS and is_callable_name(name):
+                    raise QueryRejected(f'{name!r} is not an allowed aggregation function')
+
+
+@lru_cache(maxsize=512)
+def compile_query(code):
+    """Parse, validate and compile one line of generated pandas code.
+
+    Plans are cached by code string, so a repeated query skips parsing.
+    Raises QueryRejected if the code is not a single expression built from
+    ``df`` and the allowed pandas operations.
+    """
+    try:
+        tree = ast.parse(code.strip(), mode='eval')
+    except SyntaxError as e:
+        raise QueryRejected(f'Invalid Python expression: {e.msg}')
+    validate_query(tree)
+    return compile(tree, '<query>', 'eval')
+
+
+def to_json_result(result):
+    """Convert a query result to JSON-friendly data, capping long results at MAX_RESULT_ROWS"""
+    truncated = False
+    if hasattr(result, 'head') and hasattr(result, '__len__') and len(result) > MAX_RESULT_ROWS:
+        result = result.head(MAX_RESULT_ROWS)
+        truncated = True
+    if hasattr(result, 'to_dict'):
+        result = result.to_dict()
+    elif hasattr(result, 'tolist'):
+        result = result.tolist()
+    else:
+        result = str(result)
+    return result, truncated
+
+
+def _evaluate(plan, df):
+    return to_json_result(eval(plan, {'__builtins__': {}}, {**QUERY_NAMES, 'df': df}))
+
+
+class QueryExecutor:
+    """Runs validated pandas queries on the job pool with wall-clock and memory limits.
+
+    Pool workers are forks of the server process, so they see the cached
+    DataFrame without copying it; a query that runs too long or allocates
+    too much is killed without affecting other requests.
+    """
+
+    def __init__(self, timeout=QUERY_TIMEOUT, memory_limit=QUERY_MEMORY_LIMIT, pool=None):
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.pool = pool or JobPool()
+        self.executed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.timed_out = 0
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def run(self, code, df, request_id=None):
+        """Run ``code`` against ``df``; returns (result, truncated, elapsed_ms).
+
+        Raises QueryRejected for code outside the allow-list and QueryFailed
+        when it raises, times out, exceeds the memory limit or is cancelled
+        through ``request_id``.
+        """
+        try:
+            plan = compile_query(code)
+        except QueryRejected:
+            self._count('rejected')
+            raise
+        job = self.pool.submit(_evaluate, plan, df, label='query', request_id=request_id,
+                               timeout=self.timeout, memory_limit=self.memory_limit)
+        try:
+            result, truncated = job.wait()
+        except JobFailed:
+            if job.status == 'timeout':
+                self._count('timed_out')
+                raise QueryFailed(f'Query took longer than {self.timeout} seconds and was stopped')
+            self._count('failed')
+            if job.status == 'cancelled':
+                raise QueryFailed('Query was cancelled')
+            raise QueryFailed(f'Error executing code: {job.error}')
+        self._count('executed')
+        return result, truncated, job.info()['run_ms']
+
+    def stats(self):
+        with self._lock:
+            return {
+                'timeout': self.timeout,
+                'memory_limit': self.memory_limit,
+                'isolated': self.pool.use_fork,
+                'plans_cached': compile_query.cache_info().currsize,
+                'executed': self.executed,
+                'rejected': self.rejected,
+                'failed': self.failed,
+                'timed_out': self.timed_out
+            }
@@ -0,0 +1,165 @@
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from filter_expr import FilterError, compile_filter
+from value_index import filter_text, value_index
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 10000
+# Filtered and sorted row orders remembered per dataset, so paging through a view is O(page size)
+MAX_VIEWS = 8
+
+
+class ColumnIndex:
+    """Stable sort order and dense ranks of one column, nulls last in both directions"""
+
+    def __init__(self, order, ranks, valid):
+        self.order = order
+        self.ranks = ranks
+        self.valid = valid
+
+    def positions(self, ascending=True):
+        if ascending:
+            return self.order
+        # Reverse the non-null part only so nulls stay at the end
+        return np.concatenate((self.order[:self.valid][::-1], self.order[self.valid:]))
+
+    def sort_key(self, ascending=True):
+        if ascending:
+            return self.ranks
+        top = self.ranks[self.order[self.valid - 1]] if self.valid else 0
+        # Nulls carry the largest rank; keep them largest after flipping the rest
+        return np.where(self.ranks > top, self.ranks, top - self.ranks)
+
+
+def sort_values(column, numeric):
+    """Values to sort by: numbers for numeric columns, lower-cased text otherwise"""
+    if numeric:
+        return column if pd.api.types.is_numeric_dtype(column) else pd.to_numeric(column, errors='coerce')
+    return column.astype(str).str.lower().where(column.notna())
+
+
+def build_column_index(column, numeric):
+    values = sort_values(column, numeric)
+    dtype = np.int32 if len(values) < 2 ** 31 else np.int64
+    ordered_index = pd.Series(values.to_numpy()).sort_values(kind='stable', na_position='last').index
+    order = ordered_index.to_numpy().astype(dtype)
+    valid = int(values.notna().sum())
+    ordered = values.to_numpy()[order[:valid]]
+    changes = np.ones(valid, dtype=bool)
+    if valid > 1:
+        changes[1:] = ordered[1:] != ordered[:-1]
+    ranks = np.full(len(values), np.count_nonzero(changes), dtype=dtype)
+    ranks[order[:valid]] = np.cumsum(changes) - 1
+    return ColumnIndex(order, ranks, valid)
+
+
+def column_index(dataset, column):
+    """Sort index of ``column``, built on first use and cached on the dataset"""
+    numeric = dataset.schema[column].type == 'numeric'
+    return dataset.cached(('sort_index', column), lambda: build_column_index(dataset.df[column], numeric))
+
+
+def filter_mask(df, search=None, filters=None, where=None, dataset=None):
+    """Boolean mask for the table's global search, per-column filters and a filter expression.
+
+    Column filters follow the table UI: ``a|b`` (or a list of values) keeps
+    exact matches of any listed value, anything else is a case-insensitive
+    substring match. With ``dataset``, exact-match filters are answered from
+    the column's value index instead of scanning it.
+    """
+    mask = np.ones(len(df), dtype=bool)
+    if search:
+        needle = str(search).lower()
+        matches = np.zeros(len(df), dtype=bool)
+        for name in df.columns:
+            text = df[name].astype(str).str.lower()
+            matches |= text.str.contains(needle, regex=False).to_numpy()
+        mask &= matches
+    if not isinstance(filters or {}, dict):
+        raise FilterError('Column filters must be an object of column name to value')
+    for name, value in (filters or {}).items():
+        if name not in df.columns:
+            raise KeyError(name)
+        if isinstance(value, (int, float)):
+            # JSON numbers and booleans match as the table shows them
+            value = str(value)
+        elif not isinstance(value, (list, str)):
+            raise FilterError(f'Filter value for column {name} must be text, a number or a list')
+        if isinstance(value, list) or '|' in value:
+            values = [str(item) for item in value] if isinstance(value, list) else value.split('|')
+            index = value_index(dataset, name) if dataset is not None else None
+            mask &= index.mask(values) if index is not None else filter_text(df[name]).isin(values).to_numpy()
+        else:
+            mask &= filter_text(df[name]).str.lower().str.contains(value.lower(), regex=False).to_numpy()
+    if where:
+        if not isinstance(where, str):
+            raise FilterError('The filter expression must be text')
+        mask &= compile_filter(where).mask(df)
+    return mask
+
+
+def sorted_positions(dataset, sort):
+    """Row order for ``sort``, a list of ``{'column', 'ascending'}`` keys"""
+    if not sort:
+        return None
+    if len(sort) == 1:
+        key = sort[0]
+        return column_index(dataset, key['column']).positions(key.get('ascending', True))
+    keys = [column_index(dataset, key['column']).sort_key(key.get('ascending', True)) for key in sort]
+    # lexsort sorts by the last key first
+    return np.lexsort(keys[::-1])
+
+
+def view_positions(dataset, sort=None, search=None, filters=None, where=None):
+    """Row positions of the filtered and sorted view, or None for the unfiltered natural order"""
+    if not (sort or search or filters or where):
+        return None
+    spec = json.dumps([sort, search, filters, where], sort_keys=True)
+    views, lock = dataset.cached('row_views', lambda: (OrderedDict(), threading.Lock()))
+    with lock:
+        if spec in views:
+            views.move_to_end(spec)
+            return views[spec]
+
+    order = sorted_positions(dataset, sort)
+    if search or filters or where:
+        mask = filter_mask(dataset.df, search, filters, where, dataset)
+        positions = order[mask[order]] if order is not None else np.flatnonzero(mask)
+    else:
+        positions = order
+
+    with lock:
+        views[spec] = positions
+        while len(views) > MAX_VIEWS:
+            views.popitem(last=False)
+    return positions
+
+
+def row_window(dataset, offset=0, limit=PAGE_SIZE, sort=None, search=None, filters=None, where=None,
+               include_rows=True):
+    """One window of the filtered and sorted view of ``dataset``"""
+    df = dataset.df
+    for key in sort or []:
+        if key['column'] not in df.columns:
+            raise KeyError(key['column'])
+    positions = view_positions(dataset, sort, search, filters, where)
+    matched = len(df) if positions is None else len(positions)
+    end = min(offset + limit, matched)
+    window = np.arange(offset, max(offset, end)) if positions is None else positions[offset:end]
+    result = {
+        'total_rows': len(df),
+        'matched': int(matched),
+        'offset': offset,
+        'limit': limit,
+        'columns': [str(name) for name in df.columns],
+        'row_positions': window.tolist()
+    }
+    if include_rows:
+        page = df.iloc[window].astype(object)
+        result['rows'] = page.where(page.notna(), None).values.tolist()
+    return result
@@ -0,0 +1,229 @@
+import re
+import warnings
+
+import pandas as pd
+from pandas.core.tools.datetimes import guess_datetime_format
+
+SAMPLE_SIZE = 10000
+NUMERIC_CONFIDENCE = 0.95
+DATETIME_CONFIDENCE = 0.95
+CATEGORICAL_MAX_VALUES = 20
+DATETIME_PROBE_SIZE = 200
+# Values matched against the format patterns before any format is parsed
+DATETIME_SCREEN_SIZE = 20
+
+# Tried in order; the first format that parses enough of the sample wins
+DATETIME_FORMATS = [
+    '%Y-%m-%d',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y/%m/%d',
+    '%m/%d/%Y',
+    '%d/%m/%Y',
+    '%m/%d/%Y %H:%M',
+    '%m/%d/%Y %H:%M:%S',
+    '%d-%m-%Y',
+    '%d.%m.%Y',
+    '%b %d, %Y',
+    '%d %b %Y',
+]
+
+
+class ColumnSchema:
+    """Inferred type information for a single column"""
+
+    def __init__(self, name, type, dtype, null_count, cardinality, confidence=1.0, datetime_format=None):
+        self.name = name
+        self.type = type
+        self.dtype = dtype
+        self.null_count = null_count
+        self.nullable = null_count > 0
+        self.cardinality = cardinality
+        self.confidence = confidence
+        self.datetime_format = datetime_format
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'type': self.type,
+            'dtype': self.dtype,
+            'nullable': self.nullable,
+            'null_count': self.null_count,
+            'cardinality': self.cardinality,
+            'confidence': round(self.confidence, 4),
+            'datetime_format': self.datetime_format
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data['type'], data['dtype'], data['null_count'],
+                   data['cardinality'], data['confidence'], data['datetime_format'])
+
+
+class DatasetSchema:
+    """Column schemas of a dataset, in column order"""
+
+    def __init__(self, columns, rows, sample_rows):
+        self.columns = columns
+        self.rows = rows
+        self.sample_rows = sample_rows
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __iter__(self):
+        return iter(self.columns.values())
+
+    def data_types(self):
+        """Return ``{column: type}`` in the format of the old detect_data_types"""
+        return {name: column.type for name, column in self.columns.items()}
+
+    def columns_of_type(self, type):
+        return [name for name, column in self.columns.items() if column.type == type]
+
+    def missing_values(self):
+        return {name: column.null_count for name, column in self.columns.items()}
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'sample_rows': self.sample_rows,
+            'columns': [column.to_dict() for column in self.columns.values()]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        columns = {column['name']: ColumnSchema.from_dict(column) for column in data['columns']}
+        return cls(columns, data['rows'], data['sample_rows'])
+
+
+def estimate_cardinality(sample, rows):
+    """Estimate distinct values in the full column from a sample"""
+    distinct = int(sample.nunique())
+    if len(sample) == 0 or len(sample) >= rows:
+        return distinct
+    # Mostly-unique samples are treated as keys and scaled up to the full column
+    if distinct / len(sample) > 0.9:
+        return int(distinct * rows / len(sample))
+    return distinct
+
+
+# Regex fragments for the strftime directives used in DATETIME_FORMATS
+DIRECTIVE_PATTERNS = {
+    '%Y': r'\d{4}', '%m': r'\d{1,2}', '%d': r'\d{1,2}', '%H': r'\d{1,2}', '%M': r'\d{1,2}', '%S': r'\d{1,2}',
+    '%b': r'[A-Za-z]{3}'
+}
+
+
+def format_pattern(fmt):
+    """Compiled regex matching the shape of values written with ``fmt``"""
+    parts = re.split(r'(%[A-Za-z])', fmt)
+    return re.compile(''.join(DIRECTIVE_PATTERNS.get(part, re.escape(part)) for part in parts if part))
+
+
+DATETIME_PATTERNS = [(fmt, format_pattern(fmt)) for fmt in DATETIME_FORMATS]
+DIGIT = re.compile(r'\d')
+
+
+def probe_values(sample):
+    """Up to DATETIME_PROBE_SIZE non-null sample values as stripped strings"""
+    values = sample.iloc[:2 * DATETIME_PROBE_SIZE].dropna()
+    if len(values) == 0:
+        values = sample.dropna()
+    return [str(value).strip() for value in values.iloc[:DATETIME_PROBE_SIZE].tolist()]
+
+
+def is_number(value):
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+def parse_confidence(values, fmt):
+    """Share of ``values`` that parse as dates with ``fmt``"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return pd.to_datetime(values, format=fmt, errors='coerce').notna().mean()
+
+
+def candidate_formats(values):
+    """Formats whose pattern fits nearly all of the first few values, plus pandas' guess from the first one.
+
+    Matching a handful of strings against a regex rules out most formats
+    (and most text columns) without parsing anything.
+    """
+    screen = values[:DATETIME_SCREEN_SIZE]
+    needed = DATETIME_CONFIDENCE * len(screen)
+    candidates = [fmt for fmt, pattern in DATETIME_PATTERNS
+                  if sum(1 for value in screen if pattern.fullmatch(value)) >= needed]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        guessed = guess_datetime_format(screen[0]) if screen else None
+    if guessed and guessed not in candidates:
+        candidates.append(guessed)
+    return candidates
+
+
+def infer_datetime(probe, sample):
+    """Return (confidence, format) of the best datetime parse of ``sample``.
+
+    Only formats that pass the pattern screen on ``probe`` are parsed,
+    first on the probe and then on the non-null values of the sample.
+    """
+    full = None
+    for fmt in candidate_formats(probe):
+        if parse_confidence(probe, fmt) < DATETIME_CONFIDENCE:
+            continue
+        if full is None:
+            full = sample.dropna().astype(str).str.strip()
+        confidence = parse_confidence(full, fmt)
+        if confidence >= DATETIME_CONFIDENCE:
+            return confidence, fmt
+    return 0.0, None
+
+
+def infer_column(name, column, sample, rows, null_count):
+    dtype = str(column.dtype)
+    cardinality = estimate_cardinality(sample, rows)
+    categorical_limit = min(CATEGORICAL_MAX_VALUES, rows // 10)
+
+    if pd.api.types.is_numeric_dtype(column):
+        return ColumnSchema(name, 'numeric', dtype, null_count, cardinality)
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return ColumnSchema(name, 'datetime', dtype, null_count, cardinality)
+
+    # Every check runs on a small probe of plain strings first; only columns that pass it are parsed in full
+    probe = probe_values(sample)
+    if probe:
+        if sum(1 for value in probe if is_number(value)) >= NUMERIC_CONFIDENCE * len(probe):
+            confidence = pd.to_numeric(sample.dropna().astype(str).str.strip(), errors='coerce').notna().mean()
+            if confidence >= NUMERIC_CONFIDENCE:
+                return ColumnSchema(name, 'numeric', dtype, null_count, cardinality, confidence)
+        # Dates always contain digits, which rules out most text columns cheaply
+        if sum(1 for value in probe if DIGIT.search(value)) >= DATETIME_CONFIDENCE * len(probe):
+            confidence, fmt = infer_datetime(probe, sample)
+            if confidence >= DATETIME_CONFIDENCE:
+                return ColumnSchema(name, 'datetime', dtype, null_count, cardinality, confidence, fmt)
+
+    type = 'categorical' if cardinality < categorical_limit else 'text'
+    return ColumnSchema(name, type, dtype, null_count, cardinality)
+
+
+def infer_schema(df, sample_size=SAMPLE_SIZE, random_state=0):
+    """Infer column types from a random sample of ``df``.
+
+    Parsing is vectorized over the sample and a column is typed numeric or
+    datetime when at least the configured share of its non-null sample
+    values parse, instead of requiring the whole column to parse cleanly.
+    Null counts are exact since they are cheap to compute on the full frame.
+    """
+    rows = len(df)
+    sample = df.sample(n=sample_size, random_state=random_state) if rows > sample_size else df
+    null_counts = df.isna().sum()
+    columns = {}
+    for name in df.columns:
+        columns[name] = infer_column(name, df[name], sample[name], rows, int(null_counts[name]))
+    return DatasetSchema(columns, rows, len(sample))
@@ -38,6 +38,27 @@ let lastSavedData = null;
 let isDarkMode = localStorage.getItem('darkMode') === 'true';
 // AI Mode Management
 let currentAIMode = 'query';
+// Server-side dataset for the current table (see ensureDatasetUploaded)
+let currentDatasetId = null;
+let datasetGeneration = 0;
+// Server-side dataset for originalData, which AI filters are always applied to
+let originalDatasetId = null;
+let originalGeneration = 0;
+// Edits being sent to the server-side dataset (see sendDatasetChanges)
+let pendingDelta = Promise.resolve();
+// Streaming AI request in flight (see streamAIAnalysis / cancelAIRequest)
+let currentAIStream = null;
+// Large imported table that stays on the server (see importFileOnServer): the table shows one window of
+// /api/rows at a time and currentData holds only that window
+let serverView = null;
+// Tables at least this large are sorted and filtered by the server (/api/rows)
+const SERVER_ROWS_THRESHOLD = 20000;
+// Charts of tables above SERVER_ROWS_THRESHOLD are aggregated by the server (/api/aggregate) down to this many points
+const CHART_POINT_BUDGET = 1000;
+// Rows looked at to pick columns for the quick charts
+const QUICK_CHART_SAMPLE_ROWS = 5000;
+// Distinct values listed in a column filter of a large table; the search box narrows them on the server
+const FILTER_VALUES_PAGE_SIZE = 200;
 
 // Initialize the application
 document.addEventListener('DOMContentLoaded', function() {
@@ -223,9 +244,12 @@ function handleFile(file) {
                 return;
             }
             
+            serverView = null;
             originalData = data;
             currentData = [...data];
             filteredData = [...data];
+            markDatasetDirty();
+            uploadFileInChunks(file).catch(error => console.warn('Dataset upload failed:', error));
             
             console.log('Data assigned to global variables');
             console.log('originalData length:', originalData.length);
@@ -468,7 +492,8 @@ function updateTableData() {
     const endIndex = startIndex + rowsPerPage;
     console.log('updateTableData - filteredData for table:', filteredData);
     console.log('updateTableData - filteredData length:', filteredData.length);
-    const pageData = filteredData.slice(startIndex, endIndex);
+    // A server view's rows are already the current page
+    const pageData = serverView ? currentData : filteredData.slice(startIndex, endIndex);
     console.log('updateTableData - pageData for table:', pageData);
     console.log('updateTableData - pageData length:', pageData.length);
     
@@ -490,15 +515,20 @@ function updateTableData() {
 
 // Update cell value
 function updateCellValue(rowIndex, input) {
-    // Save current state for undo
-    undoStack.push(JSON.parse(JSON.stringify(currentData)));
-    redoStack = [];
-    
     const headers = Object.keys(currentData[0]);
     const colIndex = Array.from(input.parentNode.parentNode.children).indexOf(input.parentNode);
     const header = headers[colIndex];
     const newValue = input.value;
     
+    // Save the old cell value for undo instead of copying the whole table
+    undoStack.push({
+        rowIndex: rowIndex,
+        colIndex: header,
+        oldValue: currentData[rowIndex][header],
+        newValue: newValue
+    });
+    redoStack = [];
+    
     // Check if it's a formula
     if (newValue.startsWith('=')) {
         const formula = newValue.substring(1);
@@ -513,6 +543,13 @@ function updateCellValue(rowIndex, input) {
         formulaCells.delete(`${rowIndex}-${colIndex}`);
     }
     
+    // Formulas may change other cells too, and a sorted view's row index isn't the dataset's
+    if (formulaCells.size === 0 && filteredData[rowIndex] === currentData[rowIndex]) {
+        sendDatasetChanges([{ op: 'set', row: rowIndex, column: header, value: newValue }]);
+    } else {
+        markDatasetDirty();
+    }
+    
     // Apply data validation
     applyDataValidation(rowIndex, colIndex, newValue);
     
@@ -695,6 +732,9 @@ function recalculateFormulas() {
 }
 
 function showDataValidation() {
+    if (deferUntilLocal(showDataValidation, arguments)) {
+        return;
+    }
     if (currentData.length === 0) {
         alert('Please load data first.');
         return;
@@ -776,6 +816,21 @@ function sortByColumn(column) {
         sortAscending = true;
     }
     
+    if (serverView) {
+        currentPage = 0;
+        refreshTablePage();
+        updateSortIndicators();
+        return;
+    }
+    if (currentData.length >= SERVER_ROWS_THRESHOLD) {
+        refreshViewFromServer(() => sortFilteredDataLocally(column));
+        return;
+    }
+    sortFilteredDataLocally(column);
+}
+
+// Sort filteredData in the browser, for tables below SERVER_ROWS_THRESHOLD
+function sortFilteredDataLocally(column) {
     filteredData.sort((a, b) => {
         let aVal = a[column] || '';
         let bVal = b[column] || '';
@@ -851,15 +906,76 @@ function updateSorting() {
         sortAscending = sortAsc.checked;
     } else {
         sortColumn = null;
-        filteredData = [...currentData];
         currentPage = 0;
-        updateTableData();
+        if (serverView) {
+            refreshTablePage();
+        } else {
+            filteredData = [...currentData];
+            updateTableData();
+        }
         updateSortIndicators();
     }
 }
 
+// Ask the server for the sorted and filtered row order of the whole view.
+// Resolves with the matching rows of currentData, or null if the server can't serve it.
+async function fetchServerRowOrder() {
+    try {
+        const response = await postWithDataset('/api/rows', {
+            sort: sortColumn ? [{ column: sortColumn, ascending: sortAscending }] : [],
+            search: document.getElementById('globalFilter').value,
+            filters: activeFilters,
+            include: 'positions',
+            offset: 0,
+            limit: currentData.length
+        });
+        if (!response.ok) {
+            return null;
+        }
+        const result = await response.json();
+        // Positions index the uploaded copy of currentData; ignore them if the table changed meanwhile
+        if (result.total_rows !== currentData.length || result.dataset_id !== currentDatasetId) {
+            return null;
+        }
+        return result.row_positions.map(position => currentData[position]);
+    } catch (error) {
+        console.warn('Server-side sort/filter failed, falling back to the browser:', error);
+        return null;
+    }
+}
+
+// Rebuild filteredData from the server's cached sort indexes; runs fallback() if that fails
+function refreshViewFromServer(fallback) {
+    fetchServerRowOrder().then(rows => {
+        if (rows) {
+            filteredData = rows;
+            currentPage = 0;
+            updateTableData();
+            updateActiveFilters();
+            updateSortIndicators();
+        } else {
+            fallback();
+        }
+    });
+}
+
 // Apply filters
 function applyFilters() {
+    if (serverView) {
+        currentPage = 0;
+        refreshTablePage();
+        updateActiveFilters();
+        return;
+    }
+    if (currentData.length >= SERVER_ROWS_THRESHOLD) {
+        refreshViewFromServer(applyFiltersLocally);
+        return;
+    }
+    applyFiltersLocally();
+}
+
+// Filter currentData in the browser, for tables below SERVER_ROWS_THRESHOLD
+function applyFiltersLocally() {
     const globalFilter = document.getElementById('globalFilter').value.toLowerCase();
     
     filteredData = currentData.filter(row => {
@@ -937,6 +1053,9 @@ function removeFilter(filterKey) {
 function clearFilters() {
     document.getElementById('globalFilter').value = '';
     activeFilters = {};
+    if (serverView) {
+        serverView.where = null;
+    }
     applyFilters();
 }
 
@@ -944,33 +1063,47 @@ function clearFilters() {
 function updatePagination() {
     rowsPerPage = parseInt(document.getElementById('rowsPerPage').value);
     currentPage = 0;
-    updateTableData();
+    refreshTablePage();
 }
 
 // Previous page
 function previousPage() {
     if (currentPage > 0) {
         currentPage--;
-        updateTableData();
+        refreshTablePage();
     }
 }
 
 // Next page
 function nextPage() {
-    const maxPage = Math.ceil(filteredData.length / rowsPerPage) - 1;
+    const maxPage = Math.ceil(viewRowCount() / rowsPerPage) - 1;
     if (currentPage < maxPage) {
         currentPage++;
-        updateTableData();
+        refreshTablePage();
     }
 }
 
+// Rows in the sorted and filtered view: all of filteredData, or the server's count for a server view
+function viewRowCount() {
+    return serverView ? serverView.matched : filteredData.length;
+}
+
+// Show currentPage, fetching it from the server for a server view
+function refreshTablePage() {
+    if (serverView) {
+        loadServerViewPage().catch(error => alert('Error loading rows: ' + error.message));
+        return;
+    }
+    updateTableData();
+}
+
 // Update pagination info
 function updatePaginationInfo() {
     const pagination = document.getElementById('pagination');
     const tableInfo = document.querySelector('.table-info');
     
     // Show/hide pagination and table info based on data availability
-    if (filteredData.length === 0) {
+    if (viewRowCount() === 0) {
         if (pagination) pagination.style.display = 'none';
         if (tableInfo) tableInfo.style.display = 'none';
         return;
@@ -980,7 +1113,7 @@ function updatePaginationInfo() {
     if (pagination) pagination.style.display = 'block';
     if (tableInfo) tableInfo.style.display = 'block';
     
-    const totalPages = Math.ceil(filteredData.length / rowsPerPage);
+    const totalPages = Math.ceil(viewRowCount() / rowsPerPage);
     const pageInfo = document.getElementById('pageInfo');
     const prevBtn = document.getElementById('prevBtn');
     const nextBtn = document.getElementById('nextBtn');
@@ -995,21 +1128,25 @@ function updateTableInfo() {
     const showingRows = document.getElementById('showingRows');
     const totalRows = document.getElementById('totalRows');
     
-    if (filteredData.length === 0) {
+    const rowCount = viewRowCount();
+    if (rowCount === 0) {
         showingRows.textContent = '0';
         totalRows.textContent = '0';
         return;
     }
     
     const startIndex = currentPage * rowsPerPage;
-    const endIndex = Math.min(startIndex + rowsPerPage, filteredData.length);
+    const endIndex = Math.min(startIndex + rowsPerPage, rowCount);
     
     showingRows.textContent = `${startIndex + 1}-${endIndex}`;
-    totalRows.textContent = filteredData.length;
+    totalRows.textContent = rowCount;
 }
 
 // Add column
 function addColumn() {
+    if (deferUntilLocal(addColumn, arguments)) {
+        return;
+    }
     if (currentData.length === 0) {
         alert('Please load data first.');
         return;
@@ -1035,6 +1172,7 @@ function confirmAddColumn() {
     currentData.forEach(row => {
         row[columnName] = '';
     });
+    sendDatasetChanges([{ op: 'add_column', column: columnName, value: '' }]);
     
     filteredData = [...currentData];
     populateTable();
@@ -1045,6 +1183,9 @@ function confirmAddColumn() {
 
 // Add row
 function addRow() {
+    if (deferUntilLocal(addRow, arguments)) {
+        return;
+    }
     if (currentData.length === 0) {
         alert('Please load data first.');
         return;
@@ -1056,6 +1197,11 @@ function addRow() {
     });
     
     currentData.push(newRow);
+    if (currentData !== originalData && currentDatasetId && currentDatasetId === originalDatasetId) {
+        // The server dataset is shared by both copies, so keep them in step
+        originalData.push(newRow);
+    }
+    sendDatasetChanges([{ op: 'add_row', values: newRow }]);
     filteredData = [...currentData];
     updateTableData();
     updatePaginationInfo();
@@ -1064,6 +1210,9 @@ function addRow() {
 
 // Export data
 function exportData(format) {
+    if (deferUntilLocal(exportData, arguments)) {
+        return;
+    }
     if (filteredData.length === 0) {
         alert('No data to export.');
         return;
@@ -1086,24 +1235,29 @@ function exportData(format) {
         
         filename += '.csv';
     } else if (format === 'excel') {
-        // For Excel export, we'll create a CSV that Excel can open
-        const headers = Object.keys(filteredData[0]);
-        content = headers.join(',') + '\n';
-        
-        filteredData.forEach(row => {
-            const values = headers.map(header => {
-                const value = row[header] || '';
-                return `"${value}"`;
-            });
-            content += values.join(',') + '\n';
-        });
-        
-        filename += '.csv';
+        downloadFromServer(filteredData, 'xlsx', filename);
+        return;
     }
     
     downloadFile(content, filename, 'text/csv');
 }
 
+// Have the server build the file; the browser streams the download to disk instead of holding it in memory
+async function downloadFromServer(rows, format, filename) {
+    try {
+        const datasetId = rows === currentData
+            ? await ensureDatasetUploaded()
+            : await registerDatasetText(buildCSVFromData(rows));
+        const a = document.createElement('a');
+        a.href = `/api/datasets/${datasetId}/export?format=${format}&filename=${encodeURIComponent(filename)}`;
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
+    } catch (error) {
+        alert(`Export failed: ${error.message}`);
+    }
+}
+
 // Download file
 function downloadFile(content, filename, mimeType) {
     const blob = new Blob([content], { type: mimeType });
@@ -1119,9 +1273,13 @@ function downloadFile(content, filename, mimeType) {
 
 // Reset data
 function resetData() {
+    if (deferUntilLocal(resetData, arguments)) {
+        return;
+    }
     if (confirm('Are you sure you want to reset all changes?')) {
         currentData = [...originalData];
         filteredData = [...originalData];
+        markDatasetDirty();
         currentPage = 0;
         sortColumn = null;
         sortAscending = true;
@@ -1219,28 +1377,9 @@ async function askAI() {
     showLoading();
     
     try {
-        // Convert current data to CSV format
-        const headers = Object.keys(currentData[0]);
-        let csvData = headers.join(',') + '\n';
-        
-        currentData.forEach(row => {
-            const values = headers.map(header => {
-                const value = row[header] || '';
-                return `"${value}"`;
-            });
-            csvData += values.join(',') + '\n';
-        });
-        
-        // Send request to Flask backend
-        const response = await fetch('/api/ai-analysis', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                csvData: csvData,
-                question: question
-            })
+        // Send request to Flask backend, referencing the uploaded dataset
+        const response = await postWithDataset('/api/ai-analysis', {
+            question: question
         });
         
         const result = await response.json();
@@ -1262,14 +1401,313 @@ async function askAI() {
     }
 }
 
+// Build CSV text for the current table
+function buildCSVFromData(rows) {
+    const headers = Object.keys(rows[0] || {});
+    const lines = [headers.join(',')];
+    rows.forEach(row => {
+        const values = headers.map(header => {
+            const value = row[header] ?? '';
+            return `"${String(value).replace(/"/g, '""')}"`;
+        });
+        lines.push(values.join(','));
+    });
+    return lines.join('\n') + '\n';
+}
+
+// Forget the server-side dataset so the next AI request uploads the edited table.
+// Pass viewOnly when only currentData changed (e.g. an AI filter) and originalData is untouched.
+function markDatasetDirty(viewOnly = false) {
+    currentDatasetId = null;
+    datasetGeneration++;
+    if (!viewOnly) {
+        originalDatasetId = null;
+        originalGeneration++;
+    }
+}
+
+// Apply edits to the server-side dataset instead of re-uploading the table on the next AI request.
+// Only the unfiltered table can be patched; otherwise, or if the server rejects the batch, fall back to markDatasetDirty.
+function sendDatasetChanges(changes) {
+    if (!currentDatasetId || currentDatasetId !== originalDatasetId) {
+        markDatasetDirty();
+        return;
+    }
+    const generation = datasetGeneration;
+    pendingDelta = pendingDelta.then(async () => {
+        // A previous batch may have forked the dataset, so read the id when sending
+        const datasetId = currentDatasetId;
+        if (generation !== datasetGeneration || !datasetId) {
+            return;
+        }
+        try {
+            const response = await fetch(`/api/datasets/${datasetId}`, {
+                method: 'PATCH',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ changes })
+            });
+            const result = await response.json();
+            if (!response.ok) {
+                throw new Error(result.error || 'Failed to update dataset');
+            }
+            if (generation === datasetGeneration) {
+                currentDatasetId = result.dataset_id;
+                originalDatasetId = result.dataset_id;
+            }
+        } catch (error) {
+            console.warn('Re-uploading the table after a failed edit:', error);
+            if (generation === datasetGeneration) {
+                markDatasetDirty();
+            }
+        }
+    });
+}
+
+// Register CSV text with the server and return its dataset id
+async function registerDatasetText(csvText) {
+    const response = await fetch('/api/datasets', {
+        method: 'POST',
+        headers: { 'Content-Type': 'text/csv' },
+        body: csvText
+    });
+    const result = await response.json();
+    if (!response.ok) {
+        throw new Error(result.error || 'Failed to upload dataset');
+    }
+    return result.dataset_id;
+}
+
+// Register CSV text with the server once and remember its dataset id
+async function uploadDatasetText(csvText) {
+    const generation = datasetGeneration;
+    const datasetId = await registerDatasetText(csvText);
+    // Ignore the id if the table was edited while the upload was in flight
+    if (generation === datasetGeneration) {
+        currentDatasetId = datasetId;
+    }
+    return datasetId;
+}
+
+// Stream a file to the server in resumable chunks; the server parses each chunk as it arrives
+async function uploadFileInChunks(file) {
+    const generation = datasetGeneration;
+    const created = await fetch('/api/uploads', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ filename: file.name })
+    });
+    const upload = await created.json();
+    if (!created.ok) {
+        throw new Error(upload.error || 'Failed to start upload');
+    }
+    
+    let offset = 0;
+    let retries = 0;
+    while (offset < file.size) {
+        try {
+            const response = await fetch(`/api/uploads/${upload.upload_id}?offset=${offset}`, {
+                method: 'PUT',
+                headers: { 'Content-Type': 'application/octet-stream' },
+                body: file.slice(offset, offset + upload.chunk_size)
+            });
+            const status = await response.json();
+            if (!response.ok && response.status !== 409) {
+                throw new Error(status.error || 'Chunk upload failed');
+            }
+            // On success and on 409 the server reports how much it has, so resume from there
+            offset = status.received;
+            retries = 0;
+        } catch (error) {
+            if (++retries > 3) {
+                throw error;
+            }
+            const status = await (await fetch(`/api/uploads/${upload.upload_id}`)).json();
+            offset = status.received ?? offset;
+        }
+    }
+    
+    const completed = await fetch(`/api/uploads/${upload.upload_id}/complete`, { method: 'POST' });
+    const result = await completed.json();
+    if (!completed.ok) {
+        throw new Error(result.error || 'Failed to finish upload');
+    }
+    if (generation === datasetGeneration) {
+        currentDatasetId = result.dataset_id;
+        originalDatasetId = result.dataset_id;
+    }
+    return result.dataset_id;
+}
+
+async function ensureDatasetUploaded() {
+    await pendingDelta;
+    if (currentDatasetId) {
+        return currentDatasetId;
+    }
+    return uploadDatasetText(buildCSVFromData(currentData));
+}
+
+// Same as ensureDatasetUploaded, but for the unfiltered originalData
+async function ensureOriginalDatasetUploaded() {
+    await pendingDelta;
+    if (originalDatasetId) {
+        return originalDatasetId;
+    }
+    const generation = originalGeneration;
+    const datasetId = await registerDatasetText(buildCSVFromData(originalData));
+    if (generation === originalGeneration) {
+        originalDatasetId = datasetId;
+    }
+    return datasetId;
+}
+
+// POST a JSON body that references the current dataset, re-uploading it once if the server evicted it
+async function postWithDataset(url, payload, signal, resolveDatasetId = ensureDatasetUploaded) {
+    const send = async () => fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ ...payload, datasetId: await resolveDatasetId() }),
+        signal: signal
+    });
+    let response = await send();
+    if (response.status === 404) {
+        markDatasetDirty();
+        response = await send();
+    }
+    return response;
+}
+
+// Parse one Server-Sent Event block into { type, data }
+function parseSSEEvent(raw) {
+    let type = 'message';
+    const dataLines = [];
+    raw.split('\n').forEach(line => {
+        if (line.startsWith('event:')) {
+            type = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            dataLines.push(line.slice(5).trim());
+        }
+    });
+    return { type, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : null };
+}
+
+// POST to a streaming AI endpoint, calling onToken as tokens arrive.
+// Resolves with the final 'done' payload, or null if the request was cancelled.
+async function streamAIAnalysis(url, payload, onToken, resolveDatasetId = ensureDatasetUploaded) {
+    const controller = new AbortController();
+    // The server assigns the request id and sends it in the 'start' event
+    const stream = { controller, requestId: null, url };
+    currentAIStream = stream;
+    const stopButton = document.getElementById('aiStopBtn');
+    if (stopButton) stopButton.style.display = 'inline-block';
+    
+    try {
+        const response = await postWithDataset(url, payload, controller.signal, resolveDatasetId);
+        if (!response.ok) {
+            const result = await response.json();
+            throw new Error(result.error || 'Unknown error');
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const event = parseSSEEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+                if (event.type === 'start') {
+                    stream.requestId = event.data.request_id;
+                } else if (event.type === 'token') {
+                    onToken(event.data.content);
+                } else if (event.type === 'done') {
+                    console.log('AI first token latency (ms):', event.data.first_token_ms);
+                    return event.data;
+                } else if (event.type === 'error') {
+                    throw new Error(event.data.error);
+                } else if (event.type === 'cancelled') {
+                    return null;
+                }
+            }
+        }
+        return null;
+    } catch (error) {
+        if (error.name === 'AbortError') {
+            return null;
+        }
+        throw error;
+    } finally {
+        currentAIStream = null;
+        if (stopButton) stopButton.style.display = 'none';
+    }
+}
+
+// Stop the streaming AI request; the server also stops the model generation
+function cancelAIRequest() {
+    if (!currentAIStream) return;
+    const { controller, requestId, url } = currentAIStream;
+    // Before the 'start' event there is no id yet; aborting the request stops generation as well
+    if (requestId) {
+        fetch(`${url.replace(/\/stream$/, '')}/cancel/${requestId}`, { method: 'POST' }).catch(() => {});
+    }
+    controller.abort();
+}
+
+// Checkbox list of a column filter's values; counts are shown when the server provides them
+function filterValueOptions(values) {
+    return values.map(({ value, count }) => `
+        <label class="filter-checkbox">
+            <input type="checkbox" value="${value}" checked>
+            <span>${value}${count !== undefined ? ` (${count})` : ''}</span>
+        </label>
+    `).join('');
+}
+
+// One page of a column's distinct values with row counts, from the server's value index
+async function fetchColumnValues(columnName, search = '') {
+    const datasetId = await ensureDatasetUploaded();
+    const params = new URLSearchParams({ column: columnName, search: search, limit: FILTER_VALUES_PAGE_SIZE });
+    const response = await fetch(`/api/datasets/${datasetId}/values?${params}`);
+    if (!response.ok) {
+        return null;
+    }
+    return response.json();
+}
+
+// Fill the filter list of a large table from the server; returns false if the server can't list the column
+async function loadServerFilterValues(columnName, search = '') {
+    try {
+        const result = await fetchColumnValues(columnName, search);
+        const container = document.getElementById('filterValues');
+        if (!result || !container) {
+            return false;
+        }
+        container.dataset.truncated = result.matched > result.values.length ? 'true' : '';
+        container.innerHTML = filterValueOptions(result.values) + (container.dataset.truncated
+            ? `<div class="filter-note">Showing ${result.values.length} of ${result.matched} values. Type to search the rest.</div>`
+            : '');
+        return true;
+    } catch (error) {
+        console.warn('Could not load column values from the server:', error);
+        return false;
+    }
+}
+
 // Show column filter
 function showColumnFilter(columnName) {
-    const uniqueValues = [...new Set(currentData.map(row => row[columnName] || '').filter(val => val !== ''))];
+    const serverValues = serverView !== null || currentData.length >= SERVER_ROWS_THRESHOLD;
+    const uniqueValues = serverValues
+        ? []
+        : [...new Set(currentData.map(row => row[columnName] || '').filter(val => val !== ''))];
     
     // Create filter modal
     const filterModal = document.createElement('div');
     filterModal.className = 'modal';
     filterModal.id = 'filterModal';
+    filterModal.dataset.column = columnName;
+    filterModal.dataset.serverValues = serverValues ? 'true' : '';
     
     const modalContent = document.createElement('div');
     modalContent.className = 'modal-content filter-modal';
@@ -1282,12 +1720,7 @@ function showColumnFilter(columnName) {
                 <input type="text" id="columnFilterInput" placeholder="Type to filter..." onkeyup="filterColumnValues()">
             </div>
             <div class="filter-values" id="filterValues">
-                ${uniqueValues.map(value => `
-                    <label class="filter-checkbox">
-                        <input type="checkbox" value="${value}" checked>
-                        <span>${value}</span>
-                    </label>
-                `).join('')}
+                ${serverValues ? '<div class="filter-note">Loading values...</div>' : filterValueOptions(uniqueValues.map(value => ({ value })))}
             </div>
         </div>
         <div class="filter-actions">
@@ -1301,11 +1734,28 @@ function showColumnFilter(columnName) {
     filterModal.appendChild(modalContent);
     document.body.appendChild(filterModal);
     filterModal.style.display = 'block';
+    
+    if (serverValues) {
+        loadServerFilterValues(columnName).then(loaded => {
+            if (!loaded && document.getElementById('filterModal') === filterModal) {
+                filterModal.dataset.serverValues = '';
+                const unique = [...new Set(currentData.map(row => row[columnName] || '').filter(val => val !== ''))];
+                document.getElementById('filterValues').innerHTML = filterValueOptions(unique.map(value => ({ value })));
+            }
+        });
+    }
 }
 
 // Filter column values
 function filterColumnValues() {
     const searchTerm = document.getElementById('columnFilterInput').value.toLowerCase();
+    const modal = document.getElementById('filterModal');
+    if (modal && modal.dataset.serverValues) {
+        // Large tables: ask the server, whose list covers values beyond the first page
+        clearTimeout(modal.searchTimer);
+        modal.searchTimer = setTimeout(() => loadServerFilterValues(modal.dataset.column, searchTerm), 250);
+        return;
+    }
     const checkboxes = document.querySelectorAll('#filterValues input[type="checkbox"]');
     
     checkboxes.forEach(checkbox => {
@@ -1337,8 +1787,14 @@ function clearAllFilters() {
 function applyColumnFilter(columnName) {
     const selectedValues = Array.from(document.querySelectorAll('#filterValues input[type="checkbox"]:checked'))
         .map(checkbox => checkbox.value);
+    const container = document.getElementById('filterValues');
+    const allListed = selectedValues.length === container.querySelectorAll('input[type="checkbox"]').length;
+    const searched = document.getElementById('columnFilterInput').value !== '';
     
-    if (selectedValues.length > 0) {
+    if (container.dataset.truncated && allListed && !searched) {
+        // Everything left checked in a partial list means no filter, not "only the listed values"
+        delete activeFilters[columnName];
+    } else if (selectedValues.length > 0) {
         activeFilters[columnName] = selectedValues.join('|');
     } else {
         delete activeFilters[columnName];
@@ -1436,24 +1892,14 @@ function clearColumnFilter(columnName) {
 }
 
 // Show column statistics
-function showColumnStats(columnName) {
-    const values = currentData.map(row => row[columnName] || '').filter(val => val !== '');
-    const numericValues = values.map(v => parseFloat(v)).filter(v => !isNaN(v));
+async function showColumnStats(columnName) {
+    const stats = await fetchColumnProfileStats(columnName) || calculateLocalColumnStats(columnName);
     
-    if (numericValues.length === 0) {
+    if (!stats) {
         alert('No numeric data found in this column.');
         return;
     }
     
-    const stats = {
-        count: numericValues.length,
-        sum: numericValues.reduce((a, b) => a + b, 0),
-        mean: numericValues.reduce((a, b) => a + b, 0) / numericValues.length,
-        min: Math.min(...numericValues),
-        max: Math.max(...numericValues),
-        median: numericValues.sort((a, b) => a - b)[Math.floor(numericValues.length / 2)]
-    };
-    
     const statsModal = document.createElement('div');
     statsModal.className = 'modal';
     statsModal.id = 'statsModal';
@@ -1497,6 +1943,53 @@ function showColumnStats(columnName) {
     statsModal.style.display = 'block';
 }
 
+// Column stats from the profile the server computed once for the uploaded dataset
+async function fetchColumnProfileStats(columnName) {
+    if (!currentDatasetId) {
+        return null;
+    }
+    try {
+        const response = await fetch(`/api/datasets/${currentDatasetId}/profile?column=${encodeURIComponent(columnName)}`);
+        if (!response.ok) {
+            return null;
+        }
+        const { profile } = await response.json();
+        if (profile.type !== 'numeric' || !profile.count) {
+            return null;
+        }
+        return {
+            count: profile.count,
+            sum: profile.sum,
+            mean: profile.mean,
+            min: profile.min,
+            max: profile.max,
+            median: profile.median
+        };
+    } catch (error) {
+        console.warn('Falling back to local column stats:', error);
+        return null;
+    }
+}
+
+function calculateLocalColumnStats(columnName) {
+    const values = currentData.map(row => row[columnName] || '').filter(val => val !== '');
+    const numericValues = values.map(v => parseFloat(v)).filter(v => !isNaN(v));
+    
+    if (numericValues.length === 0) {
+        return null;
+    }
+    
+    const sum = numericValues.reduce((a, b) => a + b, 0);
+    return {
+        count: numericValues.length,
+        sum: sum,
+        mean: sum / numericValues.length,
+        min: numericValues.reduce((a, b) => Math.min(a, b), Infinity),
+        max: numericValues.reduce((a, b) => Math.max(a, b), -Infinity),
+        median: numericValues.sort((a, b) => a - b)[Math.floor(numericValues.length / 2)]
+    };
+}
+
 // Close stats modal
 function closeStatsModal() {
     const modal = document.getElementById('statsModal');
@@ -1517,6 +2010,9 @@ function hideColumn(columnName) {
 
 // Rename column
 function renameColumn(columnName) {
+    if (deferUntilLocal(renameColumn, arguments)) {
+        return;
+    }
     const newName = prompt(`Enter new name for column "${columnName}":`, columnName);
     if (newName && newName.trim() && newName !== columnName) {
         // Update column name in all data
@@ -1607,6 +2103,19 @@ function switchTab(tabName) {
         if (tableInfo && currentData.length > 0) tableInfo.style.display = 'block';
     }
     
+    // The dashboard works on every row, so a server view loads them before filling it in
+    if (tabName === 'dashboard' && serverView) {
+        loadServerViewRows()
+            .then(() => {
+                updateDashboardMetrics();
+                generateDataInsights();
+                populateChartOptions();
+                generateQuickCharts();
+            })
+            .catch(error => alert('Error loading rows: ' + error.message));
+        return;
+    }
+    
     // If switching to dashboard, update metrics and insights with better timing
     if (tabName === 'dashboard' && currentData.length > 0) {
         console.log('Initializing dashboard with data length:', currentData.length);
@@ -2036,14 +2545,15 @@ function generateQuickCharts() {
     if (currentData.length === 0) return;
     
     const headers = Object.keys(currentData[0]);
+    const sample = currentData.slice(0, QUICK_CHART_SAMPLE_ROWS);
     const numericColumns = headers.filter(col => {
-        const values = currentData.map(row => row[col]).filter(val => val !== '');
+        const values = sample.map(row => row[col]).filter(val => val !== '');
         const numericValues = values.map(v => parseFloat(v)).filter(v => !isNaN(v));
         return numericValues.length > values.length * 0.8;
     });
     
     const categoricalColumns = headers.filter(col => {
-        const values = currentData.map(row => row[col]).filter(val => val !== '');
+        const values = sample.map(row => row[col]).filter(val => val !== '');
         const uniqueValues = [...new Set(values)];
         return uniqueValues.length < Math.min(20, values.length * 0.5);
     });
@@ -2454,6 +2964,9 @@ function calculateCorrelation(col1, col2) {
 
 // Show advanced filters modal
 function showAdvancedFilters() {
+    if (deferUntilLocal(showAdvancedFilters, arguments)) {
+        return;
+    }
     populateColumnFilters();
     showModal('advancedFiltersModal');
 }
@@ -2556,6 +3069,9 @@ function clearAdvancedFilters() {
 
 // Show calculated fields modal
 function showCalculatedFields() {
+    if (deferUntilLocal(showCalculatedFields, arguments)) {
+        return;
+    }
     populateCalculatedFieldsList();
     showModal('calculatedFieldsModal');
 }
@@ -3100,6 +3616,14 @@ function createChart() {
         return;
     }
     
+        if ((serverView || currentData.length >= SERVER_ROWS_THRESHOLD) && serverChartSpec(chartType, xAxis, yAxis)) {
+            renderServerChart(chartType, xAxis, yAxis);
+            return;
+        }
+        if (deferUntilLocal(createChart, [])) {
+            return;
+        }
+        
         console.log('Preparing chart data...');
         const chartData = prepareChartData(chartType, xAxis, yAxis);
         console.log('Chart data prepared:', chartData);
@@ -3132,6 +3656,55 @@ function createChart() {
     }
 }
 
+// The /api/aggregate request for a chart type, or null for charts that are always built in the browser
+function serverChartSpec(chartType, xAxis, yAxis) {
+    const points = CHART_POINT_BUDGET;
+    switch (chartType) {
+        case 'bar':
+            return { kind: 'groupby', x: xAxis, agg: 'count', points };
+        case 'pie':
+            return yAxis && yAxis !== xAxis
+                ? { kind: 'groupby', x: xAxis, y: yAxis, agg: 'sum', points }
+                : { kind: 'groupby', x: xAxis, agg: 'count', points };
+        case 'line':
+        case 'area':
+        case 'scatter':
+            return { kind: 'series', x: xAxis, y: yAxis, points };
+        case 'histogram':
+            return { kind: 'histogram', x: yAxis, points };
+        case 'heatmap':
+            return { kind: 'heatmap', x: xAxis, y: yAxis, points };
+        case 'boxplot':
+            return { kind: 'boxplot', x: xAxis, y: yAxis, points };
+        default:
+            return null;
+    }
+}
+
+// Render a chart from points aggregated on the server, falling back to the browser if that fails
+async function renderServerChart(chartType, xAxis, yAxis) {
+    const chartArea = document.getElementById('chartArea');
+    let chartData;
+    try {
+        const response = await postWithDataset('/api/aggregate', serverChartSpec(chartType, xAxis, yAxis));
+        const result = await response.json();
+        if (!response.ok) {
+            throw new Error(result.error || 'Aggregation failed');
+        }
+        chartData = result.points;
+    } catch (error) {
+        console.warn('Building the chart in the browser:', error);
+        chartData = prepareChartData(chartType, xAxis, yAxis);
+    }
+    if (chartData.length === 0) {
+        alert('No data available for the selected chart configuration.');
+        return;
+    }
+    if (chartArea) {
+        chartArea.innerHTML = generateChartHtml(chartType, chartData, xAxis, yAxis);
+    }
+}
+
 // Update chart function
 function updateChart() {
     console.log('updateChart called');
@@ -3464,6 +4037,11 @@ function undoEdit() {
         
         currentData[lastEdit.rowIndex][lastEdit.colIndex] = lastEdit.oldValue;
         filteredData = [...currentData];
+        if (formulaCells.size === 0) {
+            sendDatasetChanges([{ op: 'set', row: lastEdit.rowIndex, column: lastEdit.colIndex, value: lastEdit.oldValue }]);
+        } else {
+            markDatasetDirty();
+        }
         populateTable();
         console.log('Undo applied');
     } else {
@@ -3483,6 +4061,11 @@ function redoEdit() {
         
         currentData[lastRedo.rowIndex][lastRedo.colIndex] = lastRedo.newValue;
         filteredData = [...currentData];
+        if (formulaCells.size === 0) {
+            sendDatasetChanges([{ op: 'set', row: lastRedo.rowIndex, column: lastRedo.colIndex, value: lastRedo.newValue }]);
+        } else {
+            markDatasetDirty();
+        }
         populateTable();
         console.log('Redo applied');
     } else {
@@ -3569,7 +4152,14 @@ function handleCopy(e) {
 function handlePaste(e) {
     if (selectedCells.size === 0) return;
     e.preventDefault();
-    const clipboard = e.clipboardData.getData('text/plain');
+    pasteIntoSelection(e.clipboardData.getData('text/plain'));
+}
+
+// Write tab-separated text into the table, starting at the first selected cell
+function pasteIntoSelection(clipboard) {
+    if (deferUntilLocal(pasteIntoSelection, arguments)) {
+        return;
+    }
     const rows = clipboard.split(/\r?\n/);
     const firstCell = Array.from(selectedCells)[0];
     const [_, startRow, startCol] = firstCell.split('-').map(Number);
@@ -3585,6 +4175,7 @@ function handlePaste(e) {
             }
         });
     });
+    markDatasetDirty();
     populateTable();
 }
 
@@ -3637,6 +4228,9 @@ function makeHeadersResizable() {
 }
 
 function reorderColumn(fromIndex, toIndex) {
+    if (deferUntilLocal(reorderColumn, arguments)) {
+        return;
+    }
     const headers = Object.keys(currentData[0]);
     const newHeaders = [...headers];
     const movedHeader = newHeaders.splice(fromIndex, 1)[0];
@@ -3651,6 +4245,7 @@ function reorderColumn(fromIndex, toIndex) {
     });
     
     filteredData = JSON.parse(JSON.stringify(currentData));
+    markDatasetDirty();
     populateTable();
 }
 
@@ -3728,6 +4323,9 @@ document.addEventListener('mouseup', () => {
 });
 
 function showFindReplace() {
+    if (deferUntilLocal(showFindReplace, arguments)) {
+        return;
+    }
     if (currentData.length === 0) {
         alert('Please load data first.');
         return;
@@ -3794,6 +4392,7 @@ function replaceText() {
         }
     });
     
+    markDatasetDirty();
     populateTable();
     alert(`Replaced ${replaced} occurrences`);
 }
@@ -3825,11 +4424,15 @@ function replaceAll() {
         });
     });
     
+    markDatasetDirty();
     populateTable();
     alert(`Replaced ${replaced} occurrences`);
 }
 
 function showConditionalFormatting() {
+    if (deferUntilLocal(showConditionalFormatting, arguments)) {
+        return;
+    }
     if (currentData.length === 0) {
         alert('Please load data first.');
         return;
@@ -3921,6 +4524,9 @@ function clearConditionalFormatting() {
 }
 
 function showQuickStats() {
+    if (deferUntilLocal(showQuickStats, arguments)) {
+        return;
+    }
     if (currentData.length === 0) {
         alert('Please load data first.');
         return;
@@ -4010,6 +4616,9 @@ function refreshChart() {
 }
 
 function drillDown() {
+    if (deferUntilLocal(drillDown, arguments)) {
+        return;
+    }
     if (currentData.length === 0) {
         alert('No data available for drill-down');
         return;
@@ -4061,6 +4670,9 @@ function exportDrillData() {
 }
 
 function createMiniChart(type) {
+    if (deferUntilLocal(createMiniChart, arguments)) {
+        return;
+    }
     console.log('Creating mini chart:', type);
     
     let chartData = [];
@@ -4137,6 +4749,9 @@ function createMiniChart(type) {
 }
 
 function initializeDashboard() {
+    if (deferUntilLocal(initializeDashboard, arguments)) {
+        return;
+    }
     console.log('=== Initializing Dashboard ===');
     try {
         if (currentData.length === 0) {
@@ -4344,6 +4959,7 @@ function replaceText() {
     });
     
     filteredData = [...currentData];
+    markDatasetDirty();
     populateTable();
     alert(`Replaced ${highlightedCells.length} occurrences`);
 }
@@ -4371,6 +4987,7 @@ function replaceAll() {
     });
     
     filteredData = [...currentData];
+    markDatasetDirty();
     populateTable();
     alert(`Replaced ${replacedCount} occurrences`);
 }
@@ -4424,22 +5041,13 @@ function exportToXLSX() {
         return;
     }
     
-    // Create XLSX-like CSV with proper formatting
-    const headers = Object.keys(currentData[0]);
-    let csvData = headers.join(',') + '\n';
-    
-    currentData.forEach(row => {
-        const values = headers.map(header => {
-            const value = row[header] || '';
-            return `"${value}"`;
-        });
-        csvData += values.join(',') + '\n';
-    });
-    
-    downloadFile(csvData, 'export.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet');
+    downloadFromServer(currentData, 'xlsx', 'export');
 }
 
 function exportToJSON() {
+    if (deferUntilLocal(exportToJSON, arguments)) {
+        return;
+    }
     if (currentData.length === 0) {
         alert('No data to export');
         return;
@@ -4452,30 +5060,37 @@ function exportToJSON() {
 function importXLSX() {
     const input = document.createElement('input');
     input.type = 'file';
-    input.accept = '.xlsx,.xls,.csv';
+    input.accept = '.xlsx,.csv';
     input.onchange = function(e) {
         const file = e.target.files[0];
-        if (file) {
-            const reader = new FileReader();
-            reader.onload = function(e) {
-                try {
-                    const csv = e.target.result;
-                    const data = parseCSV(csv);
-                    if (data.length > 0) {
-                        currentData = data;
-                        filteredData = [...currentData];
-                        populateTable();
-                        showTableSection();
-                        alert('File imported successfully');
-                    } else {
-                        alert('No data found in file');
-                    }
-                } catch (error) {
-                    alert('Error importing file: ' + error.message);
-                }
-            };
-            reader.readAsText(file);
+        if (!file) {
+            return;
         }
+        if (file.name.toLowerCase().endsWith('.xlsx')) {
+            importFileOnServer(file, '/api/import-xlsx');
+            return;
+        }
+        const reader = new FileReader();
+        reader.onload = function(e) {
+            try {
+                const csv = e.target.result;
+                const data = parseCSV(csv);
+                if (data.length > 0) {
+                    serverView = null;
+                    currentData = data;
+                    filteredData = [...currentData];
+                    markDatasetDirty();
+                    populateTable();
+                    showTableSection();
+                    alert('File imported successfully');
+                } else {
+                    alert('No data found in file');
+                }
+            } catch (error) {
+                alert('Error importing file: ' + error.message);
+            }
+        };
+        reader.readAsText(file);
     };
     input.click();
 }
@@ -4483,33 +5098,157 @@ function importXLSX() {
 function importJSON() {
     const input = document.createElement('input');
     input.type = 'file';
-    input.accept = '.json';
+    input.accept = '.json,.ndjson,.jsonl';
     input.onchange = function(e) {
         const file = e.target.files[0];
         if (file) {
-            const reader = new FileReader();
-            reader.onload = function(e) {
-                try {
-                    const data = JSON.parse(e.target.result);
-                    if (Array.isArray(data) && data.length > 0) {
-                        currentData = data;
-                        filteredData = [...currentData];
-                        populateTable();
-                        showTableSection();
-                        alert('JSON file imported successfully');
-                    } else {
-                        alert('Invalid JSON data');
-                    }
-                } catch (error) {
-                    alert('Error importing JSON: ' + error.message);
-                }
-            };
-            reader.readAsText(file);
+            importFileOnServer(file, '/api/import-json');
         }
     };
     input.click();
 }
 
+// Turn a columnar payload ({layout: 'columnar', columns: [{name, values} or {name, dictionary, codes}]})
+// back into row objects
+function decodeColumnar(payload) {
+    const columns = payload.columns.map(column => ({
+        name: column.name,
+        values: column.values || column.codes.map(code => (code < 0 ? null : column.dictionary[code]))
+    }));
+    const rows = new Array(payload.length);
+    for (let i = 0; i < payload.length; i++) {
+        const row = {};
+        columns.forEach(column => { row[column.name] = column.values[i]; });
+        rows[i] = row;
+    }
+    return rows;
+}
+
+// The server parses the file into a dataset. Small tables are loaded into the browser; larger ones stay on
+// the server and the table shows one window of /api/rows at a time (see serverView)
+async function importFileOnServer(file, url) {
+    showLoading();
+    try {
+        const form = new FormData();
+        form.append('file', file);
+        form.append('layout', 'columnar');
+        const response = await fetch(url, { method: 'POST', body: form });
+        const result = await response.json();
+        if (!result.success) {
+            throw new Error(result.error || 'Import failed');
+        }
+        if (result.rows === 0) {
+            alert('No data found in file');
+            return;
+        }
+        serverView = {
+            datasetId: result.dataset_id,
+            totalRows: result.rows,
+            matched: result.rows,
+            where: null
+        };
+        markDatasetDirty();
+        currentDatasetId = result.dataset_id;
+        originalDatasetId = result.dataset_id;
+        currentPage = 0;
+        sortColumn = null;
+        activeFilters = {};
+        document.getElementById('globalFilter').value = '';
+        if (result.rows < SERVER_ROWS_THRESHOLD) {
+            await loadServerViewRows();
+        } else {
+            await loadServerViewPage();
+        }
+        populateTable();
+        populateSortOptions();
+        showTableSection();
+        alert('File imported successfully');
+    } catch (error) {
+        alert('Error importing file: ' + error.message);
+    } finally {
+        hideLoading();
+    }
+}
+
+// Fetch the server view's window at currentPage with the current sort and filters, and show it
+async function loadServerViewPage() {
+    const view = serverView;
+    const response = await fetch('/api/rows', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            datasetId: view.datasetId,
+            offset: currentPage * rowsPerPage,
+            limit: rowsPerPage,
+            sort: sortColumn ? [{ column: sortColumn, ascending: sortAscending }] : [],
+            search: document.getElementById('globalFilter').value,
+            filters: activeFilters,
+            where: view.where,
+            layout: 'columnar'
+        })
+    });
+    const page = await response.json();
+    if (!response.ok) {
+        throw new Error(page.error || 'Failed to load rows');
+    }
+    // Ignore the window if another table was loaded meanwhile
+    if (serverView !== view) {
+        return;
+    }
+    view.matched = page.matched;
+    currentData = decodeColumnar(page.data);
+    filteredData = currentData;
+    updateTableData();
+}
+
+// Load every row of the server view into currentData and go back to paging in the browser
+async function loadServerViewRows() {
+    const view = serverView;
+    showLoading();
+    try {
+        const data = [];
+        while (data.length < view.totalRows) {
+            const url = `/api/rows?dataset_id=${view.datasetId}&offset=${data.length}&limit=10000&layout=columnar`;
+            const page = await (await fetch(url)).json();
+            if (!page.data || page.data.length === 0) {
+                throw new Error(page.error || 'Failed to load rows');
+            }
+            decodeColumnar(page.data).forEach(row => data.push(row));
+        }
+        if (serverView !== view) {
+            return;
+        }
+        serverView = null;
+        originalData = data;
+        currentData = [...data];
+        filteredData = [...data];
+        if (view.where) {
+            // An AI filter was applied to the view; keep it as the filtered copy, as the browser does
+            const filter = await (await postWithDataset('/api/filter', { expression: view.where, limit: 1 },
+                undefined, ensureOriginalDatasetUploaded)).json();
+            currentData = rowsFromRowSet(filter.row_set, data);
+            filteredData = [...currentData];
+            markDatasetDirty(true);
+        }
+        currentPage = 0;
+        applyFilters();
+    } finally {
+        hideLoading();
+    }
+}
+
+// Features that need every row in the browser start with `if (deferUntilLocal(feature, arguments)) return;`.
+// For a server view this loads the rows, runs the feature again and returns true.
+function deferUntilLocal(feature, args) {
+    if (!serverView) {
+        return false;
+    }
+    loadServerViewRows()
+        .then(() => feature(...args))
+        .catch(error => alert('Error loading rows: ' + error.message));
+    return true;
+}
+
 // Additional utility functions
 function showKeyboardShortcuts() {
     showModal('keyboardShortcutsModal');
@@ -4782,6 +5521,7 @@ function addMessageToChat(sender, message) {
     
     // Scroll to bottom
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    return content;
 }
 
 function showTypingIndicator() {
@@ -5520,14 +6260,6 @@ async function processAIQueryWithCode(query) {
         }
         
         const headers = Object.keys(currentData[0]);
-        let csvData = headers.join(',') + '\n';
-        currentData.forEach(row => {
-            const values = headers.map(header => {
-                const value = row[header] || '';
-                return `"${value}"`;
-            });
-            csvData += values.join(',') + '\n';
-        });
         
         // Modify prompt based on mode
         let prompt;
@@ -5555,108 +6287,64 @@ df['column'].mean()
 Now, output the code:`;
         }
         
-        console.log('Sending AI request:', { csvData: csvData.substring(0, 200) + '...', question: query });
-        
-        const response = await fetch('/api/ai-analysis', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ csvData, question: query, mode: currentAIMode })
-        });
-        
-        console.log('Response status:', response.status);
-        
-        hideTypingIndicator();
-        
-        if (!response.ok) {
-            const result = await response.json();
-            addMessageToChat('ai', `Error: ${result.error || 'Unknown error'}`);
-            return;
-        }
+        console.log('Sending AI request:', { datasetId: currentDatasetId, question: query });
         
+        // Stream the model output into a live message while it is generated
+        let liveMessage = null;
         let result;
         try {
-            result = await response.json();
-            console.log('AI Response:', result);
-        } catch (jsonError) {
-            console.error('JSON parsing error:', jsonError);
-            addMessageToChat('ai', `Error parsing response: ${jsonError.message}`);
+            // Filters run on the server against the full original table, like the old in-browser filter did
+            const resolveDatasetId = currentAIMode === 'filter' ? ensureOriginalDatasetUploaded : ensureDatasetUploaded;
+            result = await streamAIAnalysis('/api/ai-analysis/stream', { question: query, mode: currentAIMode }, token => {
+                if (!liveMessage) {
+                    hideTypingIndicator();
+                    liveMessage = addMessageToChat('ai', '');
+                }
+                liveMessage.querySelector('p').textContent += token;
+            }, resolveDatasetId);
+        } finally {
+            hideTypingIndicator();
+            if (liveMessage) {
+                liveMessage.parentNode.remove();
+            }
+        }
+        
+        if (!result) {
+            addMessageToChat('ai', 'Request cancelled.');
             return;
         }
+        console.log('AI Response:', result);
         
-        // Handle filter mode differently
-        if (currentAIMode === 'filter' && result.code) {
-            try {
-                // Apply the filter to the data
-                const filterCode = result.code;
-                console.log('Filter code received:', filterCode);
-                console.log('Current data before filter:', currentData);
-                
-                const filteredResult = applyFilterToData(filterCode);
-                console.log('Filtered data result:', filteredResult);
-                
-                // Ensure filteredResult is an array
-                const filteredArray = Array.isArray(filteredResult) ? filteredResult : [filteredResult];
-                
-                // Update the table with filtered data
-                currentData = filteredArray;
-                filteredData = [...filteredArray]; // Update global filteredData
-                // Fix: Convert array of arrays to array of objects if needed
-                const headers = Object.keys(originalData[0] || {});
-                if (filteredData.length > 0 && Array.isArray(filteredData[0])) {
-                    filteredData = filteredData.map(rowArr =>
-                        Object.fromEntries(headers.map((h, i) => [h, rowArr[i]]))
-                    );
-                }
+        // Filter mode: the server evaluated the filter and sent back which rows matched
+        if (result.mode === 'filter' && result.filter) {
+            const filterCode = result.code;
+            const filter = result.filter;
+            console.log('Filter applied on server:', filterCode, filter.count, 'rows');
+            
+            if (serverView) {
+                // The server view filters its windows with the expression instead
+                serverView.where = filter.expression;
                 currentPage = 0;
-                console.log('Before populateTable - filteredData:', filteredData);
-                console.log('Before populateTable - filteredData length:', filteredData.length);
-                populateTable();
-                
-                let message = '';
-                message += `<div style='margin-bottom:8px;'><b>Filter Applied:</b></div><pre style='background:#f4f4f4;padding:8px;border-radius:6px;'><code>${filterCode}</code></pre>`;
-                message += `<div style='margin-top:8px;'><b>Results:</b> ${filteredArray.length} rows found</div>`;
-                
-                addMessageToChat('ai', message);
-            } catch (filterError) {
-                addMessageToChat('ai', `Error applying filter: ${filterError.message}`);
-            }
-        } else if (result.mode === 'filter' && result.code) {
-            // Handle backend filter mode response
-            try {
-                // Apply the filter to the data
-                const filterCode = result.code;
-                console.log('Filter code received from backend:', filterCode);
-                console.log('Current data before filter:', currentData);
-                
-                const filteredResult = applyFilterToData(filterCode);
-                console.log('Filtered data result:', filteredResult);
-                
-                // Ensure filteredResult is an array
-                const filteredArray = Array.isArray(filteredResult) ? filteredResult : [filteredResult];
+                await loadServerViewPage();
+            } else {
+                // Row positions refer to originalData; fall back to the returned page if it no longer lines up
+                const filteredArray = filter.total_rows === originalData.length
+                    ? rowsFromRowSet(filter.row_set, originalData)
+                    : filter.rows;
                 
                 // Update the table with filtered data
                 currentData = filteredArray;
                 filteredData = [...filteredArray]; // Update global filteredData
-                // Fix: Convert array of arrays to array of objects if needed
-                const headers = Object.keys(originalData[0] || {});
-                if (filteredData.length > 0 && Array.isArray(filteredData[0])) {
-                    filteredData = filteredData.map(rowArr =>
-                        Object.fromEntries(headers.map((h, i) => [h, rowArr[i]]))
-                    );
-                }
+                markDatasetDirty(true);
                 currentPage = 0;
-                console.log('Before populateTable - filteredData:', filteredData);
-                console.log('Before populateTable - filteredData length:', filteredData.length);
                 populateTable();
-                
-                let message = '';
-                message += `<div style='margin-bottom:8px;'><b>Filter Applied:</b></div><pre style='background:#f4f4f4;padding:8px;border-radius:6px;'><code>${filterCode}</code></pre>`;
-                message += `<div style='margin-top:8px;'><b>Results:</b> ${filteredArray.length} rows found</div>`;
-                
-                addMessageToChat('ai', message);
-            } catch (filterError) {
-                addMessageToChat('ai', `Error applying filter: ${filterError.message}`);
             }
+            
+            let message = '';
+            message += `<div style='margin-bottom:8px;'><b>Filter Applied:</b></div><pre style='background:#f4f4f4;padding:8px;border-radius:6px;'><code>${filterCode}</code></pre>`;
+            message += `<div style='margin-top:8px;'><b>Results:</b> ${filter.count} rows found</div>`;
+            
+            addMessageToChat('ai', message);
         } else {
             // Regular query mode
             let message = '';
@@ -5666,6 +6354,9 @@ Now, output the code:`;
             if (result.output !== undefined) {
                 message += `<div style='margin-top:8px;'><b>Output:</b></div><div style='background:#f9f9f9;padding:8px;border-radius:6px;'>${typeof result.output === 'object' ? JSON.stringify(result.output, null, 2) : result.output}</div>`;
             }
+            if (result.truncated) {
+                message += `<div style='margin-top:4px;color:#666;'>Showing the first rows of a long result.</div>`;
+            }
             addMessageToChat('ai', message);
         }
     } catch (error) {
@@ -5675,56 +6366,29 @@ Now, output the code:`;
     }
 }
 
-// Helper function to apply filter to data
-function applyFilterToData(filterCode) {
-    // Always use originalData as the base for filtering
-    const df = originalData;
-    const allowedGlobals = { df };
-    
-    console.log('Applying filter code:', filterCode);
-    console.log('DataFrame (df) available:', df);
-    console.log('DataFrame length:', df ? df.length : 'undefined');
-    console.log('First row sample:', df && df.length > 0 ? df[0] : 'No data');
-    console.log('Column names:', df && df.length > 0 ? Object.keys(df[0]) : 'No columns');
-    
-    let filteredData;
-    try {
-        // Execute the filter code safely
-        filteredData = eval(filterCode, { "__builtins__": {} }, allowedGlobals);
-        console.log('Raw filtered data:', filteredData);
-        console.log('Filtered data type:', typeof filteredData);
-        console.log('Is array:', Array.isArray(filteredData));
-        console.log('Filtered data length:', filteredData ? filteredData.length : 'undefined');
-        
-        // Manual test of the filter
-        console.log('Manual test of filter:');
-        try {
-            const manualTest = df.filter(row => row.Country === 'Nepal');
-            console.log('Manual test result:', manualTest);
-            console.log('Manual test length:', manualTest.length);
-        } catch (e) {
-            console.log('Manual test failed:', e);
-        }
-        
-        // If the result is an array of arrays, convert to array of objects
-        if (Array.isArray(filteredData) && filteredData.length > 0 && Array.isArray(filteredData[0])) {
-            const headers = Object.keys(originalData[0] || {});
-            filteredData = filteredData.map(rowArr =>
-                Object.fromEntries(headers.map((h, i) => [h, rowArr[i]]))
-            );
-        }
-        // If the result is not an array of objects, show error
-        if (!(Array.isArray(filteredData) && filteredData.length > 0 && typeof filteredData[0] === 'object' && !Array.isArray(filteredData[0]))) {
-            console.error('Invalid filter result:', filteredData);
-            alert('AI filter did not return an array of objects. Please rephrase your filter or try again.');
-            return [];
+// Pick the rows a server-side filter matched, without scanning the rest of the table
+function rowsFromRowSet(rowSet, rows) {
+    const matched = [];
+    if (rowSet.encoding === 'ranges') {
+        rowSet.ranges.forEach(([start, end]) => {
+            for (let i = start; i < end; i++) {
+                matched.push(rows[i]);
+            }
+        });
+        return matched;
+    }
+    // Bitmap: row i is bit (i % 8) of byte (i / 8)
+    const bytes = atob(rowSet.bitmap);
+    for (let byteIndex = 0; byteIndex < bytes.length; byteIndex++) {
+        const byte = bytes.charCodeAt(byteIndex);
+        if (byte === 0) continue;
+        for (let bit = 0; bit < 8; bit++) {
+            if (byte & (1 << bit)) {
+                matched.push(rows[byteIndex * 8 + bit]);
+            }
         }
-        return filteredData;
-    } catch (error) {
-        console.error('Error in applyFilterToData:', error);
-        alert('AI filter did not return an array of objects. Please rephrase your filter or try again.');
-        return [];
     }
+    return matched;
 }
 
 // Column drag and drop functionality
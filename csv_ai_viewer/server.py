@@ -1,17 +1,58 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, render_template, request, jsonify, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
-import ollama
 import io
+import json
 import os
+import threading
+import time
+import uuid
 from typing import Dict, List, Any, Optional
 import warnings
+from datasets import DatasetRegistry
+from llm_cache import ResponseCache
+from llm_scheduler import LLMScheduler, QueueFull
+from ollama_service import OllamaService, message_content
+from profiling import profile_dataframe
+from schema import infer_schema
+from sketches import SKETCH_CHUNK_ROWS, SketchedCSV
 warnings.filterwarnings('ignore')
 
 app = Flask(__name__)
 CORS(app)
 
+MEMORY_BUDGET_MB = int(os.environ.get('CSV_VIEWER_MEMORY_BUDGET_MB', '1024'))
+
+LLM_CACHE_SIZE = int(os.environ.get('CSV_VIEWER_LLM_CACHE_SIZE', '512'))
+LLM_CACHE_TTL = int(os.environ.get('CSV_VIEWER_LLM_CACHE_TTL', str(24 * 60 * 60)))
+LLM_CACHE_DIR = os.environ.get('CSV_VIEWER_LLM_CACHE_DIR') or None
+LLM_MODEL = 'llama3'
+OLLAMA_REFRESH_INTERVAL = int(os.environ.get('CSV_VIEWER_OLLAMA_REFRESH', '30'))
+LLM_CONCURRENCY = int(os.environ.get('CSV_VIEWER_LLM_CONCURRENCY', '1'))
+LLM_QUEUE_SIZE = int(os.environ.get('CSV_VIEWER_LLM_QUEUE_SIZE', '16'))
+# CSV files too large for memory are placed here and summarized out of core (see /api/large-datasets)
+LARGE_DATASET_DIR = os.environ.get('CSV_VIEWER_LARGE_DATASET_DIR',
+                                   os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'large'))
+SKETCH_CHUNK_ROWS = int(os.environ.get('CSV_VIEWER_SKETCH_CHUNK_ROWS', str(SKETCH_CHUNK_ROWS)))
+SKETCH_WORKERS = int(os.environ.get('CSV_VIEWER_SKETCH_WORKERS', '1'))
+
+# Parsed datasets keyed by a hash of their CSV content
+datasets = DatasetRegistry(memory_budget=MEMORY_BUDGET_MB * 1024 * 1024)
+
+# One Ollama client for the whole process; its model list refreshes in the background
+ollama_service = OllamaService(refresh_interval=OLLAMA_REFRESH_INTERVAL)
+
+# Model answers keyed by dataset, normalized question and model
+llm_cache = ResponseCache(max_entries=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL, directory=LLM_CACHE_DIR)
+
+# Limits concurrent generations and shares one answer between identical in-flight prompts
+llm_scheduler = LLMScheduler(max_concurrency=LLM_CONCURRENCY, max_queue=LLM_QUEUE_SIZE)
+
+# Out-of-core datasets keyed by file fingerprint; each is scanned once in a background thread
+large_datasets = {}
+large_datasets_lock = threading.Lock()
+
 # Serve static files
 @app.route('/')
 def index():
@@ -23,105 +64,57 @@ def static_files(filename):
 
 def check_ollama_connection():
     """Check if Ollama is available and llama3 model is installed"""
-    try:
-        models_response = ollama.list()
-        if hasattr(models_response, 'models'):
-            models = models_response.models
-        elif isinstance(models_response, (list, tuple)):
-            models = models_response
-        else:
-            models = []
-        model_names = [getattr(model, 'model', None) for model in models]
-        if not any(name and str(name).startswith('llama3') for name in model_names):
-            return False, "llama3 model not found. Please install it with: ollama pull llama3"
-        return True, "Ollama connection successful"
-    except Exception as e:
-        return False, f"Ollama connection failed: {str(e)}. Please ensure Ollama is running."
+    model_name, error = ollama_service.select_chat_model(preferred=LLM_MODEL)
+    if model_name is None and error.startswith('Error listing'):
+        return False, f"Ollama connection failed: {error}. Please ensure Ollama is running."
+    if model_name is None:
+        return False, f"{LLM_MODEL} model not found. Please install it with: ollama pull {LLM_MODEL}"
+    return True, "Ollama connection successful"
 
 def detect_data_types(df):
     """Detect data types for each column"""
-    data_types = {}
-    for col in df.columns:
-        try:
-            pd.to_numeric(df[col], errors='raise')
-            data_types[col] = 'numeric'
-        except:
-            try:
-                pd.to_datetime(df[col], errors='raise')
-                data_types[col] = 'datetime'
-            except:
-                if df[col].nunique() < min(20, len(df) // 10):
-                    data_types[col] = 'categorical'
-                else:
-                    data_types[col] = 'text'
-    return data_types
+    return infer_schema(df).data_types()
 
-def ai_analysis(data_info, question):
-    """Get AI analysis using Ollama"""
-    try:
-        df_full = data_info.get('df_full', None)
-        if df_full is None:
-            df_full = pd.DataFrame(data_info.get('sample_data', {}))
-        else:
-            df_full = df_full.copy()
-        
-        df_preview = df_full.head(20)
-        df_markdown = df_preview.to_markdown(index=False)
-        
-        numeric_stats = {}
-        numeric_cols = data_info.get('numeric_cols', [])
-        for col in numeric_cols:
-            if col in df_full.columns:
-                try:
-                    numeric_data = pd.to_numeric(df_full[col], errors='coerce')
-                    if not numeric_data.isna().all():
-                        numeric_stats[col] = {
-                            'min': numeric_data.min(),
-                            'max': numeric_data.max(),
-                            'mean': numeric_data.mean(),
-                            'count': numeric_data.count()
-                        }
-                except:
-                    continue
-        
-        numeric_desc = ""
-        for col, stats in numeric_stats.items():
-            try:
-                quantiles = pd.to_numeric(df_full[col], errors='coerce').quantile([0.25, 0.5, 0.75]).to_dict()
-                numeric_desc += f"- {col}: min={stats['min']:.2f}, max={stats['max']:.2f}, mean={stats['mean']:.2f}, count={stats['count']}, "
-                if quantiles:
-                    numeric_desc += f"Q1={quantiles.get(0.25, ''):.2f}, Median={quantiles.get(0.5, ''):.2f}, Q3={quantiles.get(0.75, ''):.2f}"
-                numeric_desc += "\n"
-            except:
-                numeric_desc += f"- {col}: min={stats['min']}, max={stats['max']}, mean={stats['mean']:.2f}, count={stats['count']}\n"
-        
-        categorical_samples = {}
-        categorical_cols = data_info.get('categorical_cols', [])
-        for col in categorical_cols:
-            if col in df_full.columns:
-                try:
-                    value_counts = df_full[col].value_counts().to_dict()
-                    categorical_samples[col] = value_counts
-                except:
-                    continue
-        
-        categorical_desc = ""
-        for col, samples in categorical_samples.items():
-            if col in df_full.columns:
-                try:
-                    value_counts = df_full[col].value_counts().to_dict()
-                    top_values = list(value_counts.items())[:5]
-                    categorical_desc += f"- {col}: top values: {', '.join([f'{k} ({v})' for k,v in top_values])}\n"
-                except:
-                    continue
-        
-        missing_info = data_info.get('missing_values', {})
-        missing_desc = ""
-        for col, count in missing_info.items():
-            if count > 0:
-                missing_desc += f"- {col}: {count} missing values\n"
-        
-        context = f"""
+def build_analysis_prompt(data_info, question):
+    """Build the LLM prompt from the cached preview and column profile"""
+    df_full = data_info.get('df_full', None)
+    if df_full is None:
+        df_full = pd.DataFrame(data_info.get('sample_data', {}))
+    
+    profile = data_info.get('profile')
+    if profile is None:
+        profile = profile_dataframe(df_full, infer_schema(df_full))
+    
+    df_preview = df_full.head(20)
+    df_markdown = df_preview.to_markdown(index=False)
+    
+    numeric_desc = ""
+    for col in data_info.get('numeric_cols', []):
+        stats = profile.get(col)
+        if not stats or not stats.get('count'):
+            continue
+        try:
+            numeric_desc += f"- {col}: min={stats['min']:.2f}, max={stats['max']:.2f}, mean={stats['mean']:.2f}, count={stats['count']}, "
+            numeric_desc += f"Q1={stats['q1']:.2f}, Median={stats['median']:.2f}, Q3={stats['q3']:.2f}"
+            numeric_desc += "\n"
+        except (TypeError, ValueError):
+            numeric_desc += f"- {col}: min={stats['min']}, max={stats['max']}, mean={stats['mean']:.2f}, count={stats['count']}\n"
+    
+    categorical_desc = ""
+    for col in data_info.get('categorical_cols', []):
+        stats = profile.get(col)
+        if not stats or 'top_values' not in stats:
+            continue
+        top_values = stats['top_values'][:5]
+        categorical_desc += f"- {col}: top values: {', '.join([f'{k} ({v})' for k,v in top_values])}\n"
+    
+    missing_info = data_info.get('missing_values', {})
+    missing_desc = ""
+    for col, count in missing_info.items():
+        if count > 0:
+            missing_desc += f"- {col}: {count} missing values\n"
+    
+    return f"""
 You are a helpful data analyst assistant. Here is a preview of the user's dataset (first 20 rows):
 
 {df_markdown}
@@ -140,61 +133,271 @@ User Question: {question}
 Please answer ONLY based on the data above. If the answer is not in the data, say 'I don't know based on the provided data.'
 Keep your answer short, direct, and user-friendly. Do not provide code or technical explanations.
 """
+
+def ai_analysis(data_info, question):
+    """Get AI analysis using Ollama"""
+    try:
+        # The answer depends on the model, so resolve it before looking up the cache
+        model_name, _ = ollama_service.select_chat_model(preferred=LLM_MODEL)
+        model_name = model_name or LLM_MODEL
+        cache_key = None
+        if data_info.get('dataset_id'):
+            cache_key = llm_cache.make_key(data_info['dataset_id'], question, 'analysis', model_name)
+            answer = llm_cache.get(cache_key)
+            if answer is not None:
+                return answer
         
-        response = ollama.chat(model='llama3', messages=[
+        context = build_analysis_prompt(data_info, question)
+        messages = [
             {
                 'role': 'user',
                 'content': context
             }
-        ])
+        ]
+        response = llm_scheduler.run(llm_scheduler.make_key(model_name, messages),
+                                     lambda: ollama_service.chat(model_name, messages))
         
-        return response['message']['content']
+        answer = message_content(response)
+        if cache_key:
+            llm_cache.set(cache_key, answer)
+        return answer
+    except QueueFull:
+        raise
     except Exception as e:
         return f"Error connecting to AI service: {str(e)}. Please ensure Ollama is running and the llama3 model is installed."
 
+def build_data_info(dataset):
+    """Collect the cached schema, profile and preview that prompts are built from"""
+    df = dataset.df
+    # Column types are inferred once per dataset and cached
+    schema = dataset.schema
+    return {
+        'dataset_id': dataset.dataset_id,
+        'shape': df.shape,
+        'columns': list(df.columns),
+        'dtypes': schema.data_types(),
+        'numeric_cols': schema.columns_of_type('numeric'),
+        'categorical_cols': schema.columns_of_type('categorical'),
+        'missing_values': schema.missing_values(),
+        'profile': dataset.profile,
+        'sample_data': df.head(20).to_dict(),
+        'df': df.head(20) if len(df) > 20 else df,
+        'df_full': df
+    }
+
+def build_sketch_data_info(large):
+    """The data_info of an out-of-core dataset: the prompt summaries come from its sketches"""
+    schema = large.schema
+    return {
+        'dataset_id': large.dataset_id,
+        'shape': (large.rows, len(schema.columns)),
+        'columns': list(schema.columns),
+        'dtypes': schema.data_types(),
+        'numeric_cols': schema.columns_of_type('numeric'),
+        'categorical_cols': schema.columns_of_type('categorical'),
+        'missing_values': schema.missing_values(),
+        'profile': large.profile,
+        'sample_data': large.preview.to_dict(),
+        'df': large.preview,
+        'df_full': large.preview
+    }
+
+def resolve_data_info(dataset_id, csv_data):
+    """Return (data_info, error_response) for an uploaded, inline or out-of-core dataset"""
+    with large_datasets_lock:
+        large = large_datasets.get(dataset_id) if dataset_id else None
+    if large is not None:
+        if large.status != 'ready':
+            return None, (jsonify({'error': 'The dataset is still being summarized.', **large.info()}), 409)
+        return build_sketch_data_info(large), None
+    if dataset_id:
+        dataset = datasets.get(dataset_id)
+        if dataset is None:
+            return None, (jsonify({'error': 'Dataset not found. Please upload it again.', 'dataset_id': dataset_id}), 404)
+    else:
+        dataset = datasets.add_csv(csv_data)
+    return build_data_info(dataset), None
+
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload"""
+    return f'event: {event}\ndata: {json.dumps(data, default=str)}\n\n'
+
+def queue_full_response(error):
+    """429 response telling the client when to retry a rejected AI request"""
+    return (jsonify({'error': f'The AI service is busy. Please retry in {error.retry_after} seconds.',
+                     'retry_after': error.retry_after}),
+            429, {'Retry-After': str(error.retry_after)})
+
+@app.route('/api/datasets', methods=['POST'])
+def upload_dataset():
+    """API endpoint that parses a CSV once and returns its dataset id"""
+    try:
+        if request.is_json:
+            csv_data = request.json.get('csvData', '')
+        else:
+            csv_data = request.get_data(as_text=True)
+        if not csv_data:
+            return jsonify({'error': 'No data provided'}), 400
+        return jsonify(datasets.add_csv(csv_data).info()), 201
+    except Exception as e:
+        return jsonify({'error': f'Error loading dataset: {str(e)}'}), 400
+
+@app.route('/api/large-datasets', methods=['POST'])
+def add_large_dataset():
+    """Start summarizing a CSV from LARGE_DATASET_DIR out of core; poll the returned id until it is ready"""
+    filename = (request.get_json(silent=True) or {}).get('filename', '')
+    directory = os.path.abspath(LARGE_DATASET_DIR)
+    path = os.path.abspath(os.path.join(directory, filename))
+    if not filename or os.path.dirname(path) != directory or not os.path.isfile(path):
+        return jsonify({'error': f'No such file in {LARGE_DATASET_DIR}: {filename}'}), 404
+    
+    dataset_id = SketchedCSV.fingerprint(path)
+    with large_datasets_lock:
+        large = large_datasets.get(dataset_id)
+        if large is None or large.status == 'failed':
+            large = large_datasets[dataset_id] = SketchedCSV(dataset_id, path, chunk_rows=SKETCH_CHUNK_ROWS,
+                                                             workers=SKETCH_WORKERS)
+            threading.Thread(target=large.run, daemon=True).start()
+    return jsonify(large.info()), 202 if large.status != 'ready' else 200
+
+@app.route('/api/large-datasets/<dataset_id>', methods=['GET'])
+def get_large_dataset(dataset_id):
+    """Scan progress of an out-of-core dataset, with its schema and sketched profile once ready"""
+    with large_datasets_lock:
+        large = large_datasets.get(dataset_id)
+    if large is None:
+        return jsonify({'error': 'Dataset not found', 'dataset_id': dataset_id}), 404
+    info = large.info()
+    if large.status == 'ready':
+        info.update({'schema': large.schema.to_dict(), 'profile': large.profile})
+    return jsonify(info)
+
 @app.route('/api/ai-analysis', methods=['POST'])
 def analyze_data():
     """API endpoint for AI analysis"""
     try:
         data = request.json
+        dataset_id = data.get('datasetId')
         csv_data = data.get('csvData', '')
         question = data.get('question', '')
         
-        if not csv_data or not question:
+        if not (dataset_id or csv_data) or not question:
             return jsonify({'error': 'Missing CSV data or question'}), 400
         
-        # Parse CSV data
-        df = pd.read_csv(io.StringIO(csv_data))
+        data_info, error = resolve_data_info(dataset_id, csv_data)
+        if error is not None:
+            return error
         
         # Check Ollama connection
         ollama_available, ollama_message = check_ollama_connection()
         if not ollama_available:
             return jsonify({'error': ollama_message}), 500
         
-        # Calculate data types
-        data_types = detect_data_types(df)
-        numeric_cols = [col for col in df.columns if data_types[col] == 'numeric']
-        categorical_cols = [col for col in df.columns if data_types[col] == 'categorical']
-        
-        data_info = {
-            'shape': df.shape,
-            'columns': list(df.columns),
-            'dtypes': data_types,
-            'numeric_cols': numeric_cols,
-            'categorical_cols': categorical_cols,
-            'missing_values': df.isnull().sum().to_dict(),
-            'sample_data': df.head(20).to_dict(),
-            'df': df.head(20) if len(df) > 20 else df,
-            'df_full': df
-        }
-        
         # Get AI analysis
         response = ai_analysis(data_info, question)
         
-        return jsonify({'response': response})
+        return jsonify({'response': response, 'dataset_id': data_info['dataset_id']})
+        
+    except QueueFull as e:
+        return queue_full_response(e)
+    except Exception as e:
+        return jsonify({'error': f'Error processing request: {str(e)}'}), 500
+
+@app.route('/api/ai-analysis/stream', methods=['POST'])
+def analyze_data_stream():
+    """API endpoint for AI analysis that streams the answer token by token over SSE"""
+    started_at = time.time()
+    data = request.json
+    dataset_id = data.get('datasetId')
+    csv_data = data.get('csvData', '')
+    question = data.get('question', '')
+    request_id = data.get('requestId') or uuid.uuid4().hex
+    
+    if not (dataset_id or csv_data) or not question:
+        return jsonify({'error': 'Missing CSV data or question'}), 400
+    
+    try:
+        data_info, error = resolve_data_info(dataset_id, csv_data)
+        if error is not None:
+            return error
         
+        ollama_available, ollama_message = check_ollama_connection()
+        if not ollama_available:
+            return jsonify({'error': ollama_message}), 500
+        model_name, _ = ollama_service.select_chat_model(preferred=LLM_MODEL)
+        
+        cache_key = llm_cache.make_key(data_info['dataset_id'], question, 'analysis', model_name)
+        cached_answer = llm_cache.get(cache_key)
+        # Registered up front so a cancel can arrive before the first token
+        stream = None
+        slot = None
+        if cached_answer is None:
+            context = build_analysis_prompt(data_info, question)
+            # Streams hold their slot until the last token, so they are not coalesced
+            slot = llm_scheduler.acquire()
+            stream = ollama_service.open_stream(request_id, model_name, [{'role': 'user', 'content': context}])
+    except QueueFull as e:
+        return queue_full_response(e)
     except Exception as e:
         return jsonify({'error': f'Error processing request: {str(e)}'}), 500
+    
+    def finish():
+        if slot is not None:
+            slot.release()
+        ollama_service.close_stream(request_id)
+    
+    def generate():
+        yield sse_event('start', {'request_id': request_id, 'model': model_name, 'cached': cached_answer is not None})
+        try:
+            if cached_answer is not None:
+                yield sse_event('token', {'content': cached_answer})
+                answer = cached_answer
+                first_token_ms = round((time.time() - started_at) * 1000, 1)
+            else:
+                pieces = []
+                tokens = iter(stream)
+                try:
+                    for piece in tokens:
+                        pieces.append(piece)
+                        yield sse_event('token', {'content': piece})
+                finally:
+                    # Also runs when the browser disconnects, which closes the upstream request
+                    tokens.close()
+                if stream.cancelled.is_set():
+                    yield sse_event('cancelled', {'request_id': request_id})
+                    return
+                answer = ''.join(pieces)
+                llm_cache.set(cache_key, answer)
+                first_token_ms = stream.first_token_ms
+            yield sse_event('done', {
+                'response': answer,
+                'dataset_id': data_info['dataset_id'],
+                'cached': cached_answer is not None,
+                'first_token_ms': first_token_ms,
+                'queue_ms': slot.wait_ms if slot is not None else 0,
+                'total_ms': round((time.time() - started_at) * 1000, 1)
+            })
+        except Exception as e:
+            yield sse_event('error', {'error': f"Error connecting to AI service: {str(e)}"})
+        finally:
+            finish()
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(finish)
+    return response
+
+@app.route('/api/ai-analysis/cancel/<request_id>', methods=['POST'])
+def cancel_analysis(request_id):
+    """API endpoint that stops a streaming analysis, including the Ollama generation"""
+    if not ollama_service.cancel_stream(request_id):
+        return jsonify({'error': 'No running request with this id', 'request_id': request_id}), 404
+    return jsonify({'success': True, 'request_id': request_id})
+
+@app.route('/api/llm-scheduler', methods=['GET'])
+def llm_scheduler_stats():
+    """Queue depth, wait times and coalescing counters of the LLM scheduler"""
+    return jsonify(llm_scheduler.stats())
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
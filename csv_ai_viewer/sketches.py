@@ -0,0 +1,444 @@
+import hashlib
+import io
+import os
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from profiling import TOP_K, to_python
+from schema import CATEGORICAL_MAX_VALUES, infer_schema
+
+# Rows parsed per step; with the sketches below this bounds the memory of a scan
+SKETCH_CHUNK_ROWS = 100000
+# Rows read up front to infer column types and build the prompt preview
+SCHEMA_SAMPLE_ROWS = 10000
+PREVIEW_ROWS = 20
+# t-digest compression: roughly delta / 2 centroids, with finer ones in the tails
+TDIGEST_DELTA = 200
+# HyperLogLog precision: 2 ** 14 registers, about 0.8% standard error
+HLL_PRECISION = 14
+# SpaceSaving counters kept per column for the top-k: after N values, a reported count overestimates the
+# true one by at most N / capacity, and every value seen more than N / capacity times is kept
+HEAVY_HITTER_CAPACITY = 1000
+
+
+class Moments:
+    """Count, sum, mean, variance and range of a stream, merged with Chan's parallel update"""
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def update(self, values):
+        if len(values) == 0:
+            return
+        other = Moments()
+        other.count = len(values)
+        other.sum = float(values.sum())
+        other.mean = other.sum / other.count
+        other.m2 = float(((values - other.mean) ** 2).sum())
+        other.min = float(values.min())
+        other.max = float(values.max())
+        self.merge(other)
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.__dict__.update(other.__dict__)
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else None
+
+
+class TDigest:
+    """Mergeable quantile sketch: weighted centroids that are small near the tails.
+
+    Compression is vectorized: centroids are sorted and grouped into unit
+    intervals of the arcsine scale function, so adding a chunk costs one sort.
+    """
+
+    def __init__(self, delta=TDIGEST_DELTA):
+        self.delta = delta
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+
+    def update(self, values):
+        if len(values):
+            self._compress(np.concatenate([self.means, values]),
+                           np.concatenate([self.weights, np.ones(len(values))]))
+
+    def merge(self, other):
+        if len(other.means):
+            self._compress(np.concatenate([self.means, other.means]),
+                           np.concatenate([self.weights, other.weights]))
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind='mergesort')
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        left = (cumulative - weights) / cumulative[-1]
+        scale = self.delta / (2 * np.pi) * np.arcsin(2 * left - 1)
+        bins = np.floor(scale - scale[0])
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(bins)) + 1])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def quantile(self, q):
+        if len(self.means) == 0:
+            return None
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(q * self.weights.sum(), centers, self.means))
+
+
+class HyperLogLog:
+    """Distinct count estimate from 64-bit hashes in 2 ** precision byte registers"""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values):
+        if len(values) == 0:
+            return
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+        rest_bits = 64 - self.precision
+        index = (hashes >> np.uint64(rest_bits)).astype(np.intp)
+        rest = (hashes & np.uint64((1 << rest_bits) - 1)).astype(np.float64)
+        # frexp's exponent is exact, unlike log2, for the rest_bits (< 53) wide remainders
+        _, exponent = np.frexp(rest)
+        rank = np.where(rest > 0, rest_bits - exponent + 1, rest_bits + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+
+class HeavyHitters:
+    """Most frequent values of a stream: mergeable SpaceSaving with ``capacity`` counters.
+
+    A value missing from a full summary may have been evicted with up to its
+    smallest count, so merges credit it with that floor; counts therefore
+    only ever overestimate.
+    """
+
+    def __init__(self, capacity=HEAVY_HITTER_CAPACITY):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype='int64')
+
+    @property
+    def floor(self):
+        """Upper bound of the count of any value not tracked"""
+        return int(self.counts.min()) if len(self.counts) >= self.capacity else 0
+
+    def update(self, values):
+        self.merge_counts(values.value_counts())
+
+    def merge(self, other):
+        self.merge_counts(other.counts, other.floor)
+
+    def merge_counts(self, counts, floor=0):
+        values = self.counts.index.union(counts.index)
+        merged = self.counts.reindex(values, fill_value=self.floor) + counts.reindex(values, fill_value=floor)
+        self.counts = merged.nlargest(self.capacity).astype('int64')
+
+    def top(self, k=TOP_K):
+        counts = self.counts.sort_values(ascending=False, kind='stable').head(k)
+        return [[to_python(value), int(count)] for value, count in counts.items()]
+
+
+class ColumnSketch:
+    """Sketches of one column; numeric columns get moments and a t-digest, others heavy hitters"""
+
+    def __init__(self, column_schema):
+        self.type = column_schema.type
+        self.datetime_format = column_schema.datetime_format
+        self.missing = 0
+        self.distinct = HyperLogLog()
+        if self.type == 'numeric':
+            self.moments = Moments()
+            self.digest = TDigest()
+        else:
+            self.count = 0
+            self.heavy_hitters = HeavyHitters()
+            self.first = self.last = None
+
+    def update(self, column):
+        if self.type == 'numeric':
+            values = pd.to_numeric(column, errors='coerce').astype('float64')
+            self.missing += int(column.isna().sum())
+            values = values.dropna()
+            self.distinct.update(values)
+            self.moments.update(values.to_numpy())
+            self.digest.update(values.to_numpy())
+            return
+        values = column.dropna()
+        self.missing += len(column) - len(values)
+        self.count += len(values)
+        self.distinct.update(values)
+        self.heavy_hitters.update(values)
+        if self.type == 'datetime':
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                parsed = pd.to_datetime(values, format=self.datetime_format, errors='coerce').dropna()
+            if len(parsed):
+                self.first = parsed.min() if self.first is None else min(self.first, parsed.min())
+                self.last = parsed.max() if self.last is None else max(self.last, parsed.max())
+
+    def merge(self, other):
+        self.missing += other.missing
+        self.distinct.merge(other.distinct)
+        if self.type == 'numeric':
+            self.moments.merge(other.moments)
+            self.digest.merge(other.digest)
+            return
+        self.count += other.count
+        self.heavy_hitters.merge(other.heavy_hitters)
+        for bound in (other.first, other.last):
+            if bound is not None:
+                self.first = bound if self.first is None else min(self.first, bound)
+                self.last = bound if self.last is None else max(self.last, bound)
+
+    def profile(self):
+        """The column profile in the shape of ``profiling.profile_column``, from the sketches"""
+        profile = {'type': self.type, 'missing': self.missing, 'distinct': self.distinct.estimate(),
+                   'approximate': True}
+        if self.type != 'numeric':
+            profile['count'] = self.count
+            profile['top_values'] = self.heavy_hitters.top()
+            if self.type == 'datetime':
+                profile['min'], profile['max'] = to_python(self.first), to_python(self.last)
+            return profile
+        moments = self.moments
+        profile['count'] = moments.count
+        if moments.count:
+            profile.update({
+                'sum': moments.sum,
+                'mean': moments.mean,
+                'std': moments.std,
+                'min': moments.min,
+                'max': moments.max,
+                'q1': self.digest.quantile(0.25),
+                'median': self.digest.quantile(0.5),
+                'q3': self.digest.quantile(0.75)
+            })
+        return profile
+
+
+def sketch_chunk(chunk, schema, sketches=None):
+    """Fold one chunk of rows into ``sketches`` ({column: ColumnSketch}), creating them if needed"""
+    if sketches is None:
+        sketches = {name: ColumnSketch(column_schema) for name, column_schema in schema.columns.items()}
+    for name, sketch in sketches.items():
+        sketch.update(chunk[name])
+    return sketches
+
+
+def merge_sketches(target, other):
+    for name, sketch in other.items():
+        target[name].merge(sketch)
+    return target
+
+
+class RangeReader(io.RawIOBase):
+    """Read-only view of bytes [start, end) of a file, for parsing one slice of a CSV"""
+
+    def __init__(self, path, start, end):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        read = self._file.readinto(memoryview(buffer)[:size])
+        self._remaining -= read
+        return read
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def line_ranges(path, start, parts):
+    """Split the bytes of ``path`` after ``start`` into about ``parts`` ranges that end on line breaks"""
+    size = os.path.getsize(path)
+    bounds = [start]
+    with open(path, 'rb') as f:
+        for part in range(1, parts):
+            f.seek(max(start + (size - start) * part // parts, bounds[-1]))
+            f.readline()
+            if f.tell() >= size:
+                break
+            bounds.append(f.tell())
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def read_options(schema):
+    # Non-numeric columns are read as text so values compare the same in every chunk
+    return {
+        'names': list(schema.columns),
+        'header': None,
+        'dtype': {name: str for name, column in schema.columns.items() if column.type != 'numeric'}
+    }
+
+
+def sketch_range(path, start, end, schema, chunk_rows=SKETCH_CHUNK_ROWS):
+    """Sketch the rows in bytes [start, end) of ``path``; runs in a worker process.
+
+    Returns (sketches, rows).
+    """
+    sketches = None
+    rows = 0
+    options = {**read_options(schema), 'chunksize': chunk_rows}
+    with RangeReader(path, start, end) as reader:
+        for chunk in pd.read_csv(io.BufferedReader(reader), **options):
+            sketches = sketch_chunk(chunk, schema, sketches)
+            rows += len(chunk)
+    return sketches, rows
+
+
+def classify_columns(schema, sketches, rows):
+    """Re-decide categorical vs text from the sketched distinct counts instead of the first chunk's"""
+    for name, column_schema in schema.columns.items():
+        profile = sketches[name]
+        column_schema.null_count = profile['missing']
+        column_schema.nullable = profile['missing'] > 0
+        column_schema.cardinality = profile['distinct']
+        if column_schema.type in ('categorical', 'text'):
+            limit = min(CATEGORICAL_MAX_VALUES, rows // 10)
+            column_schema.type = profile['type'] = 'categorical' if profile['distinct'] < limit else 'text'
+    schema.rows = rows
+
+
+class SketchedCSV:
+    """A CSV file summarized out of core, for files that do not fit in memory.
+
+    The file is parsed ``chunk_rows`` rows at a time with
+    ``pd.read_csv(chunksize=...)`` and every column is folded into mergeable
+    sketches (moments, t-digest quantiles, HyperLogLog distinct counts and
+    heavy-hitter top values), so memory stays bounded by one chunk whatever
+    the file size. With ``workers`` > 1 the file is split into byte ranges at
+    line breaks that worker processes sketch in parallel and the results are
+    merged; that assumes no quoted field contains a line break.
+
+    ``profile`` has the same shape as an in-memory dataset's profile, with
+    approximate quantiles and distinct counts.
+    """
+
+    def __init__(self, dataset_id, path, chunk_rows=SKETCH_CHUNK_ROWS, workers=1):
+        self.dataset_id = dataset_id
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.workers = workers
+        self.status = 'pending'
+        self.error = None
+        self.rows = 0
+        self.bytes_read = 0
+        self.bytes_total = os.path.getsize(path)
+        self.schema = None
+        self.profile = None
+        self.preview = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(path):
+        """Dataset id of a file from its path, size and modification time (hashing 30 GB is not an option)"""
+        stat = os.stat(path)
+        key = f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}'
+        return 'file-' + hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+    def run(self):
+        self.status = 'running'
+        try:
+            sample = pd.read_csv(self.path, nrows=SCHEMA_SAMPLE_ROWS)
+            self.preview = sample.head(PREVIEW_ROWS)
+            schema = infer_schema(sample)
+            if self.workers > 1:
+                sketches = self._scan_parallel(schema)
+            else:
+                sketches = self._scan(schema)
+            profile = {name: sketch.profile() for name, sketch in sketches.items()}
+            classify_columns(schema, profile, self.rows)
+            self.schema, self.profile = schema, profile
+            self.status = 'ready'
+        except Exception as e:
+            self.error = str(e)
+            self.status = 'failed'
+        return self
+
+    def _scan(self, schema):
+        sketches = {name: ColumnSketch(column_schema) for name, column_schema in schema.columns.items()}
+        options = {**read_options(schema), 'chunksize': self.chunk_rows, 'skiprows': 1}
+        with open(self.path, 'rb') as f:
+            for chunk in pd.read_csv(f, **options):
+                sketch_chunk(chunk, schema, sketches)
+                with self._lock:
+                    self.rows += len(chunk)
+                    self.bytes_read = f.tell()
+        return sketches
+
+    def _scan_parallel(self, schema):
+        with open(self.path, 'rb') as f:
+            f.readline()
+            header_end = f.tell()
+        self.bytes_read = header_end
+        sketches = {name: ColumnSketch(column_schema) for name, column_schema in schema.columns.items()}
+        # Several ranges per worker keeps them busy when ranges parse at different speeds
+        ranges = line_ranges(self.path, header_end, self.workers * 4)
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(sketch_range, self.path, start, end, schema, self.chunk_rows): end - start
+                       for start, end in ranges}
+            for future in futures:
+                partial, rows = future.result()
+                if partial is not None:
+                    merge_sketches(sketches, partial)
+                with self._lock:
+                    self.rows += rows
+                    self.bytes_read += futures[future]
+        return sketches
+
+    def info(self):
+        with self._lock:
+            return {
+                'dataset_id': self.dataset_id,
+                'path': os.path.basename(self.path),
+                'status': self.status,
+                'error': self.error,
+                'rows': self.rows,
+                'columns': len(self.schema.columns) if self.schema is not None else None,
+                'bytes_read': self.bytes_read,
+                'bytes_total': self.bytes_total,
+                'workers': self.workers
+            }
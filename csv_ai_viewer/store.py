@@ -0,0 +1,162 @@
+import json
+import os
+import threading
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from schema import DatasetSchema
+
+# Codec for the stored Arrow files. Uncompressed files are converted to pandas straight from the
+# memory map; with 'lz4' or 'zstd' they are smaller on disk but every column is decompressed first
+DEFAULT_COMPRESSION = 'uncompressed'
+
+
+class DatasetStore:
+    """Datasets persisted as Arrow IPC (Feather v2) files with their schema and profile.
+
+    Each dataset is ``<id>.arrow`` plus ``<id>.json`` holding the cached
+    schema and profile, so a restarted server reopens a dataset by
+    memory-mapping its file instead of parsing the CSV again. The files'
+    modification times double as access times for the LRU cleanup that keeps
+    the directory under ``quota`` bytes. Edited datasets (version above 1)
+    have no other copy, so the cleanup never removes them.
+    """
+
+    def __init__(self, directory, quota=None, compression=DEFAULT_COMPRESSION):
+        self.directory = directory
+        self.quota = quota
+        self.compression = compression
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, dataset_id, suffix):
+        return os.path.join(self.directory, f'{dataset_id}{suffix}')
+
+    def __contains__(self, dataset_id):
+        return os.path.exists(self._path(dataset_id, '.arrow'))
+
+    def ids(self):
+        return [name[:-len('.arrow')] for name in os.listdir(self.directory) if name.endswith('.arrow')]
+
+    def save(self, dataset_id, df, overwrite=False):
+        """Write ``df`` unless it is already stored; returns False if Arrow can't represent it"""
+        path = self._path(dataset_id, '.arrow')
+        if not overwrite and os.path.exists(path):
+            self.touch(dataset_id)
+            return True
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # e.g. object columns that mix numbers and text
+            return False
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        feather.write_feather(table, tmp_path, compression=self.compression)
+        os.replace(tmp_path, path)
+        self.cleanup(keep=dataset_id)
+        return True
+
+    def load(self, dataset_id):
+        """Memory-map a stored dataset; returns (df, schema, profile, version) or None.
+
+        ``to_pandas`` copies the columns into pandas' own blocks, so the
+        DataFrame can be edited in place; the memory map only saves reading
+        (and, for uncompressed files, decompressing) the file up front.
+        """
+        path = self._path(dataset_id, '.arrow')
+        try:
+            table = feather.read_table(path, memory_map=True)
+        except (OSError, pa.ArrowInvalid):
+            return None
+        self.touch(dataset_id)
+        return (table.to_pandas(), *self.load_metadata(dataset_id))
+
+    def save_metadata(self, dataset_id, schema=None, profile=None, version=None):
+        """Store the computed schema and/or profile (and the version of edited data) next to the data"""
+        if dataset_id not in self:
+            return
+        path = self._path(dataset_id, '.json')
+        with self._lock:
+            metadata = self._read_json(path)
+            if schema is not None:
+                metadata['schema'] = schema.to_dict()
+            if profile is not None:
+                metadata['profile'] = profile
+            if version is not None:
+                metadata['version'] = version
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(metadata, f, default=str)
+            os.replace(tmp_path, path)
+
+    def load_metadata(self, dataset_id):
+        metadata = self._read_json(self._path(dataset_id, '.json'))
+        schema = DatasetSchema.from_dict(metadata['schema']) if 'schema' in metadata else None
+        return schema, metadata.get('profile'), metadata.get('version', 1)
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def touch(self, dataset_id):
+        try:
+            os.utime(self._path(dataset_id, '.arrow'))
+        except OSError:
+            pass
+
+    def remove(self, dataset_id):
+        removed = False
+        for suffix in ('.arrow', '.json'):
+            try:
+                os.remove(self._path(dataset_id, suffix))
+                removed = True
+            except OSError:
+                pass
+        return removed
+
+    def entries(self):
+        """Stored datasets as dicts with id, size and last access, least recently used first"""
+        entries = []
+        for dataset_id in self.ids():
+            try:
+                stat = os.stat(self._path(dataset_id, '.arrow'))
+            except OSError:
+                continue
+            edited = self._read_json(self._path(dataset_id, '.json')).get('version', 1) > 1
+            entries.append({'dataset_id': dataset_id, 'bytes': stat.st_size, 'last_access': stat.st_mtime,
+                            'edited': edited})
+        return sorted(entries, key=lambda entry: entry['last_access'])
+
+    def cleanup(self, keep=None):
+        """Delete least recently used datasets until the store fits its quota, sparing edited ones"""
+        if not self.quota:
+            return []
+        entries = self.entries()
+        total = sum(entry['bytes'] for entry in entries)
+        removed = []
+        for entry in entries:
+            if total <= self.quota:
+                break
+            if entry['dataset_id'] == keep or entry['edited']:
+                continue
+            self.remove(entry['dataset_id'])
+            total -= entry['bytes']
+            removed.append(entry['dataset_id'])
+        return removed
+
+    def stats(self):
+        entries = self.entries()
+        return {
+            'directory': self.directory,
+            'datasets': len(entries),
+            'bytes': sum(entry['bytes'] for entry in entries),
+            'edited': sum(entry['edited'] for entry in entries),
+            'quota': self.quota,
+            'compression': self.compression,
+            'oldest_access': entries[0]['last_access'] if entries else None
+        }
+
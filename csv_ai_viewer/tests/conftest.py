@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# The server modules are flat files next to app.py; keep test datasets out of data/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('CSV_VIEWER_DATA_DIR', tempfile.mkdtemp(prefix='csv_viewer_test_'))
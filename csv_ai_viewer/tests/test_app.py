@@ -0,0 +1,140 @@
+import json
+import uuid
+
+import pytest
+
+import app as web_app
+from ollama_service import OllamaService
+
+
+class FakeClient:
+    """Stands in for ollama.Client: one model that answers every chat with ``answer``, piece by piece"""
+
+    def __init__(self, answer='df.shape[0]'):
+        self.answer = answer
+        self.chats = 0
+
+    def list(self):
+        return {'models': [{'name': 'llama3:latest'}]}
+
+    def chat(self, model, messages, stream=False, **kwargs):
+        self.chats += 1
+        if not stream:
+            return {'message': {'role': 'assistant', 'content': self.answer}, 'done': True}
+        return self._pieces()
+
+    def _pieces(self):
+        for piece in self.answer.split('.'):
+            yield {'message': {'content': piece + '.'}, 'done': False}
+        yield {'message': {'content': ''}, 'done': True, 'prompt_eval_count': 10, 'eval_count': 2}
+
+
+@pytest.fixture
+def ollama(monkeypatch):
+    service = OllamaService(refresh_interval=0)
+    service._client = FakeClient()
+    monkeypatch.setattr(web_app, 'ollama_service', service)
+    return service._client
+
+
+@pytest.fixture
+def client():
+    return web_app.app.test_client()
+
+
+@pytest.fixture
+def dataset_id(client):
+    return client.post('/api/datasets', json={'csvData': 'age,city\n30,Oslo\n41,Bergen\n'}).get_json()['dataset_id']
+
+
+def sse_events(chunks):
+    """(event, data) pairs of an SSE body given as an iterable of byte chunks"""
+    buffer = b''.join(chunks).decode('utf-8')
+    events = []
+    for raw in buffer.split('\n\n'):
+        if raw:
+            lines = dict(line.split(': ', 1) for line in raw.split('\n'))
+            events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def question():
+    # A new question per test keeps the answer cache out of the way
+    return f'How many rows are there? ({uuid.uuid4().hex})'
+
+
+def test_stream_ids_come_from_the_server(client, ollama, dataset_id):
+    response = client.post('/api/ai-analysis/stream', json={'datasetId': dataset_id, 'question': question(),
+                                                            'requestId': 'chosen-by-client'}, buffered=False)
+    chunks = iter(response.response)
+    event, start = sse_events([next(chunks)])[0]
+    assert event == 'start'
+    request_id = start['request_id']
+    assert request_id != 'chosen-by-client'
+
+    assert client.post('/api/ai-analysis/cancel/chosen-by-client').status_code == 404
+    assert client.post(f'/api/ai-analysis/cancel/{request_id}').get_json() == {'success': True,
+                                                                               'request_id': request_id}
+    assert [event for event, _ in sse_events(chunks)] == ['cancelled']
+    response.close()
+    assert client.post(f'/api/ai-analysis/cancel/{request_id}').status_code == 404
+
+
+def test_answers_stream_as_server_sent_events(client, ollama, dataset_id):
+    ollama.answer = 'df.shape[0]\n'
+    body = {'datasetId': dataset_id, 'question': question()}
+    response = client.post('/api/ai-analysis/stream', json=body)
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    events = sse_events([response.data])
+    assert [event for event, _ in events] == ['start', 'token', 'token', 'done']
+    assert events[0][1]['model'] == 'llama3:latest' and not events[0][1]['cached']
+    assert ''.join(data['content'] for event, data in events if event == 'token') == 'df.shape[0]\n.'
+    done = events[-1][1]
+    assert (done['code'], done['dataset_id'], done['cached']) == ('df.shape[0]', dataset_id, False)
+    assert done['output'] == '2'
+    assert done['first_token_ms'] is not None
+
+    # The same question again is answered from the cache in one token
+    events = sse_events([client.post('/api/ai-analysis/stream', json=body).data])
+    assert [event for event, _ in events] == ['start', 'token', 'done']
+    assert events[-1][1]['cached'] and events[-1][1]['code'] == 'df.shape[0]'
+    assert ollama.chats == 1
+
+
+def test_unsafe_code_ends_the_stream_with_an_error(client, ollama, dataset_id):
+    ollama.answer = 'import os'
+    events = sse_events([client.post('/api/ai-analysis/stream',
+                                     json={'datasetId': dataset_id, 'question': question()}).data])
+    assert events[-1] == ('error', {'error': 'Generated code is not safe or valid.', 'code': 'import os.'})
+
+
+def test_data_info_is_revalidated_with_etags(client, dataset_id):
+    response = client.get(f'/api/data-info?dataset_id={dataset_id}')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert etag == f'"{dataset_id}-1"'
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    response = client.get(f'/api/data-info?dataset_id={dataset_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert not response.data
+
+    # The first edit forks the upload; later edits move the fork to a new version
+    edited = client.patch(f'/api/datasets/{dataset_id}',
+                          json={'changes': [{'op': 'set', 'row': 0, 'column': 'age', 'value': '31'}]})
+    edited_id = edited.get_json()['dataset_id']
+    assert client.get(f'/api/data-info?dataset_id={dataset_id}', headers={'If-None-Match': etag}).status_code == 304
+    response = client.get('/api/data-info', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['dataset_id'] == edited_id
+
+    etag = response.headers['ETag']
+    assert edited.headers['ETag'] == etag
+    client.patch(f'/api/datasets/{edited_id}', json={'changes': [{'op': 'set', 'row': 1, 'column': 'age', 'value': '42'}]})
+    response = client.get(f'/api/data-info?dataset_id={edited_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()['version'] == edited.get_json()['version'] + 1
+    assert response.get_json()['profile']['age']['max'] == 42
@@ -0,0 +1,78 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from charts import ChartError, chart_data, lttb
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    rows = 10000
+    return pd.DataFrame({
+        'category': rng.choice(['Books', 'Home', 'Toys'], rows),
+        'amount': rng.normal(100, 10, rows),
+        'created': pd.Timestamp('2024-01-01') + pd.to_timedelta(np.arange(rows), unit='min'),
+    })
+
+
+def test_lttb_keeps_the_ends_and_the_peaks():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50)
+    y[400] = 10
+    y[700] = -10
+    picked = lttb(x, y, 50)
+    assert len(picked) == 50
+    assert picked[0] == 0 and picked[-1] == 999
+    assert (np.diff(picked) > 0).all()
+    assert {400, 700} <= set(picked.tolist())
+    assert lttb(x, y, 2000).tolist() == list(range(1000))
+
+
+def test_series_is_reduced_to_the_point_budget(df):
+    result = chart_data(df, {'kind': 'series', 'x': 'created', 'y': 'amount', 'points': 100})
+    assert len(result['points']) == 100
+    assert result['total'] == len(df)
+    assert result['reduced']
+
+
+def test_bucket_counts_add_up(df):
+    histogram = chart_data(df, {'kind': 'histogram', 'x': 'amount', 'bins': 20})
+    assert len(histogram['points']) == 20
+    assert sum(p['y'] for p in histogram['points']) == len(df)
+
+    groups = chart_data(df, {'kind': 'groupby', 'x': 'category'})
+    assert {p['x']: p['y'] for p in groups['points']} == df['category'].value_counts().to_dict()
+
+    # 10000 minutes fit 200 points only as 1H buckets
+    hourly = chart_data(df, {'kind': 'timeseries', 'x': 'created', 'points': 200})
+    assert hourly['interval'] == '1H'
+    assert len(hourly['points']) == hourly['total'] == 167
+    assert sum(p['y'] for p in hourly['points']) == len(df)
+
+
+@pytest.mark.parametrize('spec, message', [
+    ({'kind': 'groupby'}, 'Groupby charts need an x column'),
+    ({'kind': 'histogram'}, 'Histogram charts need an x column'),
+    ({'kind': 'timeseries', 'y': 'amount'}, 'Timeseries charts need an x column'),
+    ({'kind': 'series', 'x': 'created'}, 'Series charts need a y column'),
+    ({'kind': 'heatmap', 'x': 'category'}, 'Heatmap charts need a y column'),
+    ({'kind': 'boxplot', 'x': 'category'}, 'Boxplot charts need a y column'),
+    ({'kind': 'pie', 'x': 'category'}, 'Unknown chart kind pie'),
+    ({'kind': 'groupby', 'x': 'missing'}, 'Unknown column: missing'),
+    ({'kind': 'groupby', 'x': 'category', 'y': 'amount', 'agg': 'mode'}, 'Unknown aggregate mode'),
+])
+def test_invalid_specs(df, spec, message):
+    with pytest.raises(ChartError, match=re.escape(message)):
+        chart_data(df, spec)
+
+
+def test_missing_columns_are_a_400():
+    import app as web_app
+    client = web_app.app.test_client()
+    dataset_id = client.post('/api/datasets', json={'csvData': 'a,b\n1,x\n2,y\n'}).get_json()['dataset_id']
+    response = client.post('/api/aggregate', json={'datasetId': dataset_id, 'kind': 'histogram'})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Histogram charts need an x column'
@@ -0,0 +1,98 @@
+import pytest
+
+from datasets import DatasetRegistry, content_hash, read_csv_text
+
+CSV = 'age,city\n30,Oslo\n41,Bergen\n'
+
+
+@pytest.fixture
+def parses():
+    return []
+
+
+@pytest.fixture
+def registry(parses):
+    def parse(csv_data):
+        parses.append(csv_data)
+        return read_csv_text(csv_data)
+
+    return DatasetRegistry(memory_budget=1 << 30, parse_csv=parse, flush_delay=None)
+
+
+def test_the_same_csv_is_parsed_once(registry, parses):
+    first = registry.add_csv(CSV)
+    second = registry.add_csv(CSV)
+    assert second is first
+    assert first.dataset_id == content_hash(CSV)
+    assert len(parses) == 1
+    assert registry.get(first.dataset_id) is first
+    assert registry.add_csv(CSV + '7,Bodø\n') is not first
+    assert len(parses) == 2
+
+
+def test_questions_reference_the_uploaded_dataset():
+    import app as web_app
+    client = web_app.app.test_client()
+    response = client.post('/api/datasets', json={'csvData': CSV})
+    assert response.status_code == 201
+    dataset_id = response.get_json()['dataset_id']
+    assert client.post('/api/datasets', json={'csvData': CSV}).get_json()['dataset_id'] == dataset_id
+    assert client.get(f'/api/datasets/{dataset_id}').get_json()['rows'] == 2
+    response = client.post('/api/rows', json={'datasetId': dataset_id})
+    assert response.get_json()['rows'] == [[30, 'Oslo'], [41, 'Bergen']]
+    assert client.post('/api/rows', json={'datasetId': 'unknown'}).status_code == 404
+
+
+def frame(rows, seed=0):
+    return read_csv_text('value\n' + ''.join(f'{seed * rows + i}\n' for i in range(rows)))
+
+
+def test_sessions_see_their_own_dataset(registry):
+    first = registry.add_csv(CSV)
+    second = registry.add_csv(CSV + '7,Bodø\n')
+    registry.bind_session('alice', first.dataset_id)
+    registry.bind_session('bob', second.dataset_id)
+    assert registry.for_session('alice') is first
+    assert registry.for_session('bob') is second
+    assert registry.for_session('carol') is None
+    registry.remove(second.dataset_id)
+    assert registry.for_session('bob') is None
+    assert registry.for_session('alice') is first
+
+
+def test_browser_sessions_are_isolated():
+    import app as web_app
+    alice = web_app.app.test_client()
+    bob = web_app.app.test_client()
+    alice.post('/api/datasets', json={'csvData': CSV})
+    bob.post('/api/datasets', json={'csvData': 'x\n1\n2\n3\n'})
+    assert alice.get('/api/data-info').get_json()['column_names'] == ['age', 'city']
+    assert bob.get('/api/data-info').get_json()['column_names'] == ['x']
+    assert web_app.app.test_client().get('/api/data-info').status_code == 404
+
+
+def test_least_recently_used_datasets_are_evicted():
+    size = DatasetRegistry(memory_budget=1 << 30).add_dataframe('probe', frame(1000), persist=False).nbytes
+    registry = DatasetRegistry(memory_budget=int(size * 2.5), flush_delay=None)
+    for seed in range(3):
+        registry.add_dataframe(f'd{seed}', frame(1000, seed), persist=False)
+    # d0 was evicted for d2; touching d1 makes d2 the next to go
+    assert 'd0' not in registry
+    registry.get('d1')
+    registry.add_dataframe('d3', frame(1000, 3), persist=False)
+    assert [entry['dataset_id'] for entry in registry.resident()] == ['d3', 'd1']
+    stats = registry.stats()
+    assert (stats['evictions'], stats['hits'], stats['loads']) == (2, 1, 4)
+    assert stats['memory_bytes'] <= registry.memory_budget
+
+
+def test_evicted_datasets_are_reloaded_from_the_store(tmp_path):
+    from store import DatasetStore
+    size = DatasetRegistry(memory_budget=1 << 30).add_dataframe('probe', frame(1000), persist=False).nbytes
+    registry = DatasetRegistry(memory_budget=int(size * 1.5), store=DatasetStore(str(tmp_path)), flush_delay=None)
+    registry.add_dataframe('d0', frame(1000, 0))
+    registry.add_dataframe('d1', frame(1000, 1))
+    assert len(registry) == 1
+    assert registry.get('d0').df['value'].tolist() == list(range(1000))
+    assert [entry['dataset_id'] for entry in registry.resident()] == ['d0']
+    assert registry.stats()['loads'] == 3
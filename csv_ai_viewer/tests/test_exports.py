@@ -0,0 +1,64 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from exports import content_disposition, iter_csv, iter_file, write_xlsx
+
+
+def frame():
+    return pd.DataFrame({
+        'amount': [5.0, 1.5, np.nan, np.inf, 3.0],
+        'city': ['Oslo', 'Bergen', None, 'Oslo', '=SUM(A1)'],
+        'day': pd.to_datetime(['2021-01-02', '2021-03-04', None, '2021-02-01', '2021-01-10']),
+    })
+
+
+def test_csv_is_streamed_in_chunks():
+    df = frame()
+    chunks = list(iter_csv(df, chunk_rows=2))
+    assert len(chunks) == 4
+    assert chunks[0] == 'amount,city,day\n'
+    assert ''.join(chunks) == df.to_csv(index=False)
+
+
+def test_xlsx_has_the_data_and_statistics(tmp_path):
+    profile = {'amount': {'type': 'numeric', 'missing': 1, 'distinct': 4, 'min': 1.5, 'max': 5.0, 'mean': 3.1},
+               'city': {'type': 'categorical', 'missing': 1, 'distinct': 3, 'top_values': []}}
+    path = write_xlsx(frame(), profile, str(tmp_path / 'out.xlsx'), chunk_rows=2)
+    sheets = pd.read_excel(path, sheet_name=None)
+    data = sheets['Data']
+    assert list(data.columns) == ['amount', 'city', 'day']
+    # NaN and infinity become empty cells; formulas stay text
+    assert data['amount'].tolist()[:2] == [5.0, 1.5] and data['amount'].isna().tolist()[2:4] == [True, True]
+    assert data['city'].tolist()[4] == '=SUM(A1)'
+    assert data['day'].tolist()[1] == pd.Timestamp('2021-03-04')
+    assert sheets['Statistics'].values.tolist()[0] == ['amount', 'numeric', 1, 4, 1.5, 5.0, 3.1]
+
+
+def test_content_disposition_keeps_non_ascii_names():
+    assert content_disposition('report.csv') == 'attachment; filename="report.csv"; filename*=UTF-8\'\'report.csv'
+    assert content_disposition('tromsø "q".csv') == (
+        'attachment; filename="troms? q.csv"; filename*=UTF-8\'\'troms%C3%B8%20%22q%22.csv')
+
+
+def test_sent_files_are_removed(tmp_path):
+    path = tmp_path / 'export.bin'
+    path.write_bytes(b'x' * 10)
+    assert list(iter_file(str(path), block_size=4)) == [b'xxxx', b'xxxx', b'xx']
+    assert not path.exists()
+
+
+def test_export_endpoint_streams_csv():
+    import app as web_app
+    client = web_app.app.test_client()
+    csv_data = 'age,city\n30,Oslo\n41,Bergen\n'
+    dataset_id = client.post('/api/datasets', json={'csvData': csv_data}).get_json()['dataset_id']
+    response = client.post('/api/export', json={'datasetId': dataset_id, 'format': 'csv', 'filename': 'people'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'].startswith('attachment; filename="people.csv"')
+    assert response.data.decode('utf-8') == csv_data
+    response = client.get(f'/api/datasets/{dataset_id}/export?format=xlsx&filename=people')
+    assert pd.read_excel(io.BytesIO(response.data)).values.tolist() == [[30, 'Oslo'], [41, 'Bergen']]
+    assert client.post('/api/export', json={'datasetId': dataset_id, 'format': 'pdf'}).status_code == 400
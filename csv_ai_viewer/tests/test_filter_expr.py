@@ -0,0 +1,124 @@
+import base64
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from filter_expr import FilterError, apply_filter, compile_filter, encode_row_set, from_javascript
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        'age': [25, 35, 45, None],
+        'city': ['Oslo', 'Bergen', 'oslo', None],
+        'order total': ['10', '250', '40', '7'],
+    })
+
+
+def matches(expression, df):
+    return compile_filter(expression).mask(df).tolist()
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('age > 30', [False, True, True, False]),
+    ('age >= 25 and age < 40', [True, True, False, False]),
+    ('not age > 30', [True, False, False, True]),
+    ("city == 'Oslo' or city == 'Bergen'", [True, True, False, False]),
+    ("city in ['Oslo', 'Bergen']", [True, True, False, False]),
+    ("city not in ['Oslo']", [False, True, True, True]),
+    ('30 < age < 50', [False, True, True, False]),
+    ('age * 2 > 80', [False, False, True, False]),
+    ('`order total` > 30', [False, True, True, False]),
+    ("contains(city, 'OSL')", [True, False, True, False]),
+    ("startswith(city, 'b')", [False, True, False, False]),
+    ("endswith(city, 'lo')", [True, False, True, False]),
+    ('isnull(age)', [False, False, False, True]),
+    ('notnull(city)', [True, True, True, False]),
+    ('between(age, 30, 45)', [False, True, True, False]),
+    ("CITY == 'Oslo'", [True, False, False, False]),
+    ("age > '30'", [False, True, True, False]),
+    ("between(age, '30', 45)", [False, True, True, False]),
+    ('-age < -30', [False, True, True, False]),
+    ('(1 + 2) * age > 100', [False, True, True, False]),
+    # Text is compared as numbers (none here) where the other side is numeric
+    ("between(city, 'a', 5)", [False, False, False, False]),
+    ('-city > 0', [False, False, False, False]),
+])
+def test_allowed_expressions(df, expression, expected):
+    assert matches(expression, df) == expected
+
+
+def test_javascript_callbacks_are_translated(df):
+    expression = "df.filter(row => row.age > 30 && row.city !== 'Bergen')"
+    assert from_javascript(expression) == "age > 30  and  city != 'Bergen'"
+    assert matches(expression, df) == [False, False, True, False]
+
+
+@pytest.mark.parametrize('expression, message', [
+    ('age.__class__', 'Unsupported syntax in filter: Attribute'),
+    ('city.apply(len)', 'Unknown function'),
+    ("__import__('os')", 'Unknown function'),
+    ('len(city)', 'Unknown function'),
+    ("df.query('age > 1')", 'Unknown function'),
+    ('city.str', 'Unsupported syntax in filter: Attribute'),
+    ('city[0]', 'Unsupported syntax in filter: Subscript'),
+    ('(lambda: 1)()', 'Unknown function'),
+    ('lambda: 1', 'Unsupported syntax in filter: Lambda'),
+    ('[x for x in city]', 'Unsupported syntax in filter: ListComp'),
+    ("contains(city)", 'contains() takes 2 arguments'),
+    ("contains(city, needle='a')", 'contains() takes 2 arguments'),
+    ('age >', 'Invalid filter expression'),
+    ("'x' * 1000000000 * 1000000000", 'Arithmetic needs numbers or numeric columns'),
+    ("age > 'x' * 1000000000", 'Arithmetic needs numbers or numeric columns'),
+    ('[1] * 1000000000', 'Arithmetic needs numbers or numeric columns'),
+])
+def test_rejected_expressions(expression, message):
+    with pytest.raises(FilterError, match=re.escape(message)):
+        compile_filter(expression)
+
+
+@pytest.mark.parametrize('expression, message', [
+    ('height > 1', 'Unknown column: height'),
+    ('1 > 0', 'does not refer to any column'),
+    ('age + 1', 'does not evaluate to true/false'),
+    ("city in 'Oslo'", '"in" needs a list of values'),
+    ("contains('Oslo', city)", 'first argument of contains'),
+    ("age > 'old'", 'does not fit the data'),
+])
+def test_errors_against_the_data(df, expression, message):
+    with pytest.raises(FilterError, match=message):
+        compile_filter(expression).mask(df)
+
+
+def test_bad_filters_are_a_400():
+    import app as web_app
+    client = web_app.app.test_client()
+    dataset_id = client.post('/api/datasets', json={'csvData': 'age,city\n30,Oslo\n41,Bergen\n'}).get_json()['dataset_id']
+    response = client.post('/api/filter', json={'datasetId': dataset_id, 'expression': "age > 'old'"})
+    assert response.status_code == 400
+    assert 'does not fit the data' in response.get_json()['error']
+    response = client.post('/api/rows', json={'datasetId': dataset_id, 'where': "age > 'old'"})
+    assert response.status_code == 400
+
+
+def test_row_set_encodings():
+    clustered = np.zeros(1000, dtype=bool)
+    clustered[100:200] = True
+    assert encode_row_set(clustered) == {'encoding': 'ranges', 'ranges': [[100, 200]]}
+
+    scattered = np.zeros(1000, dtype=bool)
+    scattered[::3] = True
+    row_set = encode_row_set(scattered)
+    assert row_set['encoding'] == 'bitmap'
+    decoded = np.unpackbits(np.frombuffer(base64.b64decode(row_set['bitmap']), dtype=np.uint8),
+                            bitorder='little')[:1000].astype(bool)
+    assert (decoded == scattered).all()
+
+
+def test_apply_filter_pages_matching_rows(df):
+    result = apply_filter(df, 'notnull(city)', offset=1, limit=1)
+    assert result['count'] == 3
+    assert result['row_positions'] == [1]
+    assert result['rows'] == [{'age': 35.0, 'city': 'Bergen', 'order total': '250'}]
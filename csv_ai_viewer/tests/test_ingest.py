@@ -0,0 +1,78 @@
+import hashlib
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from ingest import CSVUpload, import_chunks, json_chunks, split_complete_records
+
+CSV = (b'id,name,score,active\n'
+       b'1,Oslo,1.5,true\n'
+       b'2,"Bergen, ""west""",2,false\n'
+       b'3,"two\nlines",,true\n'
+       b'4,Troms\xc3\xb8,4.25,false\n')
+
+
+def test_records_are_split_outside_quotes():
+    assert split_complete_records(b'a,b\n1,"x\ny') == (b'a,b\n', b'1,"x\ny')
+    assert split_complete_records(b'1,"x\ny"\n2,') == (b'1,"x\ny"\n', b'2,')
+    assert split_complete_records(b'no newline') == (b'', b'no newline')
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1000])
+def test_chunked_upload_matches_a_whole_file_read(tmp_path, chunk_size):
+    upload = CSVUpload('u1', str(tmp_path))
+    for offset in range(0, len(CSV), chunk_size):
+        upload.write(offset, CSV[offset:offset + chunk_size])
+    dataset_id, path = upload.finish(str(tmp_path))
+
+    assert dataset_id == hashlib.sha256(CSV).hexdigest()
+    pd.testing.assert_frame_equal(pd.read_parquet(path), pd.read_csv(io.BytesIO(CSV)))
+    assert [name for name in tmp_path.iterdir() if 'staging' in name.name] == []
+
+
+def test_resent_bytes_are_skipped_and_gaps_rejected(tmp_path):
+    upload = CSVUpload('u1', str(tmp_path))
+    assert upload.write(0, CSV[:30]) == 30
+    # A retried chunk overlapping what was already received
+    assert upload.write(20, CSV[20:60]) == 60
+    with pytest.raises(ValueError, match='only 60 bytes were received'):
+        upload.write(70, CSV[70:])
+    upload.write(60, CSV[60:])
+    assert upload.status()['columns'] == ['id', 'name', 'score', 'active']
+    dataset_id, path = upload.finish(str(tmp_path))
+    assert dataset_id == hashlib.sha256(CSV).hexdigest()
+    assert len(pd.read_parquet(path)) == 4
+
+
+def test_upload_endpoints_resume_after_a_lost_chunk():
+    import app as web_app
+    client = web_app.app.test_client()
+    upload = client.post('/api/uploads', json={'filename': 'cities.csv'}).get_json()
+    url = f"/api/uploads/{upload['upload_id']}"
+    assert client.put(f'{url}?offset=0', data=CSV[:40]).get_json()['received'] == 40
+    lost = client.put(f'{url}?offset=80', data=CSV[80:])
+    assert lost.status_code == 409
+    assert lost.get_json()['received'] == 40
+    client.put(f'{url}?offset=40', data=CSV[40:])
+    response = client.post(f'{url}/complete')
+    assert response.status_code == 201
+    assert response.get_json()['rows'] == 4
+    assert client.get(url).status_code == 404
+
+
+def test_json_keys_first_seen_in_a_later_chunk_are_kept(tmp_path):
+    records = [{'id': i, 'city': 'Oslo'} for i in range(5)] + [{'id': 5, 'city': 'Bergen', 'score': 1.5},
+                                                               {'id': 6, 'note': 'late'}]
+    stream = io.BytesIO('\n'.join(json.dumps(record) for record in records).encode('utf-8'))
+    path = import_chunks(json_chunks(stream, chunk_rows=2), str(tmp_path), 'late-keys')
+
+    df = pd.read_parquet(path)
+    assert list(df.columns) == ['id', 'city', 'score', 'note']
+    assert df['id'].dtype == 'int64'
+    assert df['score'].isna().sum() == 6
+    assert df.loc[5, 'score'] == 1.5
+    assert df['note'].tolist() == [None] * 6 + ['late']
+    assert pd.isna(df.loc[6, 'city'])
+    assert [name for name in tmp_path.iterdir() if 'staging' in name.name] == []
@@ -0,0 +1,18 @@
+import time
+
+from jobs import JobPool
+
+
+def test_request_ids_do_not_replace_jobs():
+    pool = JobPool(workers=2)
+    first = pool.submit(time.sleep, 5, request_id='same')
+    second = pool.submit(time.sleep, 5, request_id='same')
+    assert first.job_id != second.job_id
+    assert pool.get(first.job_id) is first and pool.get(second.job_id) is second
+    assert pool.get('same') is None
+
+    assert pool.cancel_request('same')
+    for job in (first, second):
+        job.future.result(10)
+        assert job.status == 'cancelled'
+    assert not pool.cancel_request('same')
@@ -0,0 +1,54 @@
+import os
+
+import llm_cache
+from llm_cache import ResponseCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+def test_keys_ignore_case_spacing_and_punctuation():
+    key = ResponseCache.make_key('abc', 'What is the  average price?', 'analysis', 'llama3')
+    assert key == ResponseCache.make_key('abc', 'what is the average price', 'analysis', 'llama3')
+    assert key != ResponseCache.make_key('abd', 'what is the average price', 'analysis', 'llama3')
+    assert key != ResponseCache.make_key('abc', 'what is the average price', 'analysis', 'mistral')
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.stats()['entries'] == 2
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_entries_expire_after_the_ttl(monkeypatch, tmp_path):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache, 'time', clock)
+    cache = ResponseCache(ttl=60, directory=str(tmp_path))
+    cache.set('a', {'answer': 42})
+    clock.now += 59
+    assert cache.get('a') == {'answer': 42}
+    clock.now += 2
+    assert cache.get('a') is None
+    # The expired disk copy is removed as well
+    assert not os.listdir(tmp_path)
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    ResponseCache(directory=str(tmp_path)).set('a', {'answer': 42})
+    cache = ResponseCache(directory=str(tmp_path))
+    assert cache.get('a') == {'answer': 42}
+    assert cache.get('a') == {'answer': 42}
+    assert (cache.disk_hits, cache.hits, cache.misses) == (1, 1, 0)
+    cache.clear()
+    assert ResponseCache(directory=str(tmp_path)).get('a') is None
@@ -0,0 +1,91 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+from llm_scheduler import LLMScheduler, QueueFull
+
+
+def test_at_most_max_concurrency_run_at_once():
+    scheduler = LLMScheduler(max_concurrency=2, max_queue=10)
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def work(i):
+        with scheduler.acquire():
+            with lock:
+                running.append(i)
+                peak.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.remove(i)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) == 2
+    assert scheduler.stats()['completed'] == 6
+    assert scheduler.stats()['active'] == 0
+
+
+def test_identical_prompts_share_one_generation():
+    scheduler = LLMScheduler(max_concurrency=1)
+    key = scheduler.make_key('llama3', [{'role': 'user', 'content': 'How many rows?'}])
+    assert key == scheduler.make_key('llama3', [{'content': 'How many rows?', 'role': 'user'}])
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def generate():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'df.shape[0]'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(scheduler.run(key, generate)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(scheduler.run(key, generate))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    while scheduler.stats()['coalesced'] < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+    assert results == ['df.shape[0]'] * 4
+    assert len(calls) == 1
+    assert scheduler.stats()['in_flight_prompts'] == 0
+
+
+def test_requests_beyond_the_queue_are_rejected():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=0)
+    slot = scheduler.acquire()
+    with pytest.raises(QueueFull) as error:
+        scheduler.acquire()
+    assert error.value.retry_after >= 1
+    assert scheduler.stats()['rejected'] == 1
+    slot.release()
+    slot.release()
+    scheduler.acquire().release()
+    assert scheduler.stats()['completed'] == 2
+
+
+def test_a_full_queue_is_a_429(monkeypatch):
+    import app as web_app
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=0)
+    monkeypatch.setattr(web_app, 'llm_scheduler', scheduler)
+    monkeypatch.setattr(web_app.ollama_service, 'select_chat_model', lambda preferred=None: ('llama3:latest', None))
+    client = web_app.app.test_client()
+    dataset_id = client.post('/api/datasets', json={'csvData': 'a\n1\n'}).get_json()['dataset_id']
+    with scheduler.acquire():
+        response = client.post('/api/ai-analysis/stream',
+                               json={'datasetId': dataset_id, 'question': f'How many rows? {uuid.uuid4().hex}'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == str(response.get_json()['retry_after'])
+    assert 'busy' in response.get_json()['error']
@@ -0,0 +1,40 @@
+import re
+
+from metrics import Metrics
+
+
+def samples(text):
+    return dict(re.match(r'(\S+) (\S+)$', line).groups() for line in text.splitlines() if not line.startswith('#'))
+
+
+def test_counters_end_in_total():
+    metrics = Metrics(prefix='app')
+    metrics.inc('requests_total', endpoint='rows', status=200)
+    metrics.inc('dataset_changes', 3)
+    metrics.register_stats('cache', lambda: {'hits': 4, 'size': 2, 'enabled': True}, counters=('hits',))
+    text = metrics.render()
+    assert '# TYPE app_requests_total counter' in text
+    assert '# TYPE app_dataset_changes_total counter' in text
+    assert '# TYPE app_cache_hits_total counter' in text
+    assert '# TYPE app_cache_size gauge' in text
+    values = samples(text)
+    assert values['app_requests_total{endpoint="rows",status="200"}'] == '1'
+    assert values['app_dataset_changes_total'] == '3'
+    assert values['app_cache_hits_total'] == '4'
+    assert 'app_cache_enabled' not in text
+
+
+def test_spans_fill_cumulative_histogram_buckets():
+    metrics = Metrics(prefix='app', buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 5.0):
+        metrics.observe('stage_seconds', seconds, stage='llm')
+    timings = {}
+    with metrics.span('query', timings):
+        pass
+    assert 'query' in timings
+    values = samples(metrics.render())
+    assert values['app_stage_seconds_bucket{stage="llm",le="0.1"}'] == '1'
+    assert values['app_stage_seconds_bucket{stage="llm",le="1.0"}'] == '2'
+    assert values['app_stage_seconds_bucket{stage="llm",le="+Inf"}'] == '3'
+    assert values['app_stage_seconds_count{stage="llm"}'] == '3'
+    assert values['app_stage_seconds_count{stage="query"}'] == '1'
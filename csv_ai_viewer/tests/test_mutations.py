@@ -0,0 +1,146 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from datasets import DatasetRegistry
+import mutations
+from mutations import DeltaError
+from profiling import profile_dataframe
+from schema import infer_schema
+
+
+def frame():
+    return pd.DataFrame({
+        'amount': [5.0, 1.5, np.nan, 9.0, 3.0],
+        'quantity': [1, 2, 3, 4, 5],
+        'city': ['Oslo', 'Bergen', None, 'Oslo', 'Tromsø'],
+    })
+
+
+def assert_profile_matches(dataset):
+    expected = profile_dataframe(dataset.df, infer_schema(dataset.df))
+    for name, profile in dataset.profile.items():
+        for key, value in expected[name].items():
+            if isinstance(value, float):
+                assert profile[key] == pytest.approx(value), (name, key)
+            else:
+                assert profile[key] == value, (name, key)
+
+
+@pytest.fixture
+def registry():
+    return DatasetRegistry(memory_budget=1 << 30, flush_delay=None)
+
+
+def test_profile_follows_edits(registry):
+    dataset = registry.add_dataframe('upload', frame(), persist=False)
+    dataset.profile
+    edited = registry.edit(dataset, [
+        {'op': 'set', 'row': 3, 'column': 'amount', 'value': '2'},
+        {'op': 'set', 'row': 1, 'column': 'amount', 'value': ''},
+        {'op': 'set', 'row': 0, 'column': 'quantity', 'value': '40'},
+        {'op': 'set', 'row': 2, 'column': 'city', 'value': 'Oslo'},
+        {'op': 'add_row', 'values': {'amount': '-4', 'quantity': '6', 'city': 'Bergen'}},
+    ])
+    assert edited.stale_profile == {'amount', 'quantity', 'city'}
+    assert edited.profile['amount']['max'] == 5.0
+    assert edited.profile['amount']['min'] == -4.0
+    assert not edited.stale_profile
+    assert_profile_matches(edited)
+
+
+def test_profile_is_only_refreshed_when_read(registry, monkeypatch):
+    dataset = registry.add_dataframe('upload', frame(), persist=False)
+    dataset.profile
+    edited = registry.edit(dataset, [{'op': 'set', 'row': 0, 'column': 'quantity', 'value': '7'}])
+    calls = []
+    original = pd.Series.quantile
+
+    def quantile(self, *args, **kwargs):
+        calls.append(self.name)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(pd.Series, 'quantile', quantile)
+    for value in range(10):
+        registry.edit(edited, [{'op': 'set', 'row': 1, 'column': 'quantity', 'value': str(value)}])
+    assert not calls
+    assert edited.profile['quantity']['max'] == 9
+    assert len(calls) == 1
+
+
+def test_invalid_batch_leaves_the_dataset_untouched(registry):
+    dataset = registry.add_dataframe('upload', frame(), persist=False)
+    with pytest.raises(DeltaError, match='row 9 is out of range'):
+        registry.edit(dataset, [
+            {'op': 'set', 'row': 0, 'column': 'city', 'value': 'Bodø'},
+            {'op': 'set', 'row': 9, 'column': 'city', 'value': 'Bodø'},
+        ])
+    assert dataset.df.loc[0, 'city'] == 'Oslo'
+    assert dataset.version == 1
+
+
+
+@pytest.mark.parametrize('change, message', [
+    ({'op': 'set', 'row': True, 'column': 'city', 'value': 'Bodø'}, 'row True is out of range'),
+    ({'op': 'set', 'row': 0, 'column': 'city', 'value': ['Bodø']}, 'must be text, a number'),
+    ({'op': 'set', 'row': 0, 'column': 'quantity', 'value': 'abc'}, "'abc' is not a number; column quantity is int64"),
+    ({'op': 'set', 'row': 0, 'column': 'quantity', 'value': True}, 'True is not a number'),
+    ({'op': 'add_row', 'values': ['Bodø']}, 'values must be an object'),
+    ({'op': 'add_row', 'values': {'amount': 'many'}}, "'many' is not a number"),
+    ({'op': 'add_column', 'column': 'c', 'value': [1, 2]}, 'the value of c must be text'),
+    ({'op': 'add_column', 'column': 5}, 'column name is missing'),
+])
+def test_invalid_values_are_rejected(registry, change, message):
+    dataset = registry.add_dataframe('upload', frame(), persist=False)
+    with pytest.raises(DeltaError, match=re.escape(message)):
+        registry.edit(dataset, [{'op': 'set', 'row': 1, 'column': 'quantity', 'value': 100}, change])
+    assert dataset.df['quantity'].tolist() == [1, 2, 3, 4, 5]
+    assert dataset.version == 1
+
+
+def test_numeric_columns_keep_their_dtype(registry):
+    edited = registry.edit(registry.add_dataframe('upload', frame(), persist=False), [
+        {'op': 'set', 'row': 0, 'column': 'quantity', 'value': '7'},
+        {'op': 'set', 'row': 1, 'column': 'amount', 'value': '2.5'},
+    ])
+    assert edited.df['quantity'].dtype == 'int64'
+    assert edited.df['quantity'].tolist() == [7, 2, 3, 4, 5]
+    assert edited.df.loc[1, 'amount'] == 2.5
+
+
+def test_failed_batch_is_rolled_back(registry, monkeypatch):
+    dataset = registry.add_dataframe('upload', frame(), persist=False)
+    dataset.profile
+    edited = registry.edit(dataset, [{'op': 'set', 'row': 0, 'column': 'quantity', 'value': 10}])
+    before = edited.df.copy()
+
+    def fail(df):
+        raise ValueError('schema inference failed')
+
+    monkeypatch.setattr(mutations, 'infer_schema', fail)
+    with pytest.raises(ValueError):
+        registry.edit(edited, [
+            {'op': 'set', 'row': 1, 'column': 'quantity', 'value': 100},
+            {'op': 'add_row', 'values': {'city': 'Bodø'}},
+            {'op': 'add_column', 'column': 'c', 'value': 'x'},
+        ])
+    pd.testing.assert_frame_equal(edited.df, before)
+    assert edited.version == 2
+    assert 'c' not in edited.schema.columns
+    assert edited.profile['quantity']['max'] == 10
+    assert edited.profile['quantity']['count'] == 5
+
+
+def test_patch_errors_are_json(registry):
+    import app as web_app
+    client = web_app.app.test_client()
+    dataset_id = client.post('/api/datasets', json={'csvData': 'a,b\n7,x\n2,y\n3,z\n'}).get_json()['dataset_id']
+    response = client.patch(f'/api/datasets/{dataset_id}', json={'changes': [
+        {'op': 'set', 'row': 1, 'column': 'a', 'value': 100},
+        {'op': 'add_column', 'column': 'c', 'value': [1, 2]},
+    ]})
+    assert response.status_code == 400
+    assert 'must be text' in response.get_json()['error']
+    assert client.post('/api/rows', json={'datasetId': dataset_id}).get_json()['rows'][1][0] == 2
@@ -0,0 +1,65 @@
+from ollama_service import OllamaService
+
+
+class FakeClient:
+    def __init__(self, names):
+        self.names = names
+        self.list_calls = 0
+
+    def list(self):
+        self.list_calls += 1
+        if isinstance(self.names, Exception):
+            raise self.names
+        return {'models': [{'name': name} for name in self.names]}
+
+    def chat(self, model, messages, stream=False):
+        pieces = [{'message': {'content': piece}} for piece in ['Hello', ' there']]
+        return iter(pieces + [{'message': {'content': ''}, 'done': True, 'prompt_eval_count': 7, 'eval_count': 2}])
+
+
+def service(names):
+    ollama = OllamaService(refresh_interval=0)
+    ollama._client = FakeClient(names)
+    return ollama
+
+
+def test_model_list_is_fetched_once():
+    ollama = service(['nomic-embed-text:latest', 'llama3:latest'])
+    assert ollama.select_chat_model() == ('llama3:latest', None)
+    assert ollama.select_chat_model() == ('llama3:latest', None)
+    assert ollama.models() == ['nomic-embed-text:latest', 'llama3:latest']
+    assert ollama._client.list_calls == 1
+
+
+def test_refresh_resolves_the_chat_model_again():
+    ollama = service(['llama3:latest'])
+    assert ollama.select_chat_model('llama') == ('llama3:latest', None)
+    ollama._client.names = ['llama2:latest']
+    assert ollama.refresh()
+    assert ollama.select_chat_model('llama') == ('llama2:latest', None)
+    assert not ollama.refresh()
+
+
+def test_selection_errors():
+    assert service([]).select_chat_model()[1] == 'No Ollama models available. Please install a model first.'
+    assert 'not embedding model' in service(['nomic-embed-text:latest']).select_chat_model()[1]
+    assert service(['mistral:latest']).select_chat_model('llama3')[1] == (
+        'llama3 model not found. Please install it with: ollama pull llama3')
+    ollama = service(ConnectionError('connection refused'))
+    assert ollama.select_chat_model() == (None, 'Error listing Ollama models: connection refused')
+    assert ollama.status()['error'] == 'connection refused'
+
+
+def test_streams_record_usage_and_can_be_cancelled():
+    ollama = service(['llama3:latest'])
+    stream = ollama.open_stream('abc', 'llama3:latest', [])
+    assert ''.join(stream) == 'Hello there'
+    ollama.close_stream('abc')
+    status = ollama.status()
+    assert (status['chats'], status['prompt_tokens'], status['completion_tokens']) == (1, 7, 2)
+    assert status['active_streams'] == 0
+    assert not ollama.cancel_stream('abc')
+
+    stream = ollama.open_stream('def', 'llama3:latest', [])
+    assert ollama.cancel_stream('def')
+    assert list(stream) == []
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import datasets as datasets_module
+from datasets import DatasetRegistry
+from profiling import profile_dataframe, to_python, top_values
+from schema import infer_schema
+
+
+def frame():
+    return pd.DataFrame({
+        'amount': [5.0, 1.5, np.nan, 9.0, 3.0],
+        'city': ['Oslo', 'Bergen', None, 'Oslo', 'Tromsø'],
+        'day': ['2021-01-02', '2021-03-04', '2021-02-01', None, '2021-01-10'],
+    })
+
+
+def test_profile_dataframe():
+    df = frame()
+    profile = profile_dataframe(df, infer_schema(df))
+    assert profile['amount'] == {
+        'type': 'numeric', 'missing': 1, 'distinct': 4, 'count': 4, 'sum': 18.5, 'mean': 4.625,
+        'std': pytest.approx(float(df['amount'].std())), 'min': 1.5, 'max': 9.0,
+        'q1': 2.625, 'median': 4.0, 'q3': 6.0
+    }
+    assert profile['city']['top_values'] == [['Oslo', 2], ['Bergen', 1], ['Tromsø', 1]]
+    assert profile['city']['count'] == 4
+    assert profile['day']['type'] == 'datetime'
+    assert (profile['day']['min'], profile['day']['max']) == ('2021-01-02T00:00:00', '2021-03-04T00:00:00')
+
+
+def test_values_are_plain_python():
+    assert to_python(np.int64(3)) == 3 and type(to_python(np.int64(3))) is int
+    assert to_python(np.float64('nan')) is None
+    assert to_python(pd.NaT) is None
+    assert top_values(pd.Series(['a', 'b', 'a', 'c']), k=1) == [['a', 2]]
+
+
+def test_profile_is_computed_once_per_dataset(monkeypatch):
+    calls = []
+
+    def counting(df, schema):
+        calls.append(len(df))
+        return profile_dataframe(df, schema)
+
+    monkeypatch.setattr(datasets_module, 'profile_dataframe', counting)
+    registry = DatasetRegistry(memory_budget=1 << 30, flush_delay=None)
+    dataset = registry.add_dataframe('upload', frame(), persist=False)
+    first = dataset.profile
+    assert dataset.profile is first
+    assert registry.get('upload').profile is first
+    assert calls == [5]
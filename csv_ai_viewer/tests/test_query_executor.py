@@ -0,0 +1,107 @@
+import re
+
+import pandas as pd
+import pytest
+
+from jobs import JobPool
+from query_executor import MAX_RESULT_ROWS, QueryExecutor, QueryFailed, QueryRejected, compile_query
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        'category': ['Books', 'Home', 'Books', 'Toys'],
+        'amount': [10.0, 250.0, 40.0, 7.5],
+    })
+
+
+@pytest.fixture(scope='module')
+def executor():
+    return QueryExecutor(timeout=5, pool=JobPool(workers=2))
+
+
+@pytest.mark.parametrize('code, expected', [
+    # numpy scalars come back as Python values, other scalars as text, Series and frames as dicts
+    ('df.shape[0]', '4'),
+    ("df['amount'].sum()", 307.5),
+    ("df[df['amount'] > 20].shape[0]", '2'),
+    ("df.groupby('category')['amount'].mean()", {'Books': 25.0, 'Home': 250.0, 'Toys': 7.5}),
+    ("df['category'].value_counts()", {'Books': 2, 'Home': 1, 'Toys': 1}),
+    ("df[df['category'].str.contains('o')]['amount'].max()", 250.0),
+    ("df['category'].isin(['Toys']).any()", True),
+    ("pd.to_numeric(df['amount']).round()", {0: 10.0, 1: 250.0, 2: 40.0, 3: 8.0}),
+    ("df.groupby('category')['amount'].agg('sum')", {'Books': 50.0, 'Home': 250.0, 'Toys': 7.5}),
+    ("df.agg({'amount': 'max'})", {'amount': 250.0}),
+    ("df.pivot_table(index='category', values='amount', aggfunc='count')['amount']",
+     {'Books': 2, 'Home': 1, 'Toys': 1}),
+])
+def test_allowed_queries(executor, df, code, expected):
+    result, truncated, _ = executor.run(code, df)
+    assert result == expected
+    assert not truncated
+
+
+@pytest.mark.parametrize('code, message', [
+    ('df.__class__', 'df.__class__ is not allowed in queries'),
+    ("df['amount'].apply(print)", 'df.apply is not allowed in queries'),
+    ("df.eval('amount * 2')", 'df.eval is not allowed in queries'),
+    ("df.query('amount > 1')", 'df.query is not allowed in queries'),
+    ("df.merge(df, how='cross')", 'df.merge is not allowed in queries'),
+    ("__import__('os').system('true')", 'df.system is not allowed in queries'),
+    ('__import__', 'Unknown name: __import__'),
+    ('df.__globals__', 'df.__globals__ is not allowed in queries'),
+    ('open("/etc/passwd")', 'Only pandas methods can be called'),
+    ('str(df)', 'Only pandas methods can be called'),
+    ('(lambda: 1)()', 'Only pandas methods can be called'),
+    ('lambda: 1', 'Lambda is not allowed in queries'),
+    ('[x for x in df]', 'ListComp is not allowed in queries'),
+    ('df.head(1000000000000)', 'Number is too large'),
+    ('df.head(10 ** 12)', 'Pow is not allowed in queries'),
+    ('x = 1', 'Invalid Python expression'),
+    # pandas calls string "functions" as methods of the data, with the remaining arguments
+    ("df.agg('to_csv', 0, '/tmp/out.csv')", "'to_csv' is not an allowed aggregation function"),
+    ("df['amount'].agg('to_pickle', 0, '/tmp/out.pkl')", "'to_pickle' is not an allowed aggregation function"),
+    ("df.aggregate('to_json', 0, '/tmp/out.json')", "'to_json' is not an allowed aggregation function"),
+    ("df.groupby('category').agg(func='to_csv')", "'to_csv' is not an allowed aggregation function"),
+    ("df.agg({'amount': ['sum', 'to_csv']})", "'to_csv' is not an allowed aggregation function"),
+    ("df.rolling(2).agg('save')", "'save' is not an allowed aggregation function"),
+    ("df.pivot_table(index='category', aggfunc='to_csv')", "'to_csv' is not an allowed aggregation function"),
+])
+def test_rejected_queries(code, message):
+    with pytest.raises(QueryRejected, match=re.escape(message)):
+        compile_query(code)
+
+
+def test_string_functions_cannot_write_files(executor, df, tmp_path):
+    path = tmp_path / 'out.csv'
+    with pytest.raises(QueryRejected):
+        executor.run(f"df.agg('to_csv', 0, {str(path)!r})", df)
+    assert not path.exists()
+
+
+def test_rejections_are_counted(df):
+    executor = QueryExecutor(pool=JobPool(workers=1))
+    with pytest.raises(QueryRejected):
+        executor.run('df.__dict__', df)
+    assert executor.stats()['rejected'] == 1
+
+
+def test_errors_are_reported(executor, df):
+    with pytest.raises(QueryFailed, match='Error executing code: .*missing'):
+        executor.run("df['missing'].sum()", df)
+
+
+def test_slow_queries_are_stopped():
+    executor = QueryExecutor(timeout=0.001, pool=JobPool(workers=1))
+    if not executor.pool.use_fork:
+        pytest.skip('queries are only stopped in forked workers')
+    big = pd.DataFrame({'a': range(1000000)})
+    with pytest.raises(QueryFailed, match='took longer than 0.001 seconds'):
+        executor.run("df.groupby('a').sum()", big)
+    assert executor.stats()['timed_out'] == 1
+
+
+def test_long_results_are_truncated(executor):
+    result, truncated, _ = executor.run("df['a']", pd.DataFrame({'a': range(MAX_RESULT_ROWS + 5)}))
+    assert truncated
+    assert len(result) == MAX_RESULT_ROWS
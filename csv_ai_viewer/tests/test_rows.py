@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+from filter_expr import FilterError
+from rows import filter_mask
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        'age': [30, 41, 30, 7],
+        'city': ['Oslo', 'Bergen', None, 'Oslo|Bergen'],
+        'member': [True, False, True, False],
+    })
+
+
+@pytest.mark.parametrize('filters, expected', [
+    ({'city': 'osl'}, [True, False, False, True]),
+    ({'city': 'Oslo|Bergen'}, [True, True, False, False]),
+    ({'city': ['Oslo|Bergen']}, [False, False, False, True]),
+    ({'age': 30}, [True, False, True, False]),
+    ({'age': 4}, [False, True, False, False]),
+    ({'age': [30, 7]}, [True, False, True, True]),
+    ({'member': True}, [True, False, True, False]),
+])
+def test_column_filters(df, filters, expected):
+    assert filter_mask(df, filters=filters).tolist() == expected
+
+
+@pytest.mark.parametrize('filters', [{'city': None}, {'city': {'eq': 'Oslo'}}, ['city']])
+def test_invalid_column_filters_are_rejected(df, filters):
+    with pytest.raises(FilterError):
+        filter_mask(df, filters=filters)
+
+
+def test_unknown_column(df):
+    with pytest.raises(KeyError):
+        filter_mask(df, filters={'country': 'NO'})
+
+
+def test_rows_endpoint_rejects_bad_filters():
+    import app as web_app
+    client = web_app.app.test_client()
+    dataset_id = client.post('/api/datasets', json={'csvData': 'age,city\n30,Oslo\n41,Bergen\n'}).get_json()['dataset_id']
+    response = client.post('/api/rows', json={'datasetId': dataset_id, 'filters': {'age': 30}})
+    assert response.status_code == 200
+    assert response.get_json()['matched'] == 1
+    for filters in ({'city': None}, {'city': {'eq': 'Oslo'}}):
+        response = client.post('/api/rows', json={'datasetId': dataset_id, 'filters': filters})
+        assert response.status_code == 400
+    response = client.post('/api/rows', json={'datasetId': dataset_id, 'where': 5})
+    assert response.status_code == 400
@@ -0,0 +1,80 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from schema import infer_schema
+
+
+def read(df):
+    """Round-trip through CSV so columns have the dtypes an upload gets"""
+    return pd.read_csv(io.StringIO(df.to_csv(index=False)))
+
+
+def make_frame(rows, labels=20, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'amount': np.round(rng.gamma(2.0, 250.0, rows), 2),
+        'category': rng.choice(['Books', 'Home', 'Toys'], rows),
+        'created': (pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 10 ** 8, rows), unit='s'))
+                   .strftime('%Y-%m-%d %H:%M:%S'),
+        'note': rng.choice(['order 12 shipped late', 'gift 3', 'returned after 30 days'], rows)
+    })
+    for i in range(labels):
+        # Text with digits in every value: the case that used to try every date format
+        df[f'label_{i}'] = rng.choice(np.array([f'L{i}_{k}' for k in range(50)]), rows)
+    return read(df)
+
+
+def test_types_and_formats():
+    df = read(pd.DataFrame({
+        'id': range(300),
+        'price': [f' {i}.5 ' for i in range(300)],
+        'day': [f'2021-03-{i % 28 + 1:02d}' for i in range(300)],
+        'us_day': [f'{i % 12 + 1:02d}/{i % 28 + 1:02d}/2021' for i in range(300)],
+        'stamp': [f'2021-03-04T10:{i % 60:02d}:00.{i:03d}' for i in range(300)],
+        'code': [f'A{i % 50}-{i % 7}' for i in range(300)],
+        'city': ['Paris', 'Lyon', 'Nice'] * 100,
+        'missing_dates': [None] * 150 + ['2021-01-02'] * 150
+    }))
+    schema = infer_schema(df)
+    assert schema.data_types() == {
+        'id': 'numeric', 'price': 'numeric', 'day': 'datetime', 'us_day': 'datetime', 'stamp': 'datetime',
+        'code': 'text', 'city': 'categorical', 'missing_dates': 'datetime'
+    }
+    assert schema['day'].datetime_format == '%Y-%m-%d'
+    assert schema['us_day'].datetime_format == '%m/%d/%Y'
+    # Not in DATETIME_FORMATS: found through pandas' guess from the first value
+    assert schema['stamp'].datetime_format is not None
+    assert schema['missing_dates'].null_count == 150
+
+
+def test_text_with_digits_is_not_a_date():
+    df = make_frame(1000, labels=2)
+    types = infer_schema(df).data_types()
+    assert types['label_0'] == 'text'
+    assert types['note'] == 'categorical'
+    assert types['created'] == 'datetime'
+    assert types['amount'] == 'numeric'
+
+
+
+def test_a_few_unparsable_values_do_not_change_the_type():
+    values = [str(i) for i in range(1000)]
+    values[10] = 'n/a'
+    values[500] = 'unknown'
+    schema = infer_schema(pd.DataFrame({'amount': values}))
+    assert schema['amount'].type == 'numeric'
+    assert schema['amount'].confidence == 0.998
+
+
+def test_large_frames_are_typed_from_a_sample():
+    df = make_frame(30000, labels=0)
+    df.loc[::3, 'amount'] = np.nan
+    schema = infer_schema(df, sample_size=1000)
+    assert schema.sample_rows == 1000
+    assert schema.rows == 30000
+    # Null counts come from the full frame, cardinality of a unique column is scaled up from the sample
+    assert schema['amount'].null_count == 10000
+    assert schema['category'].cardinality == 3
+    assert infer_schema(pd.DataFrame({'id': [f'k{i}' for i in range(30000)]}), sample_size=1000)['id'].cardinality == 30000
@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+
+from sketches import HeavyHitters
+
+
+def test_heavy_hitters_overestimate_by_at_most_n_over_capacity():
+    rng = np.random.default_rng(0)
+    values = pd.Series(rng.zipf(1.3, 100000) % 5000).astype(str)
+    parts = [HeavyHitters(capacity=50) for _ in range(4)]
+    for i, chunk in enumerate(np.array_split(values, 20)):
+        parts[i % 4].update(chunk)
+    merged = HeavyHitters(capacity=50)
+    for part in parts:
+        merged.merge(part)
+
+    true = values.value_counts()
+    errors = merged.counts - true.reindex(merged.counts.index, fill_value=0)
+    assert errors.min() >= 0
+    assert errors.max() <= len(values) / 50
+    frequent = true[true > len(values) / 50].index
+    assert set(frequent) <= set(merged.counts.index)
+    assert merged.top(3) == [[value, int(count)] for value, count in true.head(3).items()]
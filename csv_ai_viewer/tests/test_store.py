@@ -0,0 +1,57 @@
+import os
+import time
+
+import pandas as pd
+
+from datasets import DatasetRegistry
+from store import DatasetStore
+
+
+def frame(rows=1000):
+    return pd.DataFrame({'id': range(rows), 'city': ['Oslo', 'Bergen'] * (rows // 2)})
+
+
+def test_cleanup_keeps_edited_datasets(tmp_path):
+    store = DatasetStore(str(tmp_path), quota=1)
+    store.save('edited', frame())
+    store.save_metadata('edited', version=3)
+    store.save('upload', frame())
+    assert 'edited' in store
+    store.save('other', frame())
+    assert 'upload' not in store
+    assert 'edited' in store and 'other' in store
+
+
+def test_edits_survive_a_restart(tmp_path):
+    registry = DatasetRegistry(memory_budget=1 << 30, store=DatasetStore(str(tmp_path)), flush_delay=None)
+    upload = registry.add_dataframe('upload', frame())
+    edited = registry.edit(upload, [{'op': 'set', 'row': 0, 'column': 'city', 'value': 'Tromsø'}])
+    assert edited.dirty
+    assert registry.flush() == [edited.dataset_id]
+    assert not edited.dirty
+
+    restarted = DatasetRegistry(memory_budget=1 << 30, store=DatasetStore(str(tmp_path)))
+    reopened = restarted.get(edited.dataset_id)
+    assert reopened.df.loc[0, 'city'] == 'Tromsø'
+    assert reopened.version == edited.version
+    assert restarted.get('upload').df.loc[0, 'city'] == 'Oslo'
+
+
+def test_edits_are_flushed_in_the_background(tmp_path):
+    store = DatasetStore(str(tmp_path))
+    registry = DatasetRegistry(memory_budget=1 << 30, store=store, flush_delay=0)
+    upload = registry.add_dataframe('upload', frame())
+    edited = registry.edit(upload, [{'op': 'set', 'row': 1, 'column': 'id', 'value': 42}])
+    for _ in range(200):
+        if not edited.dirty:
+            break
+        time.sleep(0.01)
+    assert not edited.dirty
+    assert store.load(edited.dataset_id)[0].loc[1, 'id'] == 42
+
+
+def test_uncompressed_by_default(tmp_path):
+    store = DatasetStore(str(tmp_path))
+    store.save('plain', frame())
+    assert store.stats()['compression'] == 'uncompressed'
+    assert os.path.getsize(tmp_path / 'plain.arrow') > 0
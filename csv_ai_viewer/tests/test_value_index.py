@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rows import filter_mask
+from value_index import POSTINGS_RATIO, build_value_index, filter_text
+
+
+def column():
+    # 16 rows: 'a' once, 'b' twice, the rest 'c'; POSTINGS_RATIO of 16 is 2 rows
+    return pd.Series(['c'] * 5 + ['a'] + ['c'] * 4 + ['b', 'c', 'b'] + ['c'] * 3)
+
+
+def expected(values):
+    return column().isin(values).to_numpy()
+
+
+@pytest.mark.parametrize('values', [['a'], ['x'], ['a', 'x']])
+def test_small_selections_use_the_postings(values):
+    index = build_value_index(column())
+    assert int(expected(values).sum()) < len(index) * POSTINGS_RATIO
+    # The lookup table path needs the dictionary; the postings path must not
+    index.dictionary = None
+    assert index.mask(values).tolist() == expected(values).tolist()
+
+
+@pytest.mark.parametrize('values', [['b'], ['a', 'b'], ['c'], ['a', 'b', 'c']])
+def test_large_selections_use_a_lookup_table(values):
+    index = build_value_index(column())
+    assert int(expected(values).sum()) >= len(index) * POSTINGS_RATIO
+    # The postings path needs the row order; the lookup table path must not
+    index.order = None
+    assert index.mask(values).tolist() == expected(values).tolist()
+
+
+def test_whole_floats_match_as_the_table_shows_them():
+    ages = pd.Series([30.0, np.nan, 41.5, 30.0])
+    assert filter_text(ages).tolist() == ['30', '', '41.5', '30']
+    df = pd.DataFrame({'age': ages})
+    assert filter_mask(df, filters={'age': 30}).tolist() == [True, False, False, True]
+    assert filter_mask(df, filters={'age': '30|41.5'}).tolist() == [True, False, True, True]
+    assert build_value_index(ages).values()[0][0] == {'value': '30', 'count': 2}
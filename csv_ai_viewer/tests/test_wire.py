@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from wire import encode_arrow
+
+
+def decode(data):
+    return pa.ipc.open_stream(data).read_all()
+
+
+def test_arrow_round_trip():
+    df = pd.DataFrame({'id': [1, 2, 3], 'city': ['Oslo', None, 'Bergen'], 'amount': [1.5, np.nan, 3.0]})
+    table = decode(encode_arrow(df))
+    assert table.column('city').to_pylist() == ['Oslo', None, 'Bergen']
+    assert table.column('amount').null_count == 1
+
+
+def test_mixed_object_columns_keep_nulls():
+    df = pd.DataFrame({'value': [1, 'two', None, np.nan, 3.5], 'id': range(5)})
+    table = decode(encode_arrow(df))
+    assert table.column('value').to_pylist() == ['1', 'two', None, None, '3.5']
+    assert table.column('id').to_pylist() == list(range(5))
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+# Columns with more distinct values are not indexed; value filters on them scan the column
+MAX_INDEXED_VALUES = 1 << 16
+# Selections matching fewer rows than this share of the column are answered from the postings
+POSTINGS_RATIO = 0.125
+VALUES_PAGE_SIZE = 100
+MAX_VALUES_PAGE_SIZE = 10000
+
+
+def filter_text(column):
+    """Values as the table shows them and the column filters compare them: text, with nulls as ''.
+
+    Whole floats lose their ``.0`` (a float column with gaps holds 30.0 where
+    the table shows 30), the way nullable Int64 formats them.
+    """
+    if not pd.api.types.is_float_dtype(column):
+        return column.fillna('').astype(str)
+    text = column.astype(str)
+    whole = (column % 1 == 0) & (column.abs() < 2 ** 53)
+    text[whole] = column[whole].astype('Int64').astype(str)
+    return text.where(column.notna(), '')
+
+
+def code_dtype(size):
+    for dtype in (np.int8, np.int16, np.int32):
+        if size <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+class ValueIndex:
+    """Dictionary encoding of one column with a sorted row-id list per distinct value.
+
+    ``codes[i]`` is the position of row i's value in ``dictionary``, in the
+    smallest integer type that fits. Rows holding value k are
+    ``order[offsets[k]:offsets[k + 1]]`` in ascending row order, so an IN
+    filter is the union of a few postings lists, or a lookup table over the
+    codes when the selection covers much of the column.
+    """
+
+    def __init__(self, codes, dictionary, counts, order, offsets):
+        self.codes = codes
+        self.dictionary = dictionary
+        self.counts = counts
+        self.order = order
+        self.offsets = offsets
+        self._lookup = {value: code for code, value in enumerate(dictionary)}
+        self._lower = None
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.counts.nbytes + self.order.nbytes + self.offsets.nbytes
+
+    def code_of(self, value):
+        return self._lookup.get(value)
+
+    def rows(self, value):
+        """Ascending row positions holding ``value``"""
+        code = self.code_of(value)
+        if code is None:
+            return self.order[:0]
+        return self.order[self.offsets[code]:self.offsets[code + 1]]
+
+    def mask(self, values):
+        """Boolean row mask of ``column IN values``"""
+        codes = [code for code in {self.code_of(value) for value in values} if code is not None]
+        matched = int(self.counts[codes].sum()) if codes else 0
+        if matched < len(self.codes) * POSTINGS_RATIO:
+            mask = np.zeros(len(self.codes), dtype=bool)
+            for code in codes:
+                mask[self.order[self.offsets[code]:self.offsets[code + 1]]] = True
+            return mask
+        lookup = np.zeros(len(self.dictionary), dtype=bool)
+        lookup[codes] = True
+        return lookup[self.codes]
+
+    def values(self, search=None, offset=0, limit=VALUES_PAGE_SIZE, sort='count'):
+        """A page of distinct non-empty values with their counts, most frequent first or by value.
+
+        Returns (entries, matched) where matched is the number of values that
+        pass ``search``, a case-insensitive substring match.
+        """
+        keep = self.dictionary != ''
+        if search:
+            if self._lower is None:
+                self._lower = pd.Series(self.dictionary).str.lower()
+            keep &= self._lower.str.contains(search.lower(), regex=False).to_numpy()
+        codes = np.flatnonzero(keep)
+        if sort == 'value':
+            codes = codes[np.argsort(self.dictionary[codes], kind='stable')]
+        else:
+            codes = codes[np.argsort(-self.counts[codes], kind='stable')]
+        page = codes[offset:offset + limit]
+        entries = [{'value': self.dictionary[code], 'count': int(self.counts[code])} for code in page]
+        return entries, len(codes)
+
+
+def build_value_index(column, max_values=MAX_INDEXED_VALUES):
+    """Index ``column``, or None when it has more than ``max_values`` distinct values"""
+    codes, uniques = pd.factorize(filter_text(column), sort=False)
+    if len(uniques) > max_values:
+        return None
+    dtype = code_dtype(len(uniques))
+    counts = np.bincount(codes, minlength=len(uniques))
+    positions = np.int32 if len(codes) < 2 ** 31 else np.int64
+    order = np.argsort(codes, kind='stable').astype(positions)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    return ValueIndex(codes.astype(dtype), np.asarray(uniques, dtype=object), counts, order, offsets)
+
+
+def value_index(dataset, column):
+    """Value index of ``column``, built on first use and cached for the dataset's version"""
+    return dataset.cached(('value_index', column), lambda: build_value_index(dataset.df[column]))
@@ -0,0 +1,78 @@
+import gzip
+
+import pandas as pd
+import pyarrow as pa
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is used instead
+    brotli = None
+
+ARROW_MIME = 'application/vnd.apache.arrow.stream'
+# Row layouts data endpoints can answer with; 'records' is the default list of row objects
+LAYOUTS = ('records', 'columnar', 'arrow')
+# Text columns are dictionary-encoded when they have at most this many distinct values per row
+DICTIONARY_RATIO = 0.5
+# Smaller responses are sent uncompressed; the headers would eat most of the gain
+MIN_COMPRESS_SIZE = 1024
+COMPRESSIBLE_TYPES = {'application/json', 'text/csv', ARROW_MIME}
+
+
+def column_values(column):
+    """JSON-friendly values of one column, nulls as None and timestamps as ISO strings"""
+    if pd.api.types.is_datetime64_any_dtype(column):
+        text = column.dt.strftime('%Y-%m-%dT%H:%M:%S')
+        return text.where(column.notna(), None).tolist()
+    values = column.astype(object)
+    return values.where(column.notna(), None).tolist()
+
+
+def encode_columnar(df):
+    """``df`` as columnar JSON: one value list per column instead of one object per row.
+
+    Text columns that repeat are sent as a ``dictionary`` of distinct values
+    plus integer ``codes`` into it, -1 meaning null.
+    """
+    columns = []
+    for name in df.columns:
+        column = df[name]
+        entry = {'name': str(name)}
+        if column.dtype == object or isinstance(column.dtype, pd.CategoricalDtype):
+            codes, uniques = pd.factorize(column)
+            if len(uniques) <= len(column) * DICTIONARY_RATIO:
+                entry['dictionary'] = column_values(pd.Series(uniques))
+                entry['codes'] = codes.tolist()
+                columns.append(entry)
+                continue
+        entry['values'] = column_values(column)
+        columns.append(entry)
+    return {'layout': 'columnar', 'length': len(df), 'columns': columns}
+
+
+def encode_arrow(df):
+    """``df`` as an Arrow IPC stream"""
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Object columns mixing numbers and text become text; the string dtype keeps nulls as nulls
+        text_columns = {name: 'string' for name in df.columns if df[name].dtype == object}
+        table = pa.Table.from_pandas(df.astype(text_columns), preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def choose_encoding(accept_encodings):
+    """Best supported content coding for an ``Accept-Encoding`` header parsed by werkzeug"""
+    if brotli is not None and accept_encodings['br'] > 0:
+        return 'br'
+    if accept_encodings['gzip'] > 0:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=5)